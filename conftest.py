@@ -47,7 +47,19 @@ def _build_filterwarnings_string() -> str:
     return ",".join(filter_parts)
 
 
+def pytest_addoption(parser):
+    parser.addoption(
+        "--run-benchmarks",
+        action="store_true",
+        default=False,
+        help="Run the tests marked as benchmarks, which are skipped by default",
+    )
+
+
 def pytest_configure(config):
+    config.addinivalue_line(
+        "markers", "benchmark: a timing comparison, only run with --run-benchmarks"
+    )
     if not config.pluginmanager.hasplugin("dials_data"):
 
         @pytest.fixture(scope="session")
@@ -60,6 +72,15 @@ def dials_data():
     os.environ["PYTHONWARNINGS"] = _build_filterwarnings_string()
 
 
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="benchmarks are only run with --run-benchmarks")
+    for item in items:
+        if "benchmark" in item.keywords:
+            item.add_marker(skip)
+
+
 @pytest.fixture(scope="session")
 def dials_regression() -> Path:
     """Return the absolute path to the dials_regression module as a string.
@@ -4,6 +4,7 @@
 import copy
 import logging
 import math
+import time
 
 import libtbx
 import libtbx.phil
@@ -14,14 +15,15 @@
 from dxtbx.model import Crystal
 from rstbx.dps_core.lepage import iotbx_converter
 from rstbx.symmetry.subgroup import MetricSubgroup
-from scitbx.array_family import flex
 
 import dials.util
 from dials.algorithms.indexing.refinement import refine
+from dials.array_family import flex
 from dials.command_line.check_indexing_symmetry import (
     get_symop_correlation_coefficients,
 )
 from dials.util.log import LoggingContext
+from dials.util.mp import initialise_worker, shared_reflections, worker_data
 from dials.util.system import CPU_COUNT
 
 logger = logging.getLogger(__name__)
@@ -225,7 +227,6 @@ def refined_settings_from_refined_triclinic(
     assert len(experiments.crystals()) == 1
     crystal = experiments.crystals()[0]
 
-    used_reflections = copy.deepcopy(reflections)
     UC = crystal.get_unit_cell()
 
     refined_settings = RefinedSettingsList(cb_op_to_primitive=cb_op_to_primitive)
@@ -259,17 +260,39 @@ def refined_settings_from_refined_triclinic(
             constrain_orient, space_group
         )
 
-    with concurrent.futures.ProcessPoolExecutor(max_workers=params.nproc) as pool:
-        for i, result in enumerate(
-            pool.map(
-                refine_subgroup,
+    # Write the reflections once, for each worker process to read once, rather
+    # than pickling them for every subgroup
+    start = time.perf_counter()
+    with shared_reflections(reflections) as shared:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=params.nproc,
+            initializer=initialise_worker,
+            initargs=({"reflections": shared, "experiments": experiments},),
+        ) as pool:
+            for i, result in enumerate(
+                pool.map(
+                    _refine_subgroup_in_worker,
+                    ((params, subgroup) for subgroup in refined_settings),
+                )
+            ):
+                refined_settings[i] = result
+    logger.info(
+        "Refined %i settings in %.2f s with nproc=%i\n%s",
+        len(refined_settings),
+        time.perf_counter() - start,
+        params.nproc,
+        dials.util.tabulate(
+            [
                 (
-                    (params, subgroup, used_reflections, experiments)
-                    for subgroup in refined_settings
-                ),
-            )
-        ):
-            refined_settings[i] = result
+                    setting.setting_number,
+                    setting["bravais"],
+                    f"{setting.refinement_time:.2f}",
+                )
+                for setting in refined_settings
+            ],
+            headers=("Solution", "lattice", "Time (s)"),
+        ),
+    )
 
     identify_likely_solutions(refined_settings)
     return refined_settings
@@ -306,6 +329,22 @@ def identify_likely_solutions(all_solutions):
         solution.recommended = True
 
 
+def _refine_subgroup_in_worker(args):
+    params, subgroup = args
+    start = time.perf_counter()
+    # refine_subgroup copies the reflections, but modifies the experiments
+    subgroup = refine_subgroup(
+        (
+            params,
+            subgroup,
+            worker_data["reflections"],
+            copy.deepcopy(worker_data["experiments"]),
+        )
+    )
+    subgroup.refinement_time = time.perf_counter() - start
+    return subgroup
+
+
 def refine_subgroup(args):
     assert len(args) == 4
     params, subgroup, used_reflections, experiments = args
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import functools
 import importlib.metadata
 import logging
 import math
@@ -27,6 +28,16 @@
 logger = logging.getLogger(__name__)
 
 
+@functools.cache
+def indexing_entry_points(group):
+    """The entry points in a group, looked up once per process.
+
+    Looking up entry points scans the metadata of every installed distribution,
+    which is significant when indexing many still images.
+    """
+    return tuple(importlib.metadata.entry_points(group=group))
+
+
 max_cell_phil_str = """\
 max_cell_estimation
   .expert_level = 1
@@ -437,9 +448,7 @@ def from_parameters(
                     experiment.goniometer = None
 
             IndexerType = None
-            for entry_point in importlib.metadata.entry_points(
-                group="dials.index.basis_vector_search"
-            ):
+            for entry_point in indexing_entry_points("dials.index.basis_vector_search"):
                 if params.indexing.method == entry_point.name:
                     if use_stills_indexer:
                         # do something
@@ -452,9 +461,7 @@ def from_parameters(
                         )
 
             if IndexerType is None:
-                for entry_point in importlib.metadata.entry_points(
-                    group="dials.index.lattice_search"
-                ):
+                for entry_point in indexing_entry_points("dials.index.lattice_search"):
                     if params.indexing.method == entry_point.name:
                         if use_stills_indexer:
                             from dials.algorithms.indexing.stills_indexer import (
@@ -40,6 +40,20 @@
         .expert_level = 1
     sys_absent_threshold = 0.9
         .type = float(value_min=0.0, value_max=1.0)
+    stop_early
+        .help = "Stop evaluating putative crystal models once one is found"
+                "which satisfies all of the thresholds set here, rather than"
+                "evaluating up to max_refine models. The models generated"
+                "before it are still evaluated."
+        .expert_level = 1
+    {
+        likelihood = None
+            .type = float(value_max=1)
+            .help = "Minimum model likelihood, i.e. 1 - rmsd_xy (mm)"
+        fraction_indexed = None
+            .type = float(value_min=0, value_max=1)
+            .help = "Minimum fraction of reflections indexed by the model"
+    }
     solution_scorer = filter *weighted
         .type = choice
         .expert_level = 1
@@ -112,9 +126,7 @@ def __init__(self, reflections, experiments, params):
         super().__init__(reflections, experiments, params)
 
         self._lattice_search_strategy = None
-        for entry_point in importlib.metadata.entry_points(
-            group="dials.index.lattice_search"
-        ):
+        for entry_point in indexer.indexing_entry_points("dials.index.lattice_search"):
             if entry_point.name == self.params.method:
                 strategy_class = entry_point.load()
                 self._lattice_search_strategy = strategy_class(
@@ -180,26 +192,79 @@ def choose_best_orientation_matrix(self, candidate_orientation_matrices):
                 n_indexed_cutoff=filter_params.n_indexed_cutoff,
             )
 
-        args = []
+        # The reflections used to evaluate each candidate model
+        sel = self.reflections["id"] == -1
+        if self.d_min is not None:
+            sel &= 1 / self.reflections["rlp"].norms() > self.d_min
+        xo, yo, zo = self.reflections["xyzobs.mm.value"].parts()
+        imageset_id = self.reflections["imageset_id"]
+        for i_expt, expt in enumerate(self.experiments):
+            # XXX Not sure if we still need this loop over self.experiments
+            if expt.scan is not None and expt.scan.has_property("oscillation"):
+                start, end = expt.scan.get_oscillation_range()
+                if (end - start) > 360:
+                    # only use reflections from the first 360 degrees of the scan
+                    sel.set_selected(
+                        (imageset_id == i_expt)
+                        & (zo > ((start * math.pi / 180) + 2 * math.pi)),
+                        False,
+                    )
+        reflections = self.reflections.select(sel)
+
+        stop_params = self.params.basis_vector_combinations.stop_early
+        if stop_params.likelihood is None and stop_params.fraction_indexed is None:
+            stop = None
+        else:
+
+            def stop(result):
+                return (
+                    stop_params.likelihood is None
+                    or result.model_likelihood >= stop_params.likelihood
+                ) and (
+                    stop_params.fraction_indexed is None
+                    or result.fraction_indexed >= stop_params.fraction_indexed
+                )
 
+        results = model_evaluation.evaluate_candidates(
+            model_evaluation.ModelEvaluation(self.all_params),
+            self._index_candidates(candidate_orientation_matrices, reflections),
+            reflections,
+            nproc=self.params.nproc,
+            stop=stop,
+        )
+        if stop is not None and results and stop(results[-1]):
+            logger.info(
+                "Stopped after evaluating %i candidate models: the last satisfies "
+                "the basis_vector_combinations.stop_early thresholds",
+                len(results),
+            )
+
+        for soln in results:
+            solutions.append(soln)
+
+        if len(solutions):
+            logger.info("Candidate solutions:")
+            logger.info(str(solutions))
+            best_model = solutions.best_model()
+            logger.debug("best model_likelihood: %.2f", best_model.model_likelihood)
+            logger.debug("best n_indexed: %i", best_model.n_indexed)
+            self.hkl_offset = best_model.hkl_offset
+            return best_model.crystal, best_model.n_indexed
+        else:
+            return None, None
+
+    def _index_candidates(self, candidate_orientation_matrices, reflections):
+        """Index the reflections with each candidate model in turn.
+
+        Yields:
+          tuple: The experiments for each candidate model which indexes any
+            reflections, and a copy of the reflections indexed with it, up to
+            a maximum of max_refine candidates.
+        """
+        n_candidates = 0
         for cm in candidate_orientation_matrices:
-            sel = self.reflections["id"] == -1
-            if self.d_min is not None:
-                sel &= 1 / self.reflections["rlp"].norms() > self.d_min
-            xo, yo, zo = self.reflections["xyzobs.mm.value"].parts()
-            imageset_id = self.reflections["imageset_id"]
             experiments = ExperimentList()
-            for i_expt, expt in enumerate(self.experiments):
-                # XXX Not sure if we still need this loop over self.experiments
-                if expt.scan is not None and expt.scan.has_property("oscillation"):
-                    start, end = expt.scan.get_oscillation_range()
-                    if (end - start) > 360:
-                        # only use reflections from the first 360 degrees of the scan
-                        sel.set_selected(
-                            (imageset_id == i_expt)
-                            & (zo > ((start * math.pi / 180) + 2 * math.pi)),
-                            False,
-                        )
+            for expt in self.experiments:
                 experiments.append(
                     Experiment(
                         imageset=expt.imageset,
@@ -210,7 +275,7 @@ def choose_best_orientation_matrix(self, candidate_orientation_matrices):
                         crystal=cm,
                     )
                 )
-            refl = self.reflections.select(sel)
+            refl = reflections.copy()
             self.index_reflections(experiments, refl)
             if refl.get_flags(refl.flags.indexed).count(True) == 0:
                 continue
@@ -258,45 +323,19 @@ def choose_best_orientation_matrix(self, candidate_orientation_matrices):
                     continue
                 experiments[0].crystal.update(new_crystal)
 
-            args.append((experiments, refl))
-            if len(args) == self.params.basis_vector_combinations.max_refine:
+            yield experiments, refl
+            n_candidates += 1
+            if n_candidates == self.params.basis_vector_combinations.max_refine:
                 break
 
-        from libtbx import easy_mp
-
-        evaluator = model_evaluation.ModelEvaluation(self.all_params)
-        results = easy_mp.parallel_map(
-            evaluator.evaluate,
-            args,
-            iterable_type=easy_mp.posiargs,
-            processes=self.params.nproc,
-            preserve_exception_message=True,
-        )
-
-        for soln in results:
-            if soln is None:
-                continue
-            solutions.append(soln)
-
-        if len(solutions):
-            logger.info("Candidate solutions:")
-            logger.info(str(solutions))
-            best_model = solutions.best_model()
-            logger.debug("best model_likelihood: %.2f", best_model.model_likelihood)
-            logger.debug("best n_indexed: %i", best_model.n_indexed)
-            self.hkl_offset = best_model.hkl_offset
-            return best_model.crystal, best_model.n_indexed
-        else:
-            return None, None
-
 
 class BasisVectorSearch(LatticeSearch):
     def __init__(self, reflections, experiments, params):
         super().__init__(reflections, experiments, params)
 
         strategy_class = None
-        for entry_point in importlib.metadata.entry_points(
-            group="dials.index.basis_vector_search"
+        for entry_point in indexer.indexing_entry_points(
+            "dials.index.basis_vector_search"
         ):
             if entry_point.name == params.indexing.method:
                 strategy_class = entry_point.load()
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import collections
+import concurrent.futures
 import copy
 import logging
 import math
@@ -8,14 +9,15 @@
 import libtbx
 from dxtbx.model import Crystal
 from scitbx import matrix
-from scitbx.array_family import flex
 
 import dials.util
 from dials.algorithms.indexing.compare_orientation_matrices import (
     difference_rotation_matrix_axis_angle,
 )
 from dials.algorithms.refinement import RefinerFactory
+from dials.array_family import flex
 from dials.util.log import LoggingContext
+from dials.util.mp import initialise_worker, shared_reflections, worker_data
 
 logger = logging.getLogger(__name__)
 
@@ -351,3 +353,94 @@ def evaluate(self, experiments, reflections):
                     hkl_offset=(0, 0, 0),
                 )
                 return result
+
+
+# The columns set when indexing the reflections with a candidate model
+_indexing_columns = ("miller_index", "id", "flags")
+
+
+def _evaluate_in_worker(experiments, columns):
+    # Each worker evaluates one candidate at a time, so the shared reflections
+    # can be updated in place with the indexing of this candidate
+    reflections = worker_data["reflections"]
+    for key, column in columns.items():
+        reflections[key] = column
+    return worker_data["evaluator"].evaluate(experiments, reflections)
+
+
+def evaluate_candidates(evaluator, candidates, reflections, nproc=1, stop=None):
+    """Evaluate candidate models as they are generated.
+
+    With nproc > 1 the reflections are sent to each worker process once, and
+    only the experiments and the columns set by indexing are sent for each
+    candidate. Candidates are generated while earlier ones are evaluated.
+
+    Evaluation stops after the first candidate, in the order generated, whose
+    result satisfies the stop condition. All earlier candidates are evaluated,
+    so that the results do not depend on nproc.
+
+    Args:
+      evaluator (Strategy): The strategy used to evaluate each candidate.
+      candidates: An iterable of (experiments, reflections) tuples, where each
+        reflection table is a copy of reflections indexed with the candidate.
+      reflections: The reflections common to all candidates.
+      nproc (int): The number of processes used to evaluate candidates.
+      stop: An optional function of a Result, returning True if no further
+        candidates need to be evaluated.
+
+    Returns:
+      list: The Result for each successfully evaluated candidate, in order.
+    """
+    if nproc == 1:
+        results = []
+        for experiments, refl in candidates:
+            result = evaluator.evaluate(experiments, refl)
+            if result is None:
+                continue
+            results.append(result)
+            if stop is not None and stop(result):
+                break
+        return results
+
+    results = {}
+    stop_at = None
+    with shared_reflections(reflections) as shared:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=nproc,
+            initializer=initialise_worker,
+            initargs=({"reflections": shared, "evaluator": evaluator},),
+        ) as pool:
+            pending = {}
+            candidates = enumerate(candidates)
+            exhausted = False
+            while True:
+                # Keep enough candidates queued that no worker is left idle
+                while not exhausted and stop_at is None and len(pending) < 2 * nproc:
+                    try:
+                        i, (experiments, refl) = next(candidates)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    columns = {key: refl[key] for key in _indexing_columns}
+                    pending[pool.submit(_evaluate_in_worker, experiments, columns)] = i
+                if not pending:
+                    break
+                done, _ = concurrent.futures.wait(
+                    pending, return_when=concurrent.futures.FIRST_COMPLETED
+                )
+                for future in done:
+                    i = pending.pop(future)
+                    result = future.result()
+                    if result is None:
+                        continue
+                    results[i] = result
+                    if stop is not None and stop(result):
+                        stop_at = i if stop_at is None else min(i, stop_at)
+                if stop_at is not None:
+                    # Later candidates are not needed, so only wait for those
+                    # already running
+                    for future, i in list(pending.items()):
+                        if i > stop_at:
+                            future.cancel()
+                            del pending[future]
+    return [results[i] for i in sorted(results) if stop_at is None or i <= stop_at]
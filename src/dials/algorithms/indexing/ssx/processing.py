@@ -20,6 +20,7 @@
 from dials.algorithms.indexing.max_cell import find_max_cell
 from dials.array_family import flex
 from dials.util.combine_experiments import CombineWithReference
+from dials.util.mp import initialise_worker, worker_data
 
 RAD2DEG = 180 / math.pi
 
@@ -221,6 +222,38 @@ def wrap_index_one(input_to_index: InputToIndex) -> IndexingResult:
     return result
 
 
+def _add_models(
+    input_to_index: InputToIndex,
+    experiments: ExperimentList,
+    params: phil.scope_extract,
+    method_list: list[str],
+) -> InputToIndex:
+    input_to_index.experiment = experiments[input_to_index.image_no]
+    input_to_index.parameters = params
+    input_to_index.method_list = method_list
+    return input_to_index
+
+
+def _index_in_worker(input_to_index: InputToIndex) -> IndexingResult:
+    result = wrap_index_one(
+        _add_models(
+            input_to_index,
+            worker_data["experiments"],
+            worker_data["params"],
+            worker_data["method_list"],
+        )
+    )
+    # Restored from the experiments in the main process, rather than pickled
+    result.unindexed_experiment = None
+    return result
+
+
+def _chunksize(n_images: int, nproc: int) -> int:
+    # Small enough chunks that each worker takes several, to balance the load
+    # at the end of the run, but large enough to limit the communication
+    return max(1, min(16, n_images // (8 * nproc)))
+
+
 def index_all_concurrent(
     experiments: ExperimentList,
     reflections: list[flex.reflection_table],
@@ -240,17 +273,15 @@ def index_all_concurrent(
         for i in range(len(iset)):
             refl_index = i + n
             if reflections[refl_index]:
-                expt = experiments[refl_index]
+                # The experiment, parameters and method list are added where
+                # the image is indexed, to avoid pickling them for each image
                 input_iterable.append(
                     InputToIndex(
                         reflection_table=reflections[refl_index],
-                        experiment=expt,
-                        parameters=params,
                         image_identifier=pathlib.Path(
                             iset.get_image_identifier(i)
                         ).name,
                         image_no=refl_index,
-                        method_list=method_list,
                         imageset_no=n_iset,
                     )
                 )
@@ -272,13 +303,36 @@ def index_all_concurrent(
             debug_loggers_to_disable,
         ):
             if params.indexing.nproc > 1:
-                with Pool(params.indexing.nproc) as pool:
-                    results: list[IndexingResult] = pool.map(
-                        wrap_index_one, input_iterable
+                # Send the experiments and parameters to each worker once.
+                # Idle workers take the next chunk of images from the queue, so
+                # the load stays balanced however long each image takes.
+                with Pool(
+                    params.indexing.nproc,
+                    initializer=initialise_worker,
+                    initargs=(
+                        {
+                            "experiments": experiments,
+                            "params": params,
+                            "method_list": method_list,
+                        },
+                    ),
+                ) as pool:
+                    results: list[IndexingResult] = list(
+                        pool.imap_unordered(
+                            _index_in_worker,
+                            input_iterable,
+                            chunksize=_chunksize(
+                                len(input_iterable), params.indexing.nproc
+                            ),
+                        )
                     )
+                results.sort(key=lambda result: result.image_no)
+                for result in results:
+                    result.unindexed_experiment = experiments[result.image_no]
             else:
                 results: list[IndexingResult] = [
-                    wrap_index_one(i) for i in input_iterable
+                    wrap_index_one(_add_models(i, experiments, params, method_list))
+                    for i in input_iterable
                 ]
 
     sys.stdout = sys.__stdout__
@@ -16,11 +16,14 @@
 
 Result = collections.namedtuple(
     "Result",
-    "index, reflections, data, read_time, extract_time, process_time, total_time",
+    "index, reflections, data, read_time, extract_time, process_time, total_time, "
+    "memory",
+    defaults=(None,),
 )
 #        :param index: The processing job index
 #        :param reflections: The processed reflections
 #        :param data: Other processed data
+#        :param memory: The measured peak memory growth in bytes, if known
 
 
 class TimingInfo:
@@ -196,6 +196,29 @@ namespace dials { namespace algorithms {
       groups_.add(int2(j0, j1), expr, range);
     }
 
+    /**
+     * Add a new group of jobs with explicitly given (variable size) blocks
+     * @param expr The range of experiments
+     * @param frames The frame range of each block
+     */
+    void add_blocks(tiny<int, 2> expr, const af::const_ref<tiny<int, 2> > &frames) {
+      DIALS_ASSERT(expr[1] > expr[0]);
+      DIALS_ASSERT(frames.size() > 0);
+      DIALS_ASSERT(frames[0][1] > frames[0][0]);
+      std::size_t index = groups_.size();
+      std::size_t j0 = size();
+      jobs_.push_back(Job(index, expr, frames[0]));
+      for (std::size_t i = 1; i < frames.size(); ++i) {
+        DIALS_ASSERT(frames[i][1] > frames[i][0]);
+        DIALS_ASSERT(frames[i][0] > frames[i - 1][0]);
+        DIALS_ASSERT(frames[i][1] > frames[i - 1][1]);
+        DIALS_ASSERT(frames[i][0] <= frames[i - 1][1]);
+        jobs_.push_back(Job(index, expr, frames[i]));
+      }
+      std::size_t j1 = size();
+      groups_.add(int2(j0, j1), expr, int2(frames.front()[0], frames.back()[1]));
+    }
+
     /**
      * @returns The requested job
      */
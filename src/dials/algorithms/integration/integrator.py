@@ -119,6 +119,14 @@ def generate_phil_scope():
           .help = "The maximum percentage of available memory to use for"
                   "allocating shoebox arrays."
 
+        adaptive = False
+          .type = bool
+          .help = "For block size auto, shrink blocks covering dense regions of"
+                  "the scan so that the shoebox memory of each block fits the"
+                  "per-process share of the memory budget, and schedule blocks"
+                  "longest-first onto processes so that the total predicted"
+                  "memory of running blocks stays within the budget."
+
       }
 
       use_dynamic_mask = True
@@ -407,6 +415,7 @@ def from_phil(params):
         block.threshold = params.block.threshold
         block.force = params.block.force
         block.max_memory_usage = params.block.max_memory_usage
+        block.adaptive = params.block.adaptive
 
         # Set the modelling processor parameters
         result.modelling.mp = mp
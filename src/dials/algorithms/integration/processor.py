@@ -1,12 +1,17 @@
 from __future__ import annotations
 
+import concurrent.futures
 import itertools
 import logging
 import math
 from time import time
 
+import numpy as np
+import psutil
+
 import boost_adaptbx.boost.python
 import libtbx
+from scitbx.array_family import shared
 
 import dials.algorithms.integration
 import dials.util
@@ -76,6 +81,116 @@ def _average_bbox_size(reflections):
     return xsize, ysize, zsize
 
 
+def _adaptive_block_frames(
+    bbox, frame_range, block_size, block_overlap, memory_limit, flatten=False
+):
+    """
+    Split a frame range into blocks whose predicted shoebox memory fits a limit.
+
+    Blocks are nominally block_size frames long. Where the peak shoebox memory
+    of a block would exceed memory_limit the block is repeatedly halved (down
+    to twice the block overlap) until it fits. Reflections spanning a block
+    boundary are split, so the memory of a reflection in a block of L frames
+    is estimated from at most L of its frames.
+
+    :param bbox: The bounding boxes of the reflections in the frame range
+    :param frame_range: The (first, last) frames to split
+    :param block_size: The nominal block size in frames
+    :param block_overlap: The number of frames overlapping between blocks
+    :param memory_limit: The memory limit in bytes for a single block
+    :param flatten: True/False the shoeboxes are flattened
+    :return: A list of (first, last) frames of each block, or None if no block
+             needed to be shrunk
+    """
+    frame0, frame1 = frame_range
+    nframes = frame1 - frame0
+    if nframes <= 1 or len(bbox) == 0:
+        return None
+    block_size = min(block_size, nframes)
+    min_size = max(2 * block_overlap, 1)
+    if block_size <= min_size:
+        return None
+
+    x0, x1, y0, y1, z0, z1 = (p.as_numpy_array() for p in bbox.parts())
+    z0 = np.clip(z0 - frame0, 0, nframes)
+    z1 = np.clip(z1 - frame0, 0, nframes)
+    sel = z1 > z0
+    z0, z1 = z0[sel], z1[sel]
+    # data and background (float) plus mask (int) for each shoebox pixel
+    xy = (x1 - x0)[sel].astype(np.float64) * (y1 - y0)[sel] * 12
+
+    # The live shoebox memory on each frame for each candidate block size
+    sizes = [block_size]
+    while sizes[-1] // 2 >= min_size:
+        sizes.append(sizes[-1] // 2)
+    profiles = []
+    for size in sizes:
+        nbytes = xy if flatten else xy * np.minimum(z1 - z0, size)
+        delta = np.bincount(z0, nbytes, nframes + 1) - np.bincount(
+            z1, nbytes, nframes + 1
+        )
+        profiles.append(np.cumsum(delta[:nframes]))
+
+    # Greedily choose the largest block size which fits the limit
+    blocks = []
+    shrunk = False
+    first = 0
+    while True:
+        for size, profile in zip(sizes, profiles):
+            last = min(first + size, nframes)
+            if profile[first:last].max() <= memory_limit:
+                break
+        shrunk = shrunk or last < min(first + block_size, nframes)
+        blocks.append((first + frame0, last + frame0))
+        if last == nframes:
+            break
+        first = last - block_overlap
+    if not shrunk:
+        return None
+    return blocks
+
+
+def _memory_limited_map(func, iterable, memory, memory_limit, nproc, callback):
+    """
+    Apply a function to tasks in parallel within a memory budget.
+
+    Tasks are started longest first. A task is only started when its predicted
+    memory fits in what remains of the budget after the running tasks, unless
+    no task is running at all, in which case the largest waiting task is
+    started regardless.
+
+    :param func: The function to apply
+    :param iterable: The tasks
+    :param memory: The predicted memory for each task
+    :param memory_limit: The total memory budget
+    :param nproc: The maximum number of parallel processes
+    :param callback: The function to call with each result
+    """
+    tasks = list(iterable)
+    assert len(memory) == len(tasks), "Invalid number of memory estimates"
+    waiting = sorted(range(len(tasks)), key=lambda i: memory[i], reverse=True)
+    running = {}
+    in_use = 0
+    with concurrent.futures.ProcessPoolExecutor(max_workers=nproc) as pool:
+        while waiting or running:
+            while waiting and len(running) < nproc:
+                index = next(
+                    (i for i in waiting if in_use + memory[i] <= memory_limit),
+                    None if running else waiting[0],
+                )
+                if index is None:
+                    break
+                waiting.remove(index)
+                in_use += memory[index]
+                running[pool.submit(func, tasks[index])] = index
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                in_use -= memory[running.pop(future)]
+                callback(future.result())
+
+
 @boost_adaptbx.boost.python.inject_into(Executor)
 class _:
     @staticmethod
@@ -135,6 +250,7 @@ def __init__(self):
         self.threshold = 0.99
         self.force = False
         self.max_memory_usage = 0.90
+        self.adaptive = False
 
     def update(self, other):
         self.size = other.size
@@ -142,6 +258,7 @@ def update(self, other):
         self.threshold = other.threshold
         self.force = other.force
         self.max_memory_usage = other.max_memory_usage
+        self.adaptive = other.adaptive
 
 
 class Shoebox:
@@ -282,15 +399,25 @@ def process_output(result):
                 rehandle_cached_records(result[1])
                 self.manager.accumulate(result[0])
 
-            multi_node_parallel_map(
-                func=execute_parallel_task,
-                iterable=list(self.manager.tasks()),
-                njobs=mp_njobs,
-                nproc=mp_nproc,
-                callback=process_output,
-                cluster_method=mp_method,
-                preserve_order=True,
-            )
+            if self.manager.memory_limit is not None and mp_njobs == 1:
+                _memory_limited_map(
+                    func=execute_parallel_task,
+                    iterable=self.manager.tasks(),
+                    memory=self.manager.block_memory,
+                    memory_limit=self.manager.memory_limit,
+                    nproc=mp_nproc,
+                    callback=process_output,
+                )
+            else:
+                multi_node_parallel_map(
+                    func=execute_parallel_task,
+                    iterable=list(self.manager.tasks()),
+                    njobs=mp_njobs,
+                    nproc=mp_nproc,
+                    callback=process_output,
+                    cluster_method=mp_method,
+                    preserve_order=True,
+                )
         else:
             for task in self.manager.tasks():
                 self.manager.accumulate(task())
@@ -357,6 +484,7 @@ def __call__(self):
             extract_time=0,
             process_time=0,
             total_time=0,
+            memory=0,
         )
 
 
@@ -459,7 +587,10 @@ def __call__(self):
             self.params.debug.output,
         )
 
-        # Loop through the imageset, extract pixels and process reflections
+        # Loop through the imageset, extract pixels and process reflections,
+        # keeping track of the peak memory growth of the process
+        process = psutil.Process()
+        memory0 = peak_memory = process.memory_info().rss
         read_time = 0.0
         for i in range(len(imageset)):
             st = time()
@@ -482,6 +613,7 @@ def __call__(self):
 
             read_time += time() - st
             processor.next(make_image(image, mask), self.executor)
+            peak_memory = max(peak_memory, process.memory_info().rss)
             del image
             del mask
         assert processor.finished(), "Data processor is not finished"
@@ -515,6 +647,7 @@ def __call__(self):
             extract_time=processor.extract_time(),
             process_time=processor.process_time(),
             total_time=time() - start_time,
+            memory=peak_memory - memory0,
         )
 
 
@@ -542,6 +675,11 @@ def __init__(self, experiments, reflections, params):
         # Other data
         self.data = {}
 
+        # Predicted and measured memory for each job
+        self.block_memory = None
+        self.memory_limit = None
+        self.memory = {}
+
         # Save some parameters
         self.params = params
 
@@ -612,6 +750,7 @@ def tasks(self):
     def accumulate(self, result):
         """Accumulate the results."""
         self.data[result.index] = result.data
+        self.memory[result.index] = result.memory
         self.manager.accumulate(result.index, result.reflections)
         self.time.read += result.read_time
         self.time.extract += result.extract_time
@@ -628,6 +767,9 @@ def finalize(self):
         # Check manager is finished
         assert self.manager.finished(), "Manager is not finished"
 
+        # Report the predicted against the measured memory
+        self.memory_report()
+
         # Update the time and finalized flag
         self.time.finalize = time() - start_time
         self.finalized = True
@@ -680,6 +822,20 @@ def compute_jobs(self):
             cutoff = int(self.params.block.threshold * len(frames_per_refl))
             block_overlap = frames_per_refl[cutoff]
 
+        # Optionally shrink blocks so that each fits the per-process share of
+        # the memory budget, rather than reducing the number of processes
+        adaptive = (
+            self.params.block.size == libtbx.Auto
+            and self.params.block.adaptive
+            and not self.params.debug.output
+        )
+        if adaptive:
+            memory_limit = (
+                MEMORY_LIMIT
+                * self.params.block.max_memory_usage
+                / (self.params.mp.nproc * self.params.mp.njobs)
+            )
+
         groups = itertools.groupby(
             range(len(self.experiments)),
             lambda x: (id(self.experiments[x].imageset), id(self.experiments[x].scan)),
@@ -730,12 +886,35 @@ def compute_jobs(self):
                 raise RuntimeError(
                     f"Unknown block_size units {self.params.block.units!r}"
                 )
-            self.jobs.add(
-                (i0, i1),
-                array_range,
-                block_size_frames,
-                block_overlap,
-            )
+            blocks = None
+            if adaptive:
+                sel = (self.reflections["id"] >= i0) & (self.reflections["id"] < i1)
+                blocks = _adaptive_block_frames(
+                    self.reflections["bbox"].select(sel),
+                    array_range,
+                    block_size_frames,
+                    block_overlap,
+                    memory_limit,
+                    self.params.shoebox.flatten,
+                )
+            if blocks is None:
+                self.jobs.add(
+                    (i0, i1),
+                    array_range,
+                    block_size_frames,
+                    block_overlap,
+                )
+            else:
+                logger.info(
+                    " Split frames %d to %d into %d blocks of %d to %d frames"
+                    " to fit the memory budget\n",
+                    array_range[0],
+                    array_range[1],
+                    len(blocks),
+                    min(b[1] - b[0] for b in blocks),
+                    max(b[1] - b[0] for b in blocks),
+                )
+                self.jobs.add_blocks((i0, i1), shared.tiny_int_2(blocks))
         assert len(self.jobs) > 0, "Invalid number of jobs"
 
     def split_reflections(self):
@@ -780,9 +959,10 @@ def compute_processors(self):
         available_limit = available_memory * self.params.block.max_memory_usage
 
         # Get the maximum shoebox memory to estimate memory use for one process
-        memory_required_per_process = flex.max(
-            self.jobs.shoebox_memory(self.reflections, self.params.shoebox.flatten)
+        self.block_memory = self.jobs.shoebox_memory(
+            self.reflections, self.params.shoebox.flatten
         )
+        memory_required_per_process = flex.max(self.block_memory)
 
         # Compile a memory report
         report = ["Memory situation report:"]
@@ -803,6 +983,16 @@ def _report(description, numbytes):
             if njobs >= self.params.mp.nproc:
                 # There is enough memory. Take no action
                 pass
+            elif (
+                njobs >= 1 and self.params.block.adaptive and self.params.mp.njobs == 1
+            ):
+                # There is enough memory to run, but not with every process
+                # working on its largest block, so limit the blocks in flight
+                report.append(
+                    "Scheduling blocks so that at most "
+                    f"{available_limit / 1e9:.1f} GB of shoebox memory is in use."
+                )
+                self.memory_limit = available_limit
             elif njobs >= 1:
                 # There is enough memory to run, but not as many processes as requested
                 output_level = logging.WARNING
@@ -830,6 +1020,42 @@ def _report(description, numbytes):
                 % _average_bbox_size(self.reflections)
             )
 
+    def memory_report(self):
+        """
+        Report the predicted against the measured memory of each job
+        """
+        if self.block_memory is None or not self.memory:
+            return
+        rows = [["#", "Frame From", "Frame To", "Predicted (GB)", "Measured (GB)"]]
+        for i in sorted(self.memory):
+            if self.memory[i] is None:
+                continue
+            f0, f1 = self.manager.job(i).frames()
+            rows.append(
+                [
+                    str(i),
+                    str(f0),
+                    str(f1),
+                    f"{self.block_memory[i] / 1e9:.2f}",
+                    f"{self.memory[i] / 1e9:.2f}",
+                ]
+            )
+        if len(rows) == 1:
+            return
+        logger.debug(
+            "Predicted and measured shoebox memory per block:\n%s",
+            tabulate(rows, headers="firstrow"),
+        )
+        # Only report the peak memory by default if the prediction was poor
+        predicted = max(self.block_memory)
+        measured = max(m for m in self.memory.values() if m is not None)
+        logger.log(
+            logging.INFO if measured > 1.2 * predicted else logging.DEBUG,
+            " Peak block memory: predicted %.2f GB, measured %.2f GB\n",
+            predicted / 1e9,
+            measured / 1e9,
+        )
+
     def summary(self):
         """
         Get a summary of the processing
@@ -14,8 +14,10 @@
 from dials.algorithms.profile_model.ellipsoid import mosaicity_from_eigen_decomposition
 from dials.algorithms.profile_model.ellipsoid.model import (
     compute_change_of_basis_operation,
+    compute_change_of_basis_operations,
 )
 from dials.algorithms.profile_model.ellipsoid.parameterisation import (
+    BatchReflectionModelState,
     ReflectionModelState,
 )
 from dials.array_family import flex
@@ -389,6 +391,13 @@ def fisher_information(self):
 
 
 class MaximumLikelihoodTarget:
+    """
+    The joint likelihood of all reflections, equivalent to the sum over a
+    ReflectionLikelihood for each reflection, but with the reflections stacked
+    along the first axis of each array and evaluated at once.
+
+    """
+
     def __init__(
         self, model, s0, sp_list, h_list, ctot_list, mobs_list, sobs_list, panel_ids
     ):
@@ -401,39 +410,100 @@ def __init__(
         # Save the model
         self.model = model
 
+        # Save the data, with the reflections along the first axis
+        self.s0 = np.array(s0, dtype=np.float64).reshape(3)
+        self.norm_s0 = norm(self.s0)
+        self.ctot = np.array(ctot_list, dtype=np.float64)
+        self.mobs = np.array(mobs_list, dtype=np.float64).T
+        self.sobs = np.transpose(np.array(sobs_list, dtype=np.float64), (2, 0, 1))
+
         # Compute the change of basis for each reflection
-        self.data = []
-        for i in range(len(h_list)):
-            self.data.append(
-                ReflectionLikelihood(
-                    model,
-                    s0,
-                    sp_list[:, i],
-                    matrix.col(h_list[i]),
-                    ctot_list[i],
-                    mobs_list[:, i],
-                    sobs_list[:, :, i],
-                    panel_ids[i],
-                )
-            )
+        self.R = compute_change_of_basis_operations(self.s0, np.array(sp_list))
+        self.R_cctbx = [matrix.sqr(flex.double(R.flatten().tolist())) for R in self.R]
+
+        self.modelstate = BatchReflectionModelState(
+            model, self.s0, [tuple(h) for h in h_list]
+        )
+        self._rotate_covariance()
+        self._rotate_mean()
+        self._compute_conditional()
+
+    def _rotate_covariance(self):
+        # Rotate the covariance matrices and their first derivatives
+        R = self.R
+        self.S = np.einsum(
+            "nij,njk,nlk->nil", R, self.modelstate.mosaicity_covariance_matrix, R
+        )
+        self.dS = np.einsum("nij,njkp,nlk->nilp", R, self.modelstate.get_dS_dp(), R)
+
+    def _rotate_mean(self):
+        # Rotate the s2 vectors and their first derivatives
+        s2 = self.s0 + self.modelstate.get_r()
+        self.mu = np.einsum("nij,nj->ni", self.R, s2)
+        self.dmu = np.einsum("nij,njp->nip", self.R, self.modelstate.get_dr_dp())
+
+    def _compute_conditional(self):
+        """
+        Compute the conditional distributions and their first derivatives, as
+        in ConditionalDistribution
+
+        """
+        S, dS, mu, dmu = self.S, self.dS, self.mu, self.dmu
+
+        # Partition the covariance matrices
+        S11 = S[:, 0:2, 0:2]
+        S12 = S[:, 0:2, 2]
+        S21 = S[:, 2, 0:2]
+        self.S22 = S[:, 2, 2]
+        S22_inv = 1 / self.S22
+
+        # The distance from the Ewald sphere
+        self.epsilon = self.norm_s0 - mu[:, 2]
+
+        # The conditional means and covariance matrices
+        self.mubar = mu[:, 0:2] + S12 * (S22_inv * self.epsilon)[:, None]
+        self.Sbar = S11 - S12[:, :, None] * S21[:, None, :] * S22_inv[:, None, None]
+        self.Sbar_inv = inv(self.Sbar)
+
+        # The first derivatives of the conditional covariance matrices
+        dS12 = dS[:, 0:2, 2, :]
+        dS21 = dS[:, 2, 0:2, :]
+        self.dS22 = dS[:, 2, 2, :]
+        self.dSbar = (
+            dS[:, 0:2, 0:2, :]
+            + S12[:, :, None, None]
+            * S21[:, None, :, None]
+            * (S22_inv**2)[:, None, None, None]
+            * self.dS22[:, None, None, :]
+            - S12[:, :, None, None] * dS21[:, None, :, :] * S22_inv[:, None, None, None]
+            - dS12[:, :, None, :] * S21[:, None, :, None] * S22_inv[:, None, None, None]
+        )
+
+        # The first derivatives of the conditional means
+        dep = -dmu[:, 2, :]
+        self.dmbar = (
+            dmu[:, 0:2, :]
+            + dS12 * (S22_inv * self.epsilon)[:, None, None]
+            - S12[:, :, None]
+            * (S22_inv**2 * self.epsilon)[:, None, None]
+            * self.dS22[:, None, :]
+            + S12[:, :, None] * S22_inv[:, None, None] * dep[:, None, :]
+        )
 
     def update(self):
-        for d in self.data:
-            d.modelstate.update()  # update the ReflectionModelState
-            d.update()  # update the ReflectionLikelihood
+        self.modelstate.update()  # update the BatchReflectionModelState
+        if not self.model.is_mosaic_spread_fixed:
+            self._rotate_covariance()
+        self._rotate_mean()
+        self._compute_conditional()
 
     def mse(self):
         """
         The MSE in local reflection coordinates
 
         """
-        mse = 0
-        for i in range(len(self.data)):
-            mbar = self.data[i].conditional.mean()
-            xobs = self.data[i].mobs
-            mse += np.dot((xobs - mbar).T, xobs - mbar)
-        mse /= len(self.data)
-        return mse
+        c_d = self.mobs - self.mubar
+        return np.einsum("ni,ni->", c_d, c_d) / len(c_d)
 
     def rmsd(self):
         """
@@ -442,16 +512,18 @@ def rmsd(self):
         """
         mse_x = 0.0
         mse_y = 0.0
-        for i in range(len(self.data)):
-            R = self.data[i].R_cctbx
-            mbar = tuple(self.data[i].conditional.mean().flatten())
-            xobs = tuple(self.data[i].mobs.flatten())
-            norm_s0 = self.data[i].norm_s0
-            rse_i = rse(R, mbar, xobs, norm_s0, self.model.experiment.detector)
+        for R, mbar, xobs in zip(self.R_cctbx, self.mubar, self.mobs):
+            rse_i = rse(
+                R,
+                tuple(mbar),
+                tuple(xobs),
+                self.norm_s0,
+                self.model.experiment.detector,
+            )
             mse_x += rse_i[0]
             mse_y += rse_i[1]
-        mse_x /= len(self.data)
-        mse_y /= len(self.data)
+        mse_x /= len(self.R_cctbx)
+        mse_y /= len(self.R_cctbx)
         return np.sqrt(np.array([mse_x, mse_y]))
 
     def log_likelihood(self):
@@ -459,31 +531,77 @@ def log_likelihood(self):
         The joint log likelihood
 
         """
-        return sum(d.log_likelihood() for d in self.data)
+        # The marginal likelihood
+        m_lnL = self.ctot * (np.log(self.S22) + self.epsilon**2 / self.S22)
+
+        # The conditional likelihood
+        c_d = self.mobs - self.mubar
+        V = self.sobs + c_d[:, :, None] * c_d[:, None, :]
+        c_lnL = self.ctot * (
+            np.log(det(self.Sbar)) + np.einsum("nij,nji->n", self.Sbar_inv, V)
+        )
+
+        # Return the joint likelihood
+        return -0.5 * float(np.sum(m_lnL + c_lnL))
+
+    def _first_derivatives(self):
+        """
+        The first derivatives for each reflection (an array of size n_refl x n)
+
+        """
+        S22_inv = 1 / self.S22
+        c_d = self.mobs - self.mubar
+
+        # Compute the derivative wrt parameter i
+        V1 = self.sobs + c_d[:, :, None] * c_d[:, None, :]
+        V2 = np.identity(2) - np.matmul(self.Sbar_inv, V1)
+
+        V_vec = self.ctot[:, None] * np.einsum(
+            "nij,njkl,nki->nl", self.Sbar_inv, self.dSbar, V2
+        )
+        dep = -self.dmu[:, 2, :]
+        U_vec = self.ctot[:, None] * (
+            S22_inv[:, None] * self.dS22 * (1.0 - S22_inv * self.epsilon**2)[:, None]
+            + 2 * (S22_inv * self.epsilon)[:, None] * dep
+        )
+        W_vec = (
+            -2.0
+            * self.ctot[:, None]
+            * np.einsum("nij,nj,nil->nl", self.Sbar_inv, c_d, self.dmbar)
+        )
+
+        return -0.5 * (U_vec + V_vec + W_vec)
 
     def jacobian(self):
         """
         Return the Jacobian
 
         """
-        return flex.double([list(d.first_derivatives()) for d in self.data])
+        return flumpy.from_numpy(np.ascontiguousarray(self._first_derivatives()))
 
     def first_derivatives(self):
         """
         The joint first derivatives
 
         """
-        dL = 0
-        for d in self.data:
-            dL += d.first_derivatives()
-        return dL
+        return self._first_derivatives().sum(axis=0)
 
     def fisher_information(self):
         """
         The joint fisher information
 
         """
-        return sum(d.fisher_information() for d in self.data)
+        S22_inv = 1 / self.S22
+        A = np.einsum("nac,ncbj->nabj", self.Sbar_inv, self.dSbar)
+
+        # Compute the fisher information wrt parameter i j
+        U = np.einsum("nj,ni->nji", self.dS22, self.dS22) * (S22_inv**2)[:, None, None]
+        V = np.einsum("nabj,nbai->nji", A, A)
+        W = 2 * np.einsum("naj,nab,nbi->nji", self.dmbar, self.Sbar_inv, self.dmbar)
+        X = 2 * np.einsum("nj,ni->nji", self.dmu[:, 2, :], self.dmu[:, 2, :])
+        X *= S22_inv[:, None, None]
+        I = np.einsum("n,nji->ji", 0.5 * self.ctot, U + V + W + X)
+        return flumpy.from_numpy(np.ascontiguousarray(I))
 
 
 def line_search(func, x, p, tau=0.5, delta=1.0, tolerance=1e-7):
@@ -7,10 +7,11 @@
 import copy
 import json
 import logging
+import multiprocessing
+import weakref
 from io import StringIO
 
 import libtbx
-from libtbx import easy_mp
 from libtbx.phil import parse
 from scitbx import lbfgs, sparse
 from scitbx.array_family import flex
@@ -158,6 +159,107 @@ def from_json_file(cls, filename):
         return j
 
 
+# The refinery to be copied into worker processes as they are forked
+_refinery_to_fork = None
+
+
+def _refinery_worker(rank, nproc, connection):
+    """Evaluate a share of the blocks of matches for each parameter vector
+    received, using the copy of the refinery inherited from the parent process"""
+
+    refinery = _refinery_to_fork
+    # The parent process reports on the same steps
+    logging.disable(logging.WARNING)
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        method, x = task
+        try:
+            refinery.x = flex.double(x)
+            refinery.prepare_for_step()
+            target = refinery._target
+            blocks = target.split_matches_into_blocks(nproc=nproc)[rank::nproc]
+            result = getattr(refinery, method)(blocks)
+            connection.send((True, (target.get_num_matches(), result)))
+        except Exception as e:
+            connection.send((False, f"{type(e).__name__}: {e}"))
+    connection.close()
+
+
+class _RefineryWorkers:
+    """Worker processes forked from a Refinery, each of which keeps its own copy
+    of the target, the prediction parameterisation and the reflections. The
+    memory holding these is shared with the parent until written to, so only
+    the parameter vector is sent to the workers for each step, and only their
+    results are sent back."""
+
+    def __init__(self, refinery, nproc):
+        global _refinery_to_fork
+        context = multiprocessing.get_context("fork")
+        self._connections = []
+        self._processes = []
+        _refinery_to_fork = refinery
+        try:
+            for rank in range(nproc):
+                connection, child_connection = context.Pipe()
+                process = context.Process(
+                    target=_refinery_worker,
+                    args=(rank, nproc, child_connection),
+                    daemon=True,
+                )
+                process.start()
+                child_connection.close()
+                self._connections.append(connection)
+                self._processes.append(process)
+        finally:
+            _refinery_to_fork = None
+
+    def send(self, method, x):
+        """Start each worker evaluating the named refinery method for its share
+        of the blocks of matches at the parameter vector x"""
+        for connection in self._connections:
+            connection.send((method, list(x)))
+
+    def receive(self):
+        """Wait for the results of all workers. Return the set of the numbers of
+        matches seen by the workers, and the list of their results"""
+        n_matches = set()
+        results = []
+        error = None
+        for connection in self._connections:
+            try:
+                success, payload = connection.recv()
+            except EOFError:
+                error = error or "A refinement worker process exited unexpectedly"
+                continue
+            if success:
+                n_matches.add(payload[0])
+                results.append(payload[1])
+            else:
+                error = error or payload
+        if error:
+            raise DialsRefineRuntimeError(error)
+        return n_matches, results
+
+    def close(self):
+        for connection in self._connections:
+            try:
+                connection.send(None)
+            except OSError:
+                pass
+            connection.close()
+        for process in self._processes:
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+        self._connections = []
+        self._processes = []
+
+
 class Refinery:
     """Interface for Refinery objects. This should be subclassed and the run
     method implemented."""
@@ -242,8 +344,11 @@ def __init__(
         if tracking.track_out_of_sample_rmsd:
             self.history.add_column("out_of_sample_rmsd")
 
-        # number of processes to use, for engines that support multiprocessing
+        # number of processes to use, for engines that support multiprocessing,
+        # and the worker processes, which are started when first required
         self._nproc = 1
+        self._workers = None
+        self._close_workers = None
 
         self.prepare_for_step()
 
@@ -459,8 +564,55 @@ def test_objective_increasing_but_not_nref(self):
     def set_nproc(self, nproc):
         """Set number of processors for multiprocessing. Override in derived classes
         if a policy dictates that this must not be user-controlled"""
+        if nproc > 1 and "fork" not in multiprocessing.get_all_start_methods():
+            # The workers rely on inheriting the state of the refinery
+            raise NotImplementedError()
+        if nproc != self._nproc:
+            self.close_workers()
         self._nproc = nproc
 
+    def prepare_for_step_in_workers(self, method):
+        """Prepare for the step as prepare_for_step, while the worker processes
+        evaluate the named method for their shares of the blocks of matches at
+        the same parameter values. Return the results from the workers that
+        were given any blocks.
+
+        If the workers fail, or do not agree with this process on the matched
+        reflections, then their copies of the refinery may be out of date, so
+        they are restarted from the current state and the step is repeated."""
+
+        for attempt in range(2):
+            if self._workers is None:
+                self._workers = _RefineryWorkers(self, self._nproc)
+                self._close_workers = weakref.finalize(self, self._workers.close)
+            self._workers.send(method, self.x)
+            if attempt == 0:
+                try:
+                    self.prepare_for_step()
+                except Exception:
+                    self.close_workers()
+                    raise
+            try:
+                n_matches, results = self._workers.receive()
+            except DialsRefineRuntimeError:
+                self.close_workers()
+                if attempt:
+                    raise
+                continue
+            if n_matches == {self._target.get_num_matches()}:
+                return [result for result in results if result is not None]
+            self.close_workers()
+        raise DialsRefineRuntimeError(
+            "Refinement worker processes do not agree on the matched reflections"
+        )
+
+    def close_workers(self):
+        """Stop any worker processes started for multiprocessing"""
+        if self._close_workers is not None:
+            self._close_workers()
+        self._workers = None
+        self._close_workers = None
+
     def run(self):
         """
         To be implemented by derived class. It is expected that each step of
@@ -527,27 +679,28 @@ def compute_functional_and_gradients(self):
         self._g = dL_dp
         return self._f, self._g
 
-    def compute_functional_gradients_and_curvatures(self):
-        self.prepare_for_step()
+    def _observation_terms(self, blocks):
+        """The functional, gradients and curvatures summed over blocks of
+        matches, or None if there are no blocks"""
+        if not blocks:
+            return None
+        task_results = [
+            self._target.compute_functional_gradients_and_curvatures(block)
+            for block in blocks
+        ]
+        flist, glist, clist = zip(*task_results)
+        return sum(flist), [sum(g) for g in zip(*glist)], [sum(c) for c in zip(*clist)]
 
+    def compute_functional_gradients_and_curvatures(self):
         # observation terms
-        blocks = self._target.split_matches_into_blocks(nproc=self._nproc)
         if self._nproc > 1:
-            task_results = easy_mp.parallel_map(
-                func=self._target.compute_functional_gradients_and_curvatures,
-                iterable=blocks,
-                processes=self._nproc,
-                method="multiprocessing",
-                preserve_exception_message=True,
-            )
-
+            task_results = self.prepare_for_step_in_workers("_observation_terms")
         else:
-            task_results = [
-                self._target.compute_functional_gradients_and_curvatures(block)
-                for block in blocks
-            ]
+            self.prepare_for_step()
+            blocks = self._target.split_matches_into_blocks(nproc=self._nproc)
+            task_results = [self._observation_terms(blocks)]
 
-        # reduce blockwise results
+        # reduce results from each process
         flist, glist, clist = zip(*task_results)
         f = sum(flist)
         g = [sum(g) for g in zip(*glist)]
@@ -688,6 +841,24 @@ def restart(self):
     def parameter_vector_norm(self):
         return self.x.norm()
 
+    def _observation_equations(self, blocks):
+        """Generate the residuals, constrained Jacobian and weights for each of
+        the blocks of matches"""
+        for block in blocks:
+            (
+                residuals,
+                jacobian,
+                weights,
+            ) = self._target.compute_residuals_and_gradients(block)
+            if self._constr_manager is not None:
+                jacobian = self._constr_manager.constrain_jacobian(jacobian)
+            yield residuals, jacobian, weights
+
+    def _observation_equations_list(self, blocks):
+        """The observation equations for the blocks of matches, as a list to be
+        sent back from a worker process"""
+        return list(self._observation_equations(blocks))
+
     def build_up(self, objective_only=False):
         # code here to calculate the residuals. Rely on the target class
         # for this
@@ -696,8 +867,14 @@ def build_up(self, objective_only=False):
         # observations... See http://en.wikipedia.org/wiki/Non-linear_least_squares
         # at 'diagonal weight matrix'
 
-        # set current parameter values
-        self.prepare_for_step()
+        # set current parameter values, with the worker processes (if any)
+        # calculating the observation equations at the same time
+        if self._nproc > 1 and not objective_only:
+            worker_results = self.prepare_for_step_in_workers(
+                "_observation_equations_list"
+            )
+        else:
+            self.prepare_for_step()
 
         # Reset the state to construction time, i.e. no equations accumulated
         self.reset()
@@ -706,60 +883,22 @@ def build_up(self, objective_only=False):
         if objective_only:
             residuals, weights = self._target.compute_residuals()
             self.add_residuals(residuals, weights)
-        else:
-            blocks = self._target.split_matches_into_blocks(nproc=self._nproc)
-
-            if self._nproc > 1:
-                # ensure the jacobian is not tracked
-                self._jacobian = None
-
-                # processing functions
-                def task_wrapper(block):
-                    (
-                        residuals,
-                        jacobian,
-                        weights,
-                    ) = self._target.compute_residuals_and_gradients(block)
-                    return {
-                        "residuals": residuals,
-                        "jacobian": jacobian,
-                        "weights": weights,
-                    }
-
-                def callback_wrapper(result):
-                    j = result["jacobian"]
-                    if self._constr_manager is not None:
-                        j = self._constr_manager.constrain_jacobian(j)
-                    self.add_equations(result["residuals"], j, result["weights"])
-                    # no longer need the result
-                    result["residuals"] = None
-                    result["jacobian"] = None
-                    result["weights"] = None
-                    return
-
-                easy_mp.parallel_map(
-                    func=task_wrapper,
-                    iterable=blocks,
-                    processes=self._nproc,
-                    callback=callback_wrapper,
-                    method="multiprocessing",
-                    preserve_exception_message=True,
-                )
-
-            else:
-                for block in blocks:
-                    (
-                        residuals,
-                        jacobian,
-                        weights,
-                    ) = self._target.compute_residuals_and_gradients(block)
-                    if self._constr_manager is not None:
-                        jacobian = self._constr_manager.constrain_jacobian(jacobian)
+        elif self._nproc > 1:
+            # ensure the jacobian is not tracked
+            self._jacobian = None
 
+            for equations in worker_results:
+                for residuals, jacobian, weights in equations:
                     self.add_equations(residuals, jacobian, weights)
+            # no longer need the results
+            del worker_results
+        else:
+            blocks = self._target.split_matches_into_blocks(nproc=self._nproc)
+            for residuals, jacobian, weights in self._observation_equations(blocks):
+                self.add_equations(residuals, jacobian, weights)
 
-                # Keep reference to the Jacobian in case required by the Journal
-                self._jacobian = jacobian
+            # Keep reference to the Jacobian in case required by the Journal
+            self._jacobian = jacobian
 
         # restraints terms
         restraints = self._target.compute_restraints_residuals_and_gradients()
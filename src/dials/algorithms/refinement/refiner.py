@@ -1055,7 +1055,10 @@ def run(self):
         for i, crystal in enumerate(self._experiments.crystals()):
             logger.debug(ordinal_number(i) + " " + str(crystal))
 
-        self._refinery.run()
+        try:
+            self._refinery.run()
+        finally:
+            self._refinery.close_workers()
 
         # These involve calculation, so skip them when output is quiet
         if logger.getEffectiveLevel() < logging.ERROR:
@@ -437,21 +437,27 @@ def compute_residuals_and_gradients(
         else:
             matches = self._matches
 
-        # The gradients are provided as a list of dictionaries, where the
-        # dictionaries have keys corresponding to gradients of the different types
-        # of residual involved. For example, for scans the keys are 'dX_dp',
-        # 'dY_dp', 'dphi_dp'. Reshape this data structure so that all the gradients
-        # of a particular type of residual are kept together
-        gradients = self.calculate_gradients(matches)
-        reshaped = []
-        for key in self._grad_names:
-            reshaped.append([g[key] for g in gradients])
-
         residuals, weights = self._extract_residuals_and_weights(matches)
 
-        nelem = len(matches) * len(self._grad_names)
+        nref = len(matches)
         nparam = len(self._prediction_parameterisation)
-        jacobian = self._build_jacobian(reshaped, nelem=nelem, nparam=nparam)
+        jacobian = self._new_jacobian(nelem=nref * len(self._grad_names), nparam=nparam)
+
+        # The gradients for each parameter are provided as a dictionary, with
+        # keys corresponding to gradients of the different types of residual
+        # involved. For example, for scans the keys are 'dX_dp', 'dY_dp',
+        # 'dphi_dp'. Paste these into the column of the Jacobian for the parameter
+        # as soon as they are calculated, so that the gradients for all the
+        # parameters are never held at once. The callback is called once for each
+        # parameter, in order.
+        iparams = iter(range(nparam))
+
+        def set_jacobian_column(result):
+            grads = [result[key] for key in self._grad_names]
+            self._set_jacobian_column(jacobian, next(iparams), grads, nref=nref)
+            return None
+
+        self.calculate_gradients(matches, callback=set_jacobian_column)
 
         return (residuals, jacobian, weights)
 
@@ -472,24 +478,20 @@ def compute_restraints_residuals_and_gradients(self):
             return None
 
     @staticmethod
-    def _build_jacobian(
-        grads_each_dim, nelem=None, nparam=None
-    ) -> sparse.matrix | flex.double:
-        """construct Jacobian from lists of gradient vectors. The elements of
-        grads_each_dim refer to the gradients of each dimension of the problem
-        (e.g. dX, dY, dZ). The elements for a single dimension give the arrays
-        of gradients of the associated residual for each parameter. This method
-        may be overridden for the case where these vectors use sparse storage"""
+    def _new_jacobian(nelem, nparam) -> sparse.matrix | flex.double:
+        """construct an empty Jacobian, to be filled column by column by
+        _set_jacobian_column. This method may be overridden for the case where
+        the gradient vectors use sparse storage"""
 
-        jacobian = flex.double(flex.grid(nelem, nparam))
-        # loop over parameters
-        for i in range(nparam):
-            col = grads_each_dim[0][i]
-            for g in grads_each_dim[1:]:
-                col.extend(g[i])
-            jacobian.matrix_paste_column_in_place(col, i)
+        return flex.double(flex.grid(nelem, nparam), 0.0)
 
-        return jacobian
+    @classmethod
+    def _set_jacobian_column(cls, jacobian, iparam, grads, nref):
+        """set a column of the Jacobian from the gradient vectors of each
+        dimension of the problem (e.g. dX, dY, dZ) for a single parameter. Each
+        gradient vector has an element for each of nref reflections"""
+
+        jacobian.matrix_paste_column_in_place(cls._concatenate_gradients(grads), iparam)
 
     @staticmethod
     def _concatenate_gradients(grads):
@@ -667,28 +669,20 @@ class SparseGradientsMixin:
     that employed sparse storage."""
 
     @staticmethod
-    def _build_jacobian(grads_each_dim, nelem=None, nparam=None):
-        """construct Jacobian from lists of sparse gradient vectors."""
-
-        nref = int(nelem / len(grads_each_dim))
-
-        blocks = [sparse.matrix(nref, nparam) for _ in grads_each_dim]
-        jacobian = sparse.matrix(nelem, nparam)
+    def _new_jacobian(nelem, nparam):
+        """construct an empty sparse Jacobian."""
 
-        # loop over parameters, building full width blocks of the full Jacobian
-        for i in range(nparam):
-            for j, block in enumerate(blocks):
-                grad = grads_each_dim[j]
-                block[:, i] = grad[i]
-                # Having copied this block, delete the source data
-                grads_each_dim[j][i] = None
+        return sparse.matrix(nelem, nparam)
 
-        # set the blocks in the Jacobian
-        for i, block in enumerate(blocks):
-            jacobian.assign_block(block, (i * nref), 0)
-            blocks[i] = None
-
-        return jacobian
+    @staticmethod
+    def _set_jacobian_column(jacobian, iparam, grads, nref):
+        """set a column of the sparse Jacobian from sparse gradient vectors,
+        copying only their non-zero elements."""
+
+        column = sparse.matrix(nref, 1)
+        for i, grad in enumerate(grads):
+            column[:, 0] = grad
+            jacobian.assign_block(column, i * nref, iparam)
 
     @staticmethod
     def _concatenate_gradients(grads):
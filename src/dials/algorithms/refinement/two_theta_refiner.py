@@ -289,6 +289,8 @@ def _grads_xl_unit_cell_loop(self, reflections, results, callback=None):
                     results[self._iparam][self._grad_names[0]].set_selected(
                         isel, d2theta
                     )
+                if callback is not None:
+                    results[self._iparam] = callback(results[self._iparam])
 
                 # increment the parameter index pointer
                 self._iparam += 1
@@ -11,6 +11,7 @@ namespace dials_scaling { namespace boost_python {
   void export_calc_theta_phi();
   void export_calc_sigmasq();
   void export_row_multiply();
+  void export_stack_derivatives();
   void export_determine_outlier_indices();
   void export_calc_dIh_by_dpi();
   void export_calc_jacobian();
@@ -28,6 +29,7 @@ namespace dials_scaling { namespace boost_python {
     export_calc_theta_phi();
     export_calc_sigmasq();
     export_row_multiply();
+    export_stack_derivatives();
     export_determine_outlier_indices();
     export_calc_dIh_by_dpi();
     export_calc_jacobian();
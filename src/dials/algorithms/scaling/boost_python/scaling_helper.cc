@@ -1,15 +1,100 @@
+#include <boost/optional.hpp>
 #include <boost/python.hpp>
 #include <boost/python/def.hpp>
 #include <dials/algorithms/scaling/scaling_helper.h>
 #include <cctbx/miller.h>
 #include <dials/array_family/scitbx_shared_and_versa.h>
+#include <dials/util/scoped_gil_release.h>
 
 namespace dials_scaling { namespace boost_python {
 
   using namespace boost::python;
 
+  using dials::util::ScopedGILRelease;
   using scitbx::sparse::matrix;
 
+  // The scales and derivatives of each dataset are calculated in separate
+  // threads during multi-dataset scaling, so release the GIL for the parts of
+  // the calculation which only work on C++ memory. The arguments share their
+  // memory with Python objects, whose reference counts are not thread safe,
+  // so they are copied before the GIL is released. The result is kept until
+  // the GIL is reacquired, for conversion to a Python object.
+
+  // Copy a sparse matrix, so that the copy shares no memory with the original
+  matrix<double> copy_matrix(matrix<double> m) {
+    matrix<double> result(m.n_rows(), m.n_cols());
+    for (std::size_t j = 0; j < m.n_cols(); j++) {
+      for (matrix<double>::row_iterator p = m.col(j).begin(); p != m.col(j).end();
+           ++p) {
+        result(p.index(), j) = *p;
+      }
+    }
+    return result;
+  }
+
+  scitbx::af::shared<double> copy_array(scitbx::af::const_ref<double> a) {
+    return scitbx::af::shared<double>(a.begin(), a.end());
+  }
+
+  matrix<double> row_multiply_without_gil(matrix<double> m,
+                                          scitbx::af::const_ref<double> v) {
+    matrix<double> m_copy = copy_matrix(m);
+    scitbx::af::shared<double> v_copy = copy_array(v);
+    boost::optional<matrix<double> > result;
+    {
+      ScopedGILRelease release;
+      result = row_multiply(m_copy, v_copy.const_ref());
+    }
+    return *result;
+  }
+
+  MultiValueWeights multi_value_weight_without_gil(
+    GaussianSmootherFirstFixed &self,
+    const scitbx::af::const_ref<double> x,
+    const scitbx::af::const_ref<double> values) {
+    scitbx::af::shared<double> x_copy = copy_array(x);
+    scitbx::af::shared<double> values_copy = copy_array(values);
+    boost::optional<MultiValueWeights> result;
+    {
+      ScopedGILRelease release;
+      result = self.multi_value_weight(x_copy.const_ref(), values_copy.const_ref());
+    }
+    return *result;
+  }
+
+  MultiValueWeights multi_value_weight_first_fixed_without_gil(
+    GaussianSmootherFirstFixed &self,
+    const scitbx::af::const_ref<double> x,
+    const scitbx::af::const_ref<double> values) {
+    scitbx::af::shared<double> x_copy = copy_array(x);
+    scitbx::af::shared<double> values_copy = copy_array(values);
+    boost::optional<MultiValueWeights> result;
+    {
+      ScopedGILRelease release;
+      result = self.multi_value_weight_first_fixed(x_copy.const_ref(),
+                                                   values_copy.const_ref());
+    }
+    return *result;
+  }
+
+  matrix<double> stack_derivatives_wrapper(
+    boost::python::list blocks,
+    scitbx::af::const_ref<std::size_t> col_offsets,
+    std::size_t n_rows,
+    std::size_t n_cols) {
+    std::vector<matrix<double> > matrices;
+    for (std::size_t k = 0; k < len(blocks); ++k) {
+      matrices.push_back(copy_matrix(extract<matrix<double> >(blocks[k])));
+    }
+    scitbx::af::shared<std::size_t> offsets(col_offsets.begin(), col_offsets.end());
+    boost::optional<matrix<double> > result;
+    {
+      ScopedGILRelease release;
+      result = stack_derivatives(matrices, offsets.const_ref(), n_rows, n_cols);
+    }
+    return *result;
+  }
+
   void export_determine_outlier_indices() {
     def("determine_outlier_indices",
         &determine_outlier_indices,
@@ -58,7 +143,13 @@ namespace dials_scaling { namespace boost_python {
   }
 
   void export_row_multiply() {
-    def("row_multiply", &row_multiply, (arg("m"), arg("v")));
+    def("row_multiply", &row_multiply_without_gil, (arg("m"), arg("v")));
+  }
+
+  void export_stack_derivatives() {
+    def("stack_derivatives",
+        &stack_derivatives_wrapper,
+        (arg("blocks"), arg("col_offsets"), arg("n_rows"), arg("n_cols")));
   }
 
   void export_limit_outlier_weights() {
@@ -98,9 +189,9 @@ namespace dials_scaling { namespace boost_python {
       .def("value_weight", &GaussianSmootherFirstFixed::value_weight)
       .def("value_weight_first_fixed",
            &GaussianSmootherFirstFixed::value_weight_first_fixed)
-      .def("multi_value_weight", &GaussianSmootherFirstFixed::multi_value_weight)
+      .def("multi_value_weight", &multi_value_weight_without_gil)
       .def("multi_value_weight_first_fixed",
-           &GaussianSmootherFirstFixed::multi_value_weight_first_fixed);
+           &multi_value_weight_first_fixed_without_gil);
   }
 
   void export_split_unmerged() {
@@ -13,7 +13,9 @@
 
 from __future__ import annotations
 
+import concurrent.futures
 import copy
+import functools
 import logging
 import time
 from io import StringIO
@@ -59,7 +61,7 @@
 from dials.util import tabulate
 from dials.util.observer import Subject
 from dials_scaling_ext import calc_sigmasq as cpp_calc_sigmasq
-from dials_scaling_ext import row_multiply
+from dials_scaling_ext import row_multiply, stack_derivatives
 
 logger = logging.getLogger("dials")
 
@@ -979,34 +981,30 @@ def update_for_minimisation(self, apm, block_id):
         self._update_for_minimisation(apm, block_id, calc_Ih=True)
 
     def _update_for_minimisation(self, apm, block_id, calc_Ih=True):
+        calculate = functools.partial(
+            RefinerCalculator.calculate_scales_and_derivatives, block_id=block_id
+        )
+        # Sparse matrices are not pickleable, so calculate the datasets in
+        # threads; the C++ calculations release the GIL.
+        nproc = min(self.params.scaling_options.nproc, len(apm.apm_list))
+        if nproc > 1:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=nproc) as pool:
+                results = list(pool.map(calculate, apm.apm_list))
+        else:
+            results = [calculate(apm_i) for apm_i in apm.apm_list]
         scales = flex.double([])
-        derivs = []
-        for apm_i in apm.apm_list:
-            scales_i, derivs_i = RefinerCalculator.calculate_scales_and_derivatives(
-                apm_i, block_id
-            )
+        for scales_i, _ in results:
             scales.extend(scales_i)
-            derivs.append(derivs_i)
-        deriv_matrix = sparse.matrix(scales.size(), apm.n_active_params)
-        start_row_no = 0
-        for j, deriv in enumerate(derivs):
-            deriv_matrix.assign_block(deriv, start_row_no, apm.apm_data[j]["start_idx"])
-            start_row_no += deriv.n_rows
+        deriv_matrix = stack_derivatives(
+            [derivs_i for _, derivs_i in results],
+            flex.size_t([apm.apm_data[j]["start_idx"] for j in range(len(results))]),
+            scales.size(),
+            apm.n_active_params,
+        )
         self.Ih_table.set_inverse_scale_factors(flumpy.to_numpy(scales), block_id)
         self.Ih_table.set_derivatives(deriv_matrix, block_id)
         if calc_Ih:
             self.Ih_table.calc_Ih(block_id)
-        # The parallelisation below would work if sparse matrices were
-        # pickleable (I think!) - with more benefit for larger number of datasets.'''
-        """def task_wrapper(block):
-            s, d = RefinerCalculator.calculate_scales_and_derivatives(block)
-            return s, d
-        blocks = apm.apm_list
-        task_results = easy_mp.parallel_map(func=task_wrapper, iterable=blocks,
-            processes=n_datasets, method="multiprocessing",
-            preserve_exception_message=True
-        )
-        scales_list, derivs_list = zip(*task_results)"""
 
     def _update_model_data(self):
         for i, scaler in enumerate(self.active_scalers):
@@ -10,6 +10,7 @@
 #include <dials/algorithms/refinement/gaussian_smoother.h>
 #include <scitbx/random.h>
 #include <cctbx/miller.h>
+#include <vector>
 
 typedef scitbx::sparse::matrix<double>::column_type col_type;
 
@@ -277,6 +278,43 @@ scitbx::sparse::matrix<double> row_multiply(scitbx::sparse::matrix<double> m,
   return result;
 }
 
+/**
+ * Stack derivative matrices on top of each other in a single matrix, placing
+ * the columns of each block at the given column offset.
+ * @param blocks The derivative matrices, in row order
+ * @param col_offsets The first column of each block in the result
+ * @param n_rows The number of rows of the result
+ * @param n_cols The number of columns of the result
+ */
+scitbx::sparse::matrix<double> stack_derivatives(
+  std::vector<scitbx::sparse::matrix<double> > &blocks,
+  scitbx::af::const_ref<std::size_t> col_offsets,
+  std::size_t n_rows,
+  std::size_t n_cols) {
+  DIALS_ASSERT(blocks.size() == col_offsets.size());
+  std::size_t total_rows = 0;
+  for (std::size_t k = 0; k < blocks.size(); ++k) {
+    DIALS_ASSERT(col_offsets[k] + blocks[k].n_cols() <= n_cols);
+    total_rows += blocks[k].n_rows();
+  }
+  DIALS_ASSERT(total_rows <= n_rows);
+  scitbx::sparse::matrix<double> result(n_rows, n_cols);
+  std::size_t row0 = 0;
+  for (std::size_t k = 0; k < blocks.size(); ++k) {
+    scitbx::sparse::matrix<double> &m = blocks[k];
+    m.compact();
+    for (std::size_t j = 0; j < m.n_cols(); j++) {
+      for (scitbx::sparse::matrix<double>::row_iterator p = m.col(j).begin();
+           p != m.col(j).end();
+           ++p) {
+        result(row0 + p.index(), col_offsets[k] + j) = *p;
+      }
+    }
+    row0 += m.n_rows();
+  }
+  return result;
+}
+
 scitbx::af::shared<scitbx::vec2<double> > calc_theta_phi(
   scitbx::af::shared<scitbx::vec3<double> > xyz) {
   // physics conventions, phi from 0 to 2pi (xy plane, 0 along x axis), theta from 0 to
@@ -13,7 +13,11 @@
 import dials.extensions
 import dials.util.masking
 from dials.algorithms.background.simple import Linear2dModeller
-from dials.algorithms.spot_finding.finder import SpotFinder, TOFSpotFinder
+from dials.algorithms.spot_finding.finder import (
+    SpotFinder,
+    TOFSpotFinder,
+    WaitForImages,
+)
 from dials.array_family import flex
 
 logger = logging.getLogger(__name__)
@@ -130,6 +134,29 @@ def generate_phil_scope():
       min_chunksize = 20
         .type = int(value_min=1)
         .help = "When chunksize is auto, this is the minimum chunksize"
+
+      pipeline = False
+        .type = bool
+        .help = "Find spots using nproc threads in a single process, reading"
+                "images in the background while others are being processed,"
+                "rather than with multiple processes. Ignored when njobs > 1."
+    }
+
+    watch {
+      enable = False
+        .type = bool
+        .help = "Find spots on a data collection that is still in progress,"
+                "processing each image as soon as it can be read. The"
+                "experiments must describe the complete data collection."
+                "Images are processed in this process, as with mp.pipeline."
+
+      timeout = 60
+        .type = float(value_min=0)
+        .help = "The time in seconds to wait for an image before giving up"
+
+      poll_interval = 0.5
+        .type = float(value_min=0)
+        .help = "The time in seconds between checks for the next image"
     }
   }
   """,
@@ -408,13 +435,17 @@ class SpotFinderFactory:
     """
 
     @staticmethod
-    def from_parameters(params=None, experiments=None, is_stills=False):
+    def from_parameters(
+        params=None, experiments=None, is_stills=False, image_callback=None
+    ):
         """
         Given a set of parameters, construct the spot finder
 
         :param params: The input parameters
         :param is_stills:   [ADVANCED] Force still-handling of experiment
                             ID remapping for dials.stills_process.
+        :param image_callback: A function called as image_callback(imageset,
+                               index, reflections) with the spots on each image
         :returns: The spot finder instance
         """
         if params is None:
@@ -491,6 +522,14 @@ def from_parameters(params=None, experiments=None, is_stills=False):
 
         filter_spots = SpotFinderFactory.configure_filter(params)
 
+        if params.spotfinder.watch.enable:
+            wait_for_images = WaitForImages(
+                timeout=params.spotfinder.watch.timeout,
+                poll_interval=params.spotfinder.watch.poll_interval,
+            )
+        else:
+            wait_for_images = None
+
         return SpotFinder(
             threshold_function=threshold_function,
             mask=params.spotfinder.lookup.mask,
@@ -511,6 +550,9 @@ def from_parameters(params=None, experiments=None, is_stills=False):
             no_shoeboxes_2d=no_shoeboxes_2d,
             min_chunksize=params.spotfinder.mp.min_chunksize,
             is_stills=is_stills,
+            mp_pipeline=params.spotfinder.mp.pipeline,
+            wait_for_images=wait_for_images,
+            image_callback=image_callback,
         )
 
     @staticmethod
@@ -4,10 +4,15 @@
 
 from __future__ import annotations
 
+import collections
+import functools
 import logging
 import math
+import os
 import pickle
+import time
 from collections.abc import Iterable
+from concurrent.futures import ThreadPoolExecutor
 
 import libtbx
 from dxtbx.format.image import ImageBool
@@ -25,6 +30,51 @@
 logger = logging.getLogger(__name__)
 
 
+class WaitForImages:
+    """
+    Read images from a data collection that is still in progress, waiting for
+    each image to become available.
+    """
+
+    def __init__(self, timeout=60, poll_interval=0.5):
+        """
+        Initialise the class
+
+        :param timeout: The time in seconds to wait for an image before giving up
+        :param poll_interval: The time in seconds between checks for an image
+        """
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+
+    def read(self, imageset, index):
+        """
+        Read an image and its mask, waiting until the image can be read.
+
+        Images are first waited for on disk, then reading is retried until it
+        succeeds, to handle images that are still being written or an HDF5 file
+        that has not yet grown to include the image.
+
+        :param imageset: The imageset to read from
+        :param index: The index of the image
+        :return: A tuple of the corrected image data and the mask
+        """
+        deadline = time.monotonic() + self.timeout
+        while True:
+            path = imageset.get_path(index)
+            if not path or os.path.exists(path):
+                try:
+                    image = imageset.get_corrected_data(index)
+                    return image, imageset.get_mask(index)
+                except Exception:
+                    if time.monotonic() > deadline:
+                        raise
+            if time.monotonic() > deadline:
+                raise Sorry(
+                    f"Timed out after {self.timeout}s waiting for image {index + 1} ({path})"
+                )
+            time.sleep(self.poll_interval)
+
+
 class ExtractPixelsFromImage:
     """
     A class to extract pixels from a single image
@@ -38,6 +88,7 @@ def __init__(
         region_of_interest,
         max_strong_pixel_fraction,
         compute_mean_background,
+        wait_for_images=None,
     ):
         """
         Initialise the class
@@ -47,6 +98,7 @@ def __init__(
         :param mask: The image mask
         :param region_of_interest: A region of interest to process
         :param max_strong_pixel_fraction: The maximum fraction of pixels allowed
+        :param wait_for_images: A WaitForImages instance, if images may not exist yet
         """
         self.threshold_function = threshold_function
         self.imageset = imageset
@@ -54,6 +106,7 @@ def __init__(
         self.region_of_interest = region_of_interest
         self.max_strong_pixel_fraction = max_strong_pixel_fraction
         self.compute_mean_background = compute_mean_background
+        self.wait_for_images = wait_for_images
         if self.mask is not None:
             detector = self.imageset.get_detector()
             assert len(self.mask) == len(detector)
@@ -64,6 +117,27 @@ def __call__(self, index):
 
         :param index: The index of the image
         """
+        return self.extract(index, *self.read(index))
+
+    def read(self, index):
+        """
+        Read an image and its mask
+
+        :param index: The index of the image
+        :return: A tuple of the corrected image data and the mask
+        """
+        if self.wait_for_images is not None:
+            return self.wait_for_images.read(self.imageset, index)
+        return self.imageset.get_corrected_data(index), self.imageset.get_mask(index)
+
+    def extract(self, index, image, mask):
+        """
+        Extract strong pixels from an image that has already been read
+
+        :param index: The index of the image
+        :param image: The corrected image data
+        :param mask: The image mask
+        """
         # Get the frame number
         if isinstance(self.imageset, ImageSequence):
             frame = self.imageset.get_array_range()[0] + index
@@ -76,10 +150,6 @@ def __call__(self, index):
         # Create the list of pixel lists
         pixel_list = []
 
-        # Get the image and mask
-        image = self.imageset.get_corrected_data(index)
-        mask = self.imageset.get_mask(index)
-
         # Set the mask
         if self.mask is not None:
             assert len(self.mask) == len(mask)
@@ -177,6 +247,7 @@ def __init__(
         min_spot_size,
         max_spot_size,
         filter_spots,
+        wait_for_images=None,
     ):
         """
         Initialise the class
@@ -186,6 +257,7 @@ def __init__(
         :param mask: The image mask
         :param region_of_interest: A region of interest to process
         :param max_strong_pixel_fraction: The maximum fraction of pixels allowed
+        :param wait_for_images: A WaitForImages instance, if images may not exist yet
         """
         super().__init__(
             imageset,
@@ -194,6 +266,7 @@ def __init__(
             region_of_interest,
             max_strong_pixel_fraction,
             compute_mean_background,
+            wait_for_images=wait_for_images,
         )
 
         # Save some stuff
@@ -201,18 +274,20 @@ def __init__(
         self.max_spot_size = max_spot_size
         self.filter_spots = filter_spots
 
-    def __call__(self, index):
+    def extract(self, index, image, mask):
         """
-        Extract strong pixels from an image
+        Extract strong pixels from an image that has already been read
 
         :param index: The index of the image
+        :param image: The corrected image data
+        :param mask: The image mask
         """
         # Initialise the pixel labeller
         num_panels = len(self.imageset.get_detector())
         pixel_labeller = [PixelListLabeller() for p in range(num_panels)]
 
         # Call the super function
-        result = super().__call__(index)
+        result = super().extract(index, image, mask)
 
         # Add pixel lists to the labeller
         assert len(pixel_labeller) == len(result), "Inconsistent size"
@@ -260,6 +335,53 @@ def __call__(self, task):
         return result, handlers[0].records
 
 
+def pipelined_map(function, indices, nthreads, callback, prefetch=None):
+    """
+    Extract pixels from images in-process, overlapping reading with thresholding.
+
+    Images are read and decoded in order by a single background thread, at most
+    prefetch images ahead of the results that have been handled. The
+    thresholding runs in a pool of threads (the C++ thresholding code releases the
+    GIL) and the results are passed to the callback in image order in the calling
+    thread, so there is no need to pickle the results.
+
+    The extract method of the function is called from several threads at once,
+    so any state it keeps between images must be kept for each thread, as the
+    dispersion threshold extensions do with their buffers.
+
+    :param function: An ExtractPixelsFromImage instance
+    :param indices: The image indices to process
+    :param nthreads: The number of threads to threshold images with
+    :param callback: The function to call as callback(index, result) for each image
+    :param prefetch: The maximum number of images in flight (default 2 * nthreads)
+    """
+    if prefetch is None:
+        prefetch = 2 * nthreads
+
+    def process(index, image_and_mask):
+        return function.extract(index, *image_and_mask.result())
+
+    pending = collections.deque()
+    with (
+        ThreadPoolExecutor(max_workers=1) as reader,
+        ThreadPoolExecutor(max_workers=nthreads) as pool,
+    ):
+        try:
+            for index in indices:
+                image_and_mask = reader.submit(function.read, index)
+                pending.append((index, pool.submit(process, index, image_and_mask)))
+                if len(pending) >= prefetch:
+                    i, future = pending.popleft()
+                    callback(i, future.result())
+            while pending:
+                i, future = pending.popleft()
+                callback(i, future.result())
+        except BaseException:
+            for _, future in pending:
+                future.cancel()
+            raise
+
+
 def pixel_list_to_shoeboxes(
     imageset: ImageSet,
     pixel_labeller: Iterable[PixelListLabeller],
@@ -376,6 +498,9 @@ def __init__(
         no_shoeboxes_2d=False,
         min_chunksize=50,
         write_hot_pixel_mask=False,
+        mp_pipeline=False,
+        wait_for_images=None,
+        image_callback=None,
     ):
         """
         Initialise the class with the strategy
@@ -385,6 +510,13 @@ def __init__(
         :param mp_method: The multi processing method
         :param nproc: The number of processors
         :param max_strong_pixel_fraction: The maximum number of strong pixels
+        :param mp_pipeline: Process the images with threads in this process,
+                            rather than with multiple processes
+        :param wait_for_images: A WaitForImages instance, to process images from
+                                a data collection that is still in progress
+        :param image_callback: A function called in image order as
+                               image_callback(index, reflections) with a table
+                               of the spots found on each image in isolation
         """
         # Set the required strategies
         self.threshold_function = threshold_function
@@ -402,6 +534,9 @@ def __init__(
         self.no_shoeboxes_2d = no_shoeboxes_2d
         self.min_chunksize = min_chunksize
         self.write_hot_pixel_mask = write_hot_pixel_mask
+        self.mp_pipeline = mp_pipeline
+        self.wait_for_images = wait_for_images
+        self.image_callback = image_callback
 
     def __call__(self, imageset):
         """
@@ -430,6 +565,37 @@ def _compute_chunksize(self, nimg, nproc, min_chunksize):
             test_chunksize -= 1
         return chunksize
 
+    def _in_process(self, mp_njobs):
+        """
+        Whether to process the images in this process with pipelined_map
+
+        Images that are waited for are always processed in this process, so that
+        the results can be handled in order as soon as each image is ready.
+        """
+        return self.wait_for_images is not None or (self.mp_pipeline and mp_njobs == 1)
+
+    def _spots_on_image(self, imageset, pixel_list):
+        """
+        Label the strong pixels from a single image into a table of spots
+
+        :param imageset: The imageset the image belongs to
+        :param pixel_list: The list of pixel lists for each panel on the image
+        :return: The reflection table of spots, without shoeboxes
+        """
+        pixel_labeller = [PixelListLabeller() for p in pixel_list]
+        for plabeller, plist in zip(pixel_labeller, pixel_list):
+            plabeller.add(plist)
+        reflections, _ = pixel_list_to_reflection_table(
+            imageset,
+            pixel_labeller,
+            filter_spots=self.filter_spots,
+            min_spot_size=self.min_spot_size,
+            max_spot_size=self.max_spot_size,
+            write_hot_pixel_mask=False,
+        )
+        del reflections["shoeboxes"]
+        return reflections
+
     def _find_spots(self, imageset):
         """
         Find the spots in the imageset
@@ -474,6 +640,7 @@ def _find_spots(self, imageset):
             max_strong_pixel_fraction=self.max_strong_pixel_fraction,
             compute_mean_background=self.compute_mean_background,
             region_of_interest=self.region_of_interest,
+            wait_for_images=self.wait_for_images,
         )
 
         # The indices to iterate over
@@ -489,9 +656,21 @@ def _find_spots(self, imageset):
             logger.info(
                 f" Using {mp_method} with {mp_njobs} parallel job(s) and {mp_nproc} processes per node\n"
             )
+        elif self._in_process(mp_njobs):
+            logger.info(f" Using a pipeline with {mp_nproc} thread(s)\n")
         else:
             logger.info(f" Using multiprocessing with {mp_nproc} parallel job(s)\n")
-        if mp_nproc > 1 or mp_njobs > 1:
+        if self._in_process(mp_njobs):
+
+            def process_output(index, result):
+                assert len(pixel_labeller) == len(result), "Inconsistent size"
+                for plabeller, plist in zip(pixel_labeller, result):
+                    plabeller.add(plist)
+                if self.image_callback is not None:
+                    self.image_callback(index, self._spots_on_image(imageset, result))
+
+            pipelined_map(function, indices, mp_nproc, process_output)
+        elif mp_nproc > 1 or mp_njobs > 1:
 
             def process_output(result):
                 rehandle_cached_records(result[1])
@@ -568,6 +747,7 @@ def _find_spots_2d_no_shoeboxes(self, imageset):
             min_spot_size=self.min_spot_size,
             max_spot_size=self.max_spot_size,
             filter_spots=self.filter_spots,
+            wait_for_images=self.wait_for_images,
         )
 
         # The indices to iterate over
@@ -582,9 +762,19 @@ def _find_spots_2d_no_shoeboxes(self, imageset):
             logger.info(
                 f" Using {mp_method} with {mp_njobs} parallel job(s) and {mp_nproc} processes per node\n"
             )
+        elif self._in_process(mp_njobs):
+            logger.info(f" Using a pipeline with {mp_nproc} thread(s)\n")
         else:
             logger.info(f" Using multiprocessing with {mp_nproc} parallel job(s)\n")
-        if mp_nproc > 1 or mp_njobs > 1:
+        if self._in_process(mp_njobs):
+
+            def process_output(index, result):
+                reflections.extend(result[0])
+                if self.image_callback is not None:
+                    self.image_callback(index, result[0])
+
+            pipelined_map(function, indices, mp_nproc, process_output)
+        elif mp_nproc > 1 or mp_njobs > 1:
 
             def process_output(result):
                 for message in result[1]:
@@ -635,6 +825,9 @@ def __init__(
         no_shoeboxes_2d=False,
         min_chunksize=50,
         is_stills=False,
+        mp_pipeline=False,
+        wait_for_images=None,
+        image_callback=None,
     ):
         """
         Initialise the class.
@@ -644,6 +837,12 @@ def __init__(
         :param scan_range: The scan range to find spots over
         :param is_stills:   [ADVANCED] Force still-handling of experiment
                             ID remapping for dials.stills_process.
+        :param mp_pipeline: Find spots with a thread pool in this process
+        :param wait_for_images: A WaitForImages instance, to find spots on a
+                                data collection that is still in progress
+        :param image_callback: A function called as image_callback(imageset,
+                               index, reflections) with the spots on each image
+                               as it is processed
         """
 
         # Set the filter and some other stuff
@@ -666,6 +865,9 @@ def __init__(
         self.no_shoeboxes_2d = no_shoeboxes_2d
         self.min_chunksize = min_chunksize
         self.is_stills = is_stills
+        self.mp_pipeline = mp_pipeline
+        self.wait_for_images = wait_for_images
+        self.image_callback = image_callback
 
     def find_spots(self, experiments: ExperimentList) -> flex.reflection_table:
         """
@@ -771,6 +973,8 @@ def _find_spots_in_imageset(self, imageset):
             no_shoeboxes_2d=self.no_shoeboxes_2d,
             min_chunksize=self.min_chunksize,
             write_hot_pixel_mask=self.write_hot_mask,
+            mp_pipeline=self.mp_pipeline,
+            wait_for_images=self.wait_for_images,
         )
 
         # Get the max scan range
@@ -802,6 +1006,11 @@ def _find_spots_in_imageset(self, imageset):
             if isinstance(imageset, ImageSequence):
                 j0 -= imageset.get_array_range()[0]
                 j1 -= imageset.get_array_range()[0]
+            if self.image_callback is not None:
+                # Report the images against the full imageset, not the slice
+                extract_spots.image_callback = functools.partial(
+                    self._report_image, imageset, j0
+                )
             if len(imageset) == 1:
                 r, h = extract_spots(imageset)
             else:
@@ -817,6 +1026,12 @@ def _find_spots_in_imageset(self, imageset):
         # Return as a reflection list
         return reflections, hot_mask
 
+    def _report_image(self, imageset, offset, index, reflections):
+        """
+        Pass the spots on an image in a slice of an imageset to the image callback
+        """
+        self.image_callback(imageset, offset + index, reflections)
+
     def _create_hot_mask(self, imageset, hot_pixels):
         """
         Find hot pixels in images
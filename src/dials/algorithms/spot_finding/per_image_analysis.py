@@ -3,7 +3,10 @@
 import collections
 import math
 
+import numpy as np
+
 from cctbx import sgtbx, uctbx
+from dxtbx import flumpy
 from libtbx.math_utils import nearest_integer as nint
 from scitbx import matrix
 
@@ -623,50 +626,90 @@ def stats_for_reflection_table(
     )
 
 
-def stats_per_image(experiment, reflections, resolution_analysis=True):
-    n_spots_total = []
-    n_spots_no_ice = []
-    n_spots_4A = []
-    total_intensity = []
-    estimated_d_min = []
-    d_min_distl_method_1 = []
-    d_min_distl_method_2 = []
-    noisiness_method_1 = []
-    noisiness_method_2 = []
-
-    image_number = reflections["xyzobs.px.value"].parts()[2]
-    image_number = flex.floor(image_number)
+class StatsAccumulator:
+    """Per-image statistics for spots that are added as they are found.
+
+    Spots are bucketed by image as they are added, so that the statistics for
+    each image are calculated from the spots on that image alone. The
+    statistics for an image are calculated when they are first requested, and
+    kept until more spots are added to that image. Within an image the spots
+    keep the order in which they were added, so the statistics are identical
+    to those calculated from a selection of the same spots from a single table.
+    """
+
+    def __init__(self, array_range, resolution_analysis=True):
+        """
+        Args:
+            array_range: The (start, end) array range of the images
+            resolution_analysis: Whether to estimate the resolution limits
+        """
+        self._images = range(*array_range)
+        self._resolution_analysis = resolution_analysis
+        self._spots = {i: [] for i in self._images}
+        self._stats = {}
+        self._no_spots = None
+
+    def add(self, reflections):
+        """Add spots, which must have been mapped to reciprocal space.
+
+        Spots with centroids outside the array range are ignored.
+        """
+        if self._no_spots is None:
+            self._no_spots = reflections.select(flex.size_t())
+        image_number = flumpy.to_numpy(
+            flex.floor(reflections["xyzobs.px.value"].parts()[2])
+        )
+        groups = flex.reflection_table_groups(
+            np.arange(len(reflections)), [image_number]
+        )
+        for i, start, size in zip(
+            image_number[groups.first].tolist(),
+            groups.starts.tolist(),
+            groups.sizes.tolist(),
+        ):
+            if i not in self._spots:
+                continue
+            i = int(i)
+            rows = groups.rows[start : start + size].astype(np.uint64)
+            self._spots[i].append(reflections.select(flumpy.from_numpy(rows)))
+            self._stats.pop(i, None)
+
+    def stats_for_image(self, i):
+        """The StatsSingleImage for the image with array index i."""
+        if i not in self._stats:
+            spots = self._spots[i]
+            if len(spots) > 1:
+                reflections = flex.reflection_table()
+                for table in spots:
+                    reflections.extend(table)
+                spots[:] = [reflections]
+            reflections = spots[0] if spots else self._no_spots
+            self._stats[i] = stats_for_reflection_table(
+                reflections, resolution_analysis=self._resolution_analysis
+            )
+        return self._stats[i]
+
+    def stats(self):
+        """The StatsMultiImage for all images."""
+        rows = [self.stats_for_image(i) for i in self._images]
+        return StatsMultiImage(
+            **{
+                name: [getattr(row, name) for row in rows]
+                for name in _stats_field_names
+            }
+        )
+
 
+def stats_per_image(experiment, reflections, resolution_analysis=True):
     try:
         start, end = experiment.scan.get_array_range()
     except AttributeError:
         start, end = 0, 1
-    for i in range(start, end):
-        stats = stats_for_reflection_table(
-            reflections.select(image_number == i),
-            resolution_analysis=resolution_analysis,
-        )
-        n_spots_total.append(stats.n_spots_total)
-        n_spots_no_ice.append(stats.n_spots_no_ice)
-        n_spots_4A.append(stats.n_spots_4A)
-        total_intensity.append(stats.total_intensity)
-        estimated_d_min.append(stats.estimated_d_min)
-        d_min_distl_method_1.append(stats.d_min_distl_method_1)
-        noisiness_method_1.append(stats.noisiness_method_1)
-        d_min_distl_method_2.append(stats.d_min_distl_method_2)
-        noisiness_method_2.append(stats.noisiness_method_2)
-
-    return StatsMultiImage(
-        n_spots_total=n_spots_total,
-        n_spots_no_ice=n_spots_no_ice,
-        n_spots_4A=n_spots_4A,
-        total_intensity=total_intensity,
-        estimated_d_min=estimated_d_min,
-        d_min_distl_method_1=d_min_distl_method_1,
-        noisiness_method_1=noisiness_method_1,
-        d_min_distl_method_2=d_min_distl_method_2,
-        noisiness_method_2=noisiness_method_2,
+    accumulator = StatsAccumulator(
+        (start, end), resolution_analysis=resolution_analysis
     )
+    accumulator.add(reflections)
+    return accumulator.stats()
 
 
 def plot_stats(stats, filename="per_image_analysis.png"):
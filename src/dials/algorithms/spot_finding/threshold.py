@@ -40,8 +40,8 @@ def __init__(self, **kwargs):
         self._min_count = kwargs.get("min_count", 2)
         self._threshold = kwargs.get("global_threshold", 0)
 
-        # Save the constant gain
-        self._gain_map = None
+        # The constant gain maps for each image size
+        self._gain_map = {}
 
         # Create a buffer
         self.algorithm = {}
@@ -72,15 +72,18 @@ def __call__(self, image, mask):
             self.algorithm[image.all()] = algorithm
 
         # Set the gain
+        gain_map = None
         if self._gain is not None:
             assert self._gain > 0
-            self._gain_map = flex.double(image.accessor(), self._gain)
-            self._gain = None
+            gain_map = self._gain_map.get(image.all())
+            if gain_map is None:
+                gain_map = flex.double(image.accessor(), self._gain)
+                self._gain_map[image.all()] = gain_map
 
         # Compute the threshold
         result = flex.bool(flex.grid(image.all()))
-        if self._gain_map:
-            algorithm(image, mask, self._gain_map, result)
+        if gain_map:
+            algorithm(image, mask, gain_map, result)
         else:
             algorithm(image, mask, result)
 
@@ -109,8 +112,8 @@ def __init__(self, **kwargs):
         self._min_count = kwargs.get("min_count", 2)
         self._threshold = kwargs.get("global_threshold", 0)
 
-        # Save the constant gain
-        self._gain_map = None
+        # The constant gain maps for each image size
+        self._gain_map = {}
 
         # Create a buffer
         self.algorithm = {}
@@ -141,15 +144,18 @@ def __call__(self, image, mask):
             self.algorithm[image.all()] = algorithm
 
         # Set the gain
+        gain_map = None
         if self._gain is not None:
             assert self._gain > 0
-            self._gain_map = flex.double(image.accessor(), self._gain)
-            self._gain = None
+            gain_map = self._gain_map.get(image.all())
+            if gain_map is None:
+                gain_map = flex.double(image.accessor(), self._gain)
+                self._gain_map[image.all()] = gain_map
 
         # Compute the threshold
         result = flex.bool(flex.grid(image.all()))
-        if self._gain_map:
-            algorithm(image, mask, self._gain_map, result)
+        if gain_map:
+            algorithm(image, mask, gain_map, result)
         else:
             algorithm(image, mask, result)
 
@@ -1,9 +1,10 @@
 from __future__ import annotations
 
 import logging
-from collections import defaultdict
 from math import floor, sqrt
 
+import numpy as np
+
 from cctbx import crystal, miller
 
 from dials.array_family import flex
@@ -69,6 +70,17 @@ def index(self, h):
             bin_index = 0
         return bin_index
 
+    def indices(self, miller_indices):
+        """
+        Get the bin indices for an array of miller indices
+
+        :param miller_indices: A flex.miller_index array
+        :returns: A numpy array of bin indices
+        """
+        d2 = 1 / np.square(self._unit_cell.d(miller_indices).as_numpy_array())
+        bin_index = np.floor((d2 - self._xmin) / self._bin_size).astype(np.int64)
+        return np.clip(bin_index, 0, self._nbins - 1)
+
 
 class ReflectionSum:
     """
@@ -154,6 +166,58 @@ def compute_cchalf_from_reflection_sums(reflection_sums, binner):
     return compute_mean_cchalf_in_bins(bin_data)
 
 
+def _bin_contributions(sum_x, sum_x2, n, shift):
+    """
+    Compute the contribution of each unique reflection to the sums in its
+    resolution bin from which the CC 1/2 is calculated
+
+    :param sum_x: The array of Sum(X) for each unique reflection
+    :param sum_x2: The array of Sum(X^2) for each unique reflection
+    :param n: The array of the number of observations of each unique reflection
+    :param shift: The array of values to subtract from each mean intensity
+    :returns: An array of shape (4, len(n)) of the count, the mean intensity, the
+              squared mean intensity and the variance of the mean intensity,
+              which are zero for reflections with fewer than two observations
+    """
+    valid = n > 1
+    n = np.where(valid, n, 2)
+    mean = sum_x / n
+    var = (sum_x2 - np.square(sum_x) / n) / (n - 1) / n
+    mean -= shift
+    return np.where(valid, np.array([np.ones_like(mean), mean, mean**2, var]), 0)
+
+
+def _sum_in_bins(contributions, bin_index, nbins):
+    """
+    Sum each row of contributions in bins given by bin_index
+
+    :returns: An array of shape (len(contributions), nbins)
+    """
+    return np.array(
+        [np.bincount(bin_index, weights=c, minlength=nbins) for c in contributions]
+    )
+
+
+def _mean_cchalf_from_bin_sums(bin_sums):
+    """
+    Compute the mean CC 1/2 weighted by the number of reflections in each bin,
+    as compute_mean_cchalf_in_bins, from the sums of _bin_contributions in bins
+
+    :param bin_sums: An array of shape (..., 4, nbins)
+    :returns: The mean CC 1/2, of shape (...)
+    """
+    count, sum_mean, sum_mean2, sum_var = np.moveaxis(bin_sums, -2, 0)
+    use = count > 1
+    with np.errstate(divide="ignore", invalid="ignore"):
+        mean_of_means = sum_mean / count
+        sigma_e = sum_var / count
+        sigma_y = (sum_mean2 - count * np.square(mean_of_means)) / (count - 1)
+        cchalf = (sigma_y - sigma_e) / (sigma_y + sigma_e)
+        total = np.where(use, count, 0).sum(axis=-1)
+        mean_cchalf = np.where(use, count * cchalf, 0).sum(axis=-1) / total
+    return np.where(total > 0, mean_cchalf, 0)
+
+
 class PerGroupCChalfStatistics:
     def __init__(
         self,
@@ -193,30 +257,38 @@ def __init__(
             self.d_max = flex.max(self.reflection_table["d"])
         self.binner = ResolutionBinner(mean_unit_cell, self.d_min, self.d_max, n_bins)
 
-        self.reflection_sums = defaultdict(ReflectionSum)
         self.compute_overall_stats()
 
     def compute_overall_stats(self):
-        # Create lookups for elements by miller index
-        index_lookup = defaultdict(list)
-        for i, h in enumerate(self.reflection_table["miller_index"]):
-            index_lookup[h].append(i)
+        # Map each reflection to its unique reflection
+        hkl = self.reflection_table["miller_index"].as_vec3_double().as_numpy_array()
+        _, first, self._unique_index = np.unique(
+            hkl, axis=0, return_index=True, return_inverse=True
+        )
+        self._unique_index = self._unique_index.reshape(-1)
+        n_unique = first.size
+        self._unique_miller_indices = self.reflection_table["miller_index"].select(
+            flex.size_t(first)
+        )
+        self._unique_bin_index = self.binner.indices(self._unique_miller_indices)
 
         # Compute the Overall Sum(X) and Sum(X^2) for each unique reflection
-
-        for h in index_lookup:
-            sel = flex.size_t(index_lookup[h])
-            intensities = self.reflection_table["intensity"].select(sel)
-            n = intensities.size()
-            sum_x = flex.sum(intensities)
-            sum_x2 = flex.sum(flex.pow2(intensities))
-            self.reflection_sums[h] = ReflectionSum(sum_x, sum_x2, n)
+        self._intensities = self.reflection_table["intensity"].as_numpy_array()
+        self._sum_x = np.bincount(
+            self._unique_index, weights=self._intensities, minlength=n_unique
+        )
+        self._sum_x2 = np.bincount(
+            self._unique_index,
+            weights=np.square(self._intensities),
+            minlength=n_unique,
+        )
+        self._n = np.bincount(self._unique_index, minlength=n_unique)
 
         # Compute some numbers
         self._num_datasets = len(set(self.reflection_table["dataset"]))
         self._num_groups = len(set(self.reflection_table["group"]))
         self._num_reflections = self.reflection_table.size()
-        self._num_unique = len(self.reflection_sums)
+        self._num_unique = n_unique
 
         logger.info(
             """
@@ -231,6 +303,19 @@ def compute_overall_stats(self):
             self._num_unique,
         )
 
+    @property
+    def reflection_sums(self):
+        """
+        The Sum(X), Sum(X^2) and number of observations of each unique reflection,
+        as a dictionary of ReflectionSum keyed by Miller index
+        """
+        return {
+            h: ReflectionSum(float(sum_x), float(sum_x2), int(n))
+            for h, sum_x, sum_x2, n in zip(
+                self._unique_miller_indices, self._sum_x, self._sum_x2, self._n
+            )
+        }
+
     def map_to_asu(self):
         """Map the miller indices to the ASU"""
         # d = flex.double([self.mean_unit_cell.d(h) for h in reflection_table["miller_index"]])
@@ -254,55 +339,77 @@ def d_filter(self):
 
     def run(self):
         """Compute the ΔCC½ for all the data"""
-        self._cchalf_mean = compute_cchalf_from_reflection_sums(
-            self.reflection_sums, self.binner
+        nbins = self.binner.nbins()
+        contributions = _bin_contributions(self._sum_x, self._sum_x2, self._n, 0)
+        bin_sums = _sum_in_bins(contributions, self._unique_bin_index, nbins)
+
+        # Subtract the mean of the mean intensities in each bin, to avoid loss of
+        # precision when calculating the variance of the mean intensities from
+        # the sums of the mean intensities and their squares
+        with np.errstate(divide="ignore", invalid="ignore"):
+            shift = np.nan_to_num(bin_sums[1] / bin_sums[0])
+        self._shift = shift[self._unique_bin_index]
+        self._contributions = _bin_contributions(
+            self._sum_x, self._sum_x2, self._n, self._shift
+        )
+        self._bin_sums = _sum_in_bins(
+            self._contributions, self._unique_bin_index, nbins
         )
+        self._cchalf_mean = float(_mean_cchalf_from_bin_sums(self._bin_sums))
         logger.info("CC 1/2 mean: %.3f", (100 * self._cchalf_mean))
         self._cchalf = self._compute_cchalf_excluding_each_group()
 
     def _compute_cchalf_excluding_each_group(self):
-        #   self, reflection_sums, binner, miller_index, dataset, intensity
-        # ):
         """
-        Compute the CC 1/2 with an image excluded.
-
-        For each image, update the sums by removing the contribution from the image
-        and then compute the CC 1/2 of the remaining data
+        Compute the CC 1/2 with each group excluded.
+
+        The Sum(X), Sum(X^2) and count of the observations of each unique
+        reflection in each group are subtracted from the overall sums for that
+        reflection, and the resulting change in the contribution of that
+        reflection to the sums in its resolution bin accumulated for the group.
+        The CC 1/2 without each group is then calculated from the adjusted sums
+        in resolution bins, so the cost is proportional to the number of
+        (group, unique reflection) pairs rather than their product.
         """
+        nbins = self.binner.nbins()
+        n_unique = self._num_unique
 
-        # Create a lookup table for each reflection by dataset i.e. group of images
-        dataset_lookup = defaultdict(list)
-        for i, b in enumerate(self.reflection_table["group"]):
-            dataset_lookup[b].append(i)
+        # Compute the Sum(X), Sum(X^2) and count for each (group, unique reflection)
+        groups, group_index = np.unique(
+            self.reflection_table["group"].as_numpy_array(), return_inverse=True
+        )
+        pairs, pair_index = np.unique(
+            group_index.astype(np.int64) * n_unique + self._unique_index,
+            return_inverse=True,
+        )
+        pair_sum_x = np.bincount(pair_index, weights=self._intensities)
+        pair_sum_x2 = np.bincount(pair_index, weights=np.square(self._intensities))
+        pair_n = np.bincount(pair_index)
+        pair_group, unique = np.divmod(pairs, n_unique)
+
+        # Compute the change in the bin sums from removing each group
+        contributions = _bin_contributions(
+            self._sum_x[unique] - pair_sum_x,
+            self._sum_x2[unique] - pair_sum_x2,
+            self._n[unique] - pair_n,
+            self._shift[unique],
+        )
+        contributions -= self._contributions[:, unique]
+        delta_bin_sums = _sum_in_bins(
+            contributions,
+            pair_group * nbins + self._unique_bin_index[unique],
+            groups.size * nbins,
+        )
+        delta_bin_sums = delta_bin_sums.reshape(-1, groups.size, nbins)
 
-        # Compute CC1/2 minus each dataset
+        # Compute the CC 1/2 without the reflections from each group
+        cchalf = _mean_cchalf_from_bin_sums(
+            self._bin_sums + np.moveaxis(delta_bin_sums, 1, 0)
+        )
         cchalf_i = {}
-        for dataset in dataset_lookup:
-            # Find all observations from this dataset and create a lookup based on
-            # miller index
-            index_lookup = defaultdict(list)
-            for i in dataset_lookup[dataset]:
-                index_lookup[self.reflection_table["miller_index"][i]].append(i)
-
-            # Loop through all the reflections and remove the contribution of
-            # reflections from the current dataset
-            dataset_reflection_sums = defaultdict(ReflectionSum)
-            for h in self.reflection_sums:
-                sum_x = self.reflection_sums[h].sum_x
-                sum_x2 = self.reflection_sums[h].sum_x2
-                n = self.reflection_sums[h].n
-                for i in index_lookup[h]:
-                    sum_x -= self.reflection_table["intensity"][i]
-                    sum_x2 -= self.reflection_table["intensity"][i] ** 2
-                    n -= 1
-                dataset_reflection_sums[h] = ReflectionSum(sum_x, sum_x2, n)
-
-            # Compute the CC 1/2 without the reflections from the current dataset
-            cchalf = compute_cchalf_from_reflection_sums(
-                dataset_reflection_sums, self.binner
-            )
-            cchalf_i[dataset] = cchalf
-            logger.info("CC 1/2 excluding group %d: %.3f", dataset, 100 * cchalf)
+        for group, cchalf_group in zip(groups.tolist(), cchalf.tolist()):
+            cchalf_i[group] = cchalf_group
+            logger.info("CC 1/2 excluding group %d: %.3f", group, 100 * cchalf_group)
 
         return cchalf_i
 
@@ -28,6 +28,7 @@
 from dials.algorithms.symmetry import median_unit_cell, symmetry_base
 from dials.algorithms.symmetry.cosym import engine as cosym_engine
 from dials.algorithms.symmetry.cosym import target
+from dials.algorithms.symmetry.cosym.state import CosymState
 from dials.algorithms.symmetry.laue_group import ScoreCorrelationCoefficient
 from dials.util.observer import Subject
 from dials.util.reference import intensities_from_reference_file
@@ -118,6 +119,29 @@
     .short_caption = "Maximum number of calls"
 }
 
+incremental
+  .short_caption = "Incremental analysis"
+{
+  state = None
+    .type = path
+    .help = "A state file saved by a previous cosym analysis of a subset of the"
+            "datasets. The correlation coefficients between pairs of the previous"
+            "datasets are reused rather than recalculated, and their coordinates"
+            "are used as the starting point of the optimisation. The previous"
+            "datasets must be given as they were in the previous analysis, i.e."
+            "not reindexed. The correlation coefficients from the previous"
+            "analysis were calculated with its normalisation and resolution"
+            "cutoff, which may differ slightly from those of the combined data."
+    .short_caption = "Previous state"
+  fix_existing = True
+    .type = bool
+    .help = "Only optimise the coordinates of the new datasets, holding those of"
+            "the previous datasets fixed, so that the cost of the optimisation"
+            "scales with the number of new datasets. Otherwise all coordinates"
+            "are optimised, starting from the previous solution."
+    .short_caption = "Fix existing coordinates"
+}
+
 nproc = Auto
   .type = int(value_min=1)
   .help = "Number of processes"
@@ -149,6 +173,7 @@ def __init__(
         params,
         seed_dataset: int | None = None,
         apply_sigma_correction=True,
+        identifiers: list[str] | None = None,
     ):
         """Initialise a CosymAnalysis object.
 
@@ -160,6 +185,8 @@ def __init__(
             choosing a seed dataset for the reindexing analysis (the x,y,z reindex
             mode will be used for this dataset).
             If None, a high density cluster point is chosen.
+          identifiers (list): A unique identifier for each of the intensities,
+            required to match datasets to those of a previous analysis.
         """
         self.seed_dataset = seed_dataset
         if self.seed_dataset:
@@ -211,6 +238,19 @@ def __init__(
                 self.dataset_ids = self.dataset_ids.select(sel)
 
         self.params = params
+        self.identifiers = identifiers
+        self._previous_state = None
+        if self.params.incremental.state:
+            if identifiers is None or len(identifiers) != len(intensities):
+                raise ValueError(
+                    "An identifier for each dataset is required for incremental analysis"
+                )
+            if self.params.cc_weights == "sigma":
+                raise ValueError(
+                    "Incremental analysis is not supported with cc_weights=sigma"
+                )
+            self._previous_state = CosymState.from_file(self.params.incremental.state)
+
         if self.params.space_group is not None:
 
             def _map_space_group_to_input_cell(intensities, space_group):
@@ -312,6 +352,35 @@ def _intialise_target(self):
             weights=self.params.weights,
             cc_weights=self.params.cc_weights,
             nproc=self.params.nproc,
+            known=self._known_from_previous_state(),
+        )
+
+    def _known_from_previous_state(self):
+        if self._previous_state is None:
+            return None
+        # Map the identifiers to the lattice indices used by the target, and
+        # select those previous datasets which are included in this analysis
+        lattice_ids = sorted(set(self.dataset_ids))
+        lattices = {self.identifiers[i]: j for j, i in enumerate(lattice_ids)}
+        keep = [
+            i
+            for i, identifier in enumerate(self._previous_state.identifiers)
+            if identifier in lattices
+        ]
+        logger.info(
+            "%i of %i datasets from the previous analysis included",
+            len(keep),
+            len(self._previous_state.identifiers),
+        )
+        if not keep:
+            self._previous_state = None
+            return None
+        self._previous_state = self._previous_state.select(keep)
+        return (
+            self._previous_state.sym_ops,
+            [lattices[identifier] for identifier in self._previous_state.identifiers],
+            self._previous_state.rij_matrix,
+            self._previous_state.n_pairs_matrix,
         )
 
     def _determine_dimensions(self, dims_to_test, outlier_rejection=False):
@@ -381,7 +450,13 @@ def _determine_dimensions(self, dims_to_test, outlier_rejection=False):
 
     def run(self):
         self._intialise_target()
-        if self.params.dimensions is Auto and self.target.dim != 2:
+        if self.target.known_rows is not None:
+            # The previous coordinates are only meaningful in the same dimensions
+            self.target.set_dimensions(self._previous_state.dim)
+            logger.info(
+                "Using %i dimensions from the previous analysis", self.target.dim
+            )
+        elif self.params.dimensions is Auto and self.target.dim != 2:
             self._determine_dimensions(self.target.dim)
         self._optimise(
             self.params.minimization.engine,
@@ -399,9 +474,22 @@ def _optimise(self, engine, max_iterations=None, max_calls=None):
         n_sym_ops = len(self.target.sym_ops)
 
         coords = np.random.rand(NN * n_sym_ops * self.target.dim)
+        minimisation_target = self.target
+        if self.target.known_rows is not None:
+            # Start from the previous coordinates of the previous datasets
+            coords = coords.reshape(self.target.dim, NN * n_sym_ops)
+            coords[:, self.target.known_rows] = self._previous_state.coords.T
+            coords = coords.flatten()
+            free_rows = np.setdiff1d(np.arange(NN * n_sym_ops), self.target.known_rows)
+            if self.params.incremental.fix_existing and free_rows.size:
+                minimisation_target = target.FixedCoordinatesTarget(
+                    self.target, coords, free_rows
+                )
+                coords = minimisation_target.free_coordinates(coords)
+
         if engine == "scitbx":
             self.minimizer = cosym_engine.minimize_scitbx_lbfgs(
-                self.target,
+                minimisation_target,
                 coords,
                 use_curvatures=self.params.use_curvatures,
                 max_iterations=max_iterations,
@@ -409,17 +497,38 @@ def _optimise(self, engine, max_iterations=None, max_calls=None):
             )
         else:
             self.minimizer = cosym_engine.minimize_scipy(
-                self.target,
+                minimisation_target,
                 coords,
                 method="L-BFGS-B",
                 max_iterations=max_iterations,
                 max_calls=max_calls,
             )
 
+        if minimisation_target is not self.target:
+            self.minimizer.x = minimisation_target.full_coordinates(self.minimizer.x)
         self.coords = self.minimizer.x.reshape(
             self.target.dim, NN * n_sym_ops
         ).transpose()
 
+    def as_state(self):
+        """Return the state of the analysis, for a later incremental analysis.
+
+        Returns:
+          CosymState: The coordinates and matrices of the analysis.
+        """
+        if self.identifiers is None:
+            raise ValueError("Dataset identifiers are required to save the state")
+        if self.target.n_pairs_matrix is None:
+            raise ValueError("Saving the state is not supported with cc_weights=sigma")
+        lattice_ids = sorted(set(self.dataset_ids))
+        return CosymState(
+            [self.identifiers[i] for i in lattice_ids],
+            self.target.sym_ops,
+            self.coords,
+            self.target.rij_matrix,
+            self.target.n_pairs_matrix,
+        )
+
     def _principal_component_analysis(self, cluster=False):
         # Perform PCA
         from sklearn.decomposition import PCA
@@ -0,0 +1,104 @@
+"""Saving and loading the state of a cosym analysis.
+
+The state of a converged cosym analysis can be used as the starting point for a
+later analysis of the same datasets together with additional datasets, in which
+case only the correlation coefficients involving the new datasets need to be
+calculated, and optionally only their coordinates optimised.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+class CosymState:
+    """The state of a converged cosym analysis.
+
+    The rows of the coordinates, rij and n_pairs matrices are ordered as in
+    dials.algorithms.symmetry.cosym.target.Target, i.e. row
+    k * n_datasets + j corresponds to sym_ops[k] applied to dataset j.
+
+    Attributes:
+      identifiers (list): A unique identifier for each dataset.
+      sym_ops (list): The symmetry operations, as xyz strings.
+      coords (np.ndarray): The (n_sym_ops * n_datasets, dim) coordinates.
+      rij_matrix (np.ndarray): The pairwise correlation coefficients.
+      n_pairs_matrix (np.ndarray): The number of pairs of reflections used to
+        calculate each correlation coefficient.
+    """
+
+    def __init__(self, identifiers, sym_ops, coords, rij_matrix, n_pairs_matrix):
+        self.identifiers = list(identifiers)
+        self.sym_ops = list(sym_ops)
+        self.coords = np.asarray(coords, dtype=np.float64)
+        self.rij_matrix = np.asarray(rij_matrix, dtype=np.float64)
+        self.n_pairs_matrix = np.asarray(n_pairs_matrix, dtype=np.float64)
+        n_rows = len(self.identifiers) * len(self.sym_ops)
+        if (
+            self.coords.ndim != 2
+            or self.coords.shape[0] != n_rows
+            or self.rij_matrix.shape != (n_rows, n_rows)
+            or self.n_pairs_matrix.shape != (n_rows, n_rows)
+        ):
+            raise ValueError("Inconsistent cosym state")
+
+    @property
+    def dim(self):
+        """The number of dimensions used in the analysis."""
+        return self.coords.shape[1]
+
+    def rows(self, datasets):
+        """The rows of the matrices corresponding to the given datasets.
+
+        Args:
+          datasets (list): Indices of datasets in this state.
+
+        Returns:
+          np.ndarray: The rows, ordered by symmetry operation then dataset.
+        """
+        datasets = np.asarray(datasets, dtype=np.int64)
+        n_datasets = len(self.identifiers)
+        return (np.arange(len(self.sym_ops))[:, None] * n_datasets + datasets).ravel()
+
+    def select(self, datasets):
+        """Select a subset of the datasets.
+
+        Args:
+          datasets (list): Indices of the datasets to keep.
+
+        Returns:
+          CosymState: The state of the selected datasets.
+        """
+        rows = self.rows(datasets)
+        return CosymState(
+            [self.identifiers[i] for i in datasets],
+            self.sym_ops,
+            self.coords[rows],
+            self.rij_matrix[np.ix_(rows, rows)],
+            self.n_pairs_matrix[np.ix_(rows, rows)],
+        )
+
+    def as_file(self, filename):
+        """Save the state to a numpy .npz file."""
+        # Pass a file object, otherwise numpy appends .npz to the filename
+        with open(filename, "wb") as f:
+            np.savez_compressed(
+                f,
+                identifiers=np.array(self.identifiers, dtype=str),
+                sym_ops=np.array(self.sym_ops, dtype=str),
+                coords=self.coords,
+                rij_matrix=self.rij_matrix,
+                n_pairs_matrix=self.n_pairs_matrix,
+            )
+
+    @classmethod
+    def from_file(cls, filename):
+        """Load a state saved by CosymState.as_file."""
+        with np.load(filename, allow_pickle=False) as data:
+            return cls(
+                data["identifiers"].tolist(),
+                data["sym_ops"].tolist(),
+                data["coords"],
+                data["rij_matrix"],
+                data["n_pairs_matrix"],
+            )
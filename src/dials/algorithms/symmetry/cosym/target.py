@@ -4,11 +4,10 @@
 
 import concurrent.futures
 import copy
-import itertools
 import logging
+import math
 
 import numpy as np
-import pandas as pd
 from ordered_set import OrderedSet
 from scipy import sparse
 
@@ -20,6 +19,10 @@
 
 logger = logging.getLogger(__name__)
 
+# The maximum number of elements in each of the dense temporary arrays used
+# when calculating one block of pairwise correlation coefficients
+_MAX_BLOCK_ELEMENTS = 2**21
+
 
 def _lattice_lower_upper_index(lattices, lattice_id):
     lower_index = int(lattices[lattice_id])
@@ -31,6 +34,115 @@ def _lattice_lower_upper_index(lattices, lattice_id):
     return lower_index, upper_index
 
 
+def _compute_pairwise_correlations(
+    rows, cols, values, n_rows, min_pairs, nproc=1, new_rows=None
+):
+    """Compute the correlation coefficients between all pairs of sparse rows.
+
+    The correlation coefficient between two rows is calculated using only the
+    columns observed in both rows, which is equivalent to pandas.DataFrame.corr
+    on a dense array of the rows where unobserved values are NaN, but without
+    ever allocating the dense (n_rows, n_columns) array. The calculation is
+    split into blocks of rows of bounded memory, calculated in nproc threads.
+
+    Args:
+      rows (np.ndarray): The row of each observation.
+      cols (np.ndarray): The column of each observation.
+      values (np.ndarray): The value of each observation. If the same row and
+        column is observed more than once then the last observation is used.
+        Values which are not finite are treated as unobserved.
+      n_rows (int): The number of rows.
+      min_pairs (int): The minimum number of common columns for a correlation
+        coefficient to be calculated.
+      nproc (int): The number of threads to use.
+      new_rows (np.ndarray): Optionally only calculate the correlation
+        coefficients involving these rows, in which case the elements between
+        pairs of other rows are returned as zero.
+
+    Returns:
+      A tuple of symmetric (n_rows, n_rows) arrays, containing the correlation
+      coefficients (zero where they could not be calculated) and the number of
+      common columns. The diagonal elements are zero.
+    """
+    _, cols = np.unique(cols, return_inverse=True)
+    n_cols = int(cols.max()) + 1 if cols.size else 0
+
+    # Remove duplicate observations, keeping the last one, then any which are
+    # not finite
+    key = rows.astype(np.int64) * n_cols + cols
+    _, last = np.unique(key[::-1], return_index=True)
+    keep = key.size - 1 - last
+    keep = keep[np.isfinite(values[keep])]
+    rows, cols, values = rows[keep], cols[keep], values[keep]
+
+    # Correlation coefficients do not depend on the mean of each row, so subtract
+    # it to avoid loss of precision in the sums below
+    counts = np.bincount(rows, minlength=n_rows)
+    means = np.bincount(rows, weights=values, minlength=n_rows) / np.maximum(counts, 1)
+    values = values - means[rows]
+
+    shape = (n_rows, n_cols)
+    x = sparse.csr_matrix((values, (rows, cols)), shape=shape)
+    x2 = sparse.csr_matrix((np.square(values), (rows, cols)), shape=shape)
+    m = sparse.csr_matrix((np.ones_like(values), (rows, cols)), shape=shape)
+
+    cc = np.zeros((n_rows, n_rows))
+    n_pairs = np.zeros((n_rows, n_rows))
+    min_pairs = max(min_pairs or 1, 1)
+
+    def compute_block(block, columns):
+        # Calculate the elements block x columns, from sums over the columns of the
+        # input common to each pair of rows
+        n = (m[block] @ m[columns].T).toarray()
+        sx = (x[block] @ m[columns].T).toarray()
+        sy = (m[block] @ x[columns].T).toarray()
+        sxx = (x2[block] @ m[columns].T).toarray()
+        syy = (m[block] @ x2[columns].T).toarray()
+        sxy = (x[block] @ x[columns].T).toarray()
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vx = sxx - np.square(sx) / n
+            vy = syy - np.square(sy) / n
+            r = (sxy - sx * sy / n) / np.sqrt(vx * vy)
+        valid = (n >= min_pairs) & (vx > 0) & (vy > 0) & np.isfinite(r)
+        cc[block, columns] = np.where(valid, np.clip(r, -1, 1), 0)
+        n_pairs[block, columns] = n
+
+    n_computed = n_rows if new_rows is None else len(new_rows)
+    block_size = math.ceil(n_computed / (4 * nproc))
+    block_size = max(1, min(block_size, _MAX_BLOCK_ELEMENTS // max(n_rows, 1)))
+    if new_rows is None:
+        # Only calculate the upper triangle
+        blocks = [
+            (slice(i, min(i + block_size, n_rows)), slice(i, None))
+            for i in range(0, n_rows, block_size)
+        ]
+    else:
+        new_rows = np.asarray(new_rows, dtype=np.int64)
+        blocks = [
+            (new_rows[i : i + block_size], slice(None))
+            for i in range(0, n_computed, block_size)
+        ]
+    # The sparse products and numpy operations release the GIL, so threads avoid
+    # copying the matrices to other processes
+    with concurrent.futures.ThreadPoolExecutor(max_workers=nproc) as pool:
+        for _ in pool.map(lambda block: compute_block(*block), blocks):
+            pass
+
+    if new_rows is None:
+        # Only the upper triangle was calculated, so mirror it
+        cc = np.triu(cc, k=1)
+        cc += cc.T
+        n_pairs = np.triu(n_pairs, k=1)
+        n_pairs += n_pairs.T
+    else:
+        # Only the new rows were calculated, so copy them to the new columns
+        cc[:, new_rows] = cc[new_rows, :].T
+        n_pairs[:, new_rows] = n_pairs[new_rows, :].T
+        np.fill_diagonal(cc, 0)
+        np.fill_diagonal(n_pairs, 0)
+    return cc, n_pairs
+
+
 def _compute_rij_matrix_one_row_block(
     i,
     lattices,
@@ -166,6 +278,7 @@ def __init__(
         dimensions=None,
         nproc=1,
         cc_weights=None,
+        known=None,
     ):
         r"""Initialise a Target object.
 
@@ -190,6 +303,12 @@ def __init__(
             in the analysis. If not set, then the number of dimensions used is
             equal to the greater of 2 or the number of symmetry operations in the
             lattice group.
+          known (tuple): Optionally a tuple of (sym_ops, lattices, rij_matrix,
+            n_pairs_matrix) from a previous analysis of a subset of the lattices,
+            where lattices gives the index of each of the previous lattices in
+            this analysis. The correlation coefficients between pairs of the
+            previous lattices are then reused, rather than recalculated, if the
+            symmetry operations are unchanged.
         """
         if weights is not None:
             assert weights in ("count", "standard_error")
@@ -242,6 +361,32 @@ def __init__(
         logger.debug(
             "Patterson group: %s", self._patterson_group.info().symbol_and_number()
         )
+        # The rows of the rij matrix which correspond to previous lattices
+        self.known_rows = None
+        self._known = None
+        if known is not None:
+            if cc_weights == "sigma":
+                raise ValueError(
+                    "Reusing correlation coefficients is not supported with cc_weights=sigma"
+                )
+            known_sym_ops, known_lattices, known_rij, known_n_pairs = known
+            if list(known_sym_ops) != list(self.sym_ops):
+                logger.warning(
+                    "Symmetry operations differ from those of the previous analysis: "
+                    "all correlation coefficients will be calculated"
+                )
+            else:
+                known_lattices = np.asarray(known_lattices, dtype=np.int64)
+                n_rows = len(self.sym_ops) * known_lattices.size
+                assert known_rij.shape == known_n_pairs.shape == (n_rows, n_rows)
+                self.known_rows = (
+                    np.arange(len(self.sym_ops))[:, None] * len(self._lattices)
+                    + known_lattices
+                ).ravel()
+                self._known = (known_rij, known_n_pairs)
+
+        # The number of pairs used to calculate each correlation coefficient
+        self.n_pairs_matrix = None
         if cc_weights == "sigma":
             self.rij_matrix, self.wij_matrix = self._compute_rij_wij_ccweights()
         else:
@@ -408,36 +553,49 @@ def _compute_rij_wij(self, use_cache=True):
         for cb_op, hkl in indices.items():
             indices[cb_op] = np.ravel_multi_index((hkl + offset).T, dims)
 
-        # Create an empty 2D array of shape (m * n, L), where m is the number of sym
-        # ops, n is the number of lattices, and L is the number of unique miller indices
-        all_intensities = np.empty((n_sym_ops * n_lattices, np.prod(dims)))
-
-        # Populate all_intensities with intensity values, filling absent intensities
-        # with np.nan
-        all_intensities.fill(np.nan)
+        # Build sparse lists of the observations in each of the (m * n) rows, where
+        # m is the number of sym ops and n is the number of lattices, with the
+        # flat miller indices as columns
+        rows = []
+        cols = []
+        values = []
         slices = np.append(self._lattices, intensities.size)
         slices = list(map(slice, slices[:-1], slices[1:]))
         for i, (mil_ind, eps) in enumerate(zip(indices.values(), epsilons.values())):
             for j, selection in enumerate(slices):
-                # map (i, j) to a column in all_intensities
-                column = np.ravel_multi_index((i, j), (n_sym_ops, n_lattices))
+                # map (i, j) to a row
+                row = np.ravel_multi_index((i, j), (n_sym_ops, n_lattices))
                 epsilon_equals_one = eps[selection] == 1
                 valid_mil_ind = mil_ind[selection][epsilon_equals_one]
-                valid_intensities = intensities[selection][epsilon_equals_one]
-                all_intensities[column, valid_mil_ind] = valid_intensities
-
-        # Ideally we would use `np.ma.corrcoef` here, but it is broken, so use
-        # pd.DataFrame.corr() instead (see numpy/numpy#15601)
-        rij = (
-            pd.DataFrame(all_intensities)
-            .T.dropna(how="all")
-            .corr(min_periods=self._min_pairs)
-            .values
+                rows.append(np.full(valid_mil_ind.size, row))
+                cols.append(valid_mil_ind)
+                values.append(intensities[selection][epsilon_equals_one])
+
+        # Only calculate the rows which weren't known from a previous analysis
+        new_rows = None
+        if self.known_rows is not None:
+            new_rows = np.setdiff1d(np.arange(n_sym_ops * n_lattices), self.known_rows)
+            logger.info(
+                "Reusing correlation coefficients for %i of %i datasets",
+                self.known_rows.size // n_sym_ops,
+                n_lattices,
+            )
+
+        # Cosym does not make use of the on-diagonal correlation coefficients, which
+        # are returned as zero, as are any which could not be calculated
+        rij, n_pairs = _compute_pairwise_correlations(
+            np.concatenate(rows),
+            np.concatenate(cols),
+            np.concatenate(values),
+            n_sym_ops * n_lattices,
+            self._min_pairs,
+            nproc=self._nproc,
+            new_rows=new_rows,
         )
-        # Set any NaN correlation coefficients to zero
-        np.nan_to_num(rij, copy=False)
-        # Cosym does not make use of the on-diagonal correlation coefficients
-        np.fill_diagonal(rij, 0)
+        if self.known_rows is not None:
+            known = np.ix_(self.known_rows, self.known_rows)
+            rij[known], n_pairs[known] = self._known
+        self.n_pairs_matrix = n_pairs
 
         ## First, populate a weights matrix of the number of pairs i.e. counts
         ## if we are not going to use weights, this helps us select where we
@@ -447,16 +605,9 @@ def _compute_rij_wij(self, use_cache=True):
 
         # For each correlation coefficient, set the weight equal to the size of
         # the sample used to calculate that coefficient
-        pairwise_combos = itertools.combinations(np.isfinite(all_intensities), 2)
-
-        def sample_size(x, y):
-            pairs = np.count_nonzero(x & y)
-            if pairs < self._min_pairs:
-                return 0
-            else:
-                return pairs
-
-        wij[right_up] = list(itertools.starmap(sample_size, pairwise_combos))
+        wij[right_up] = np.where(
+            n_pairs[right_up] < self._min_pairs, 0, n_pairs[right_up]
+        )
 
         if self._weights:
             ## the weights are currently the pairwise sample sizes
@@ -626,3 +777,85 @@ def curvatures_fd(self, x: np.ndarray, eps=1e-6) -> np.ndarray:
             x[i] += eps  # reset to original values
             curvs[i] += (fm - 2 * f + fp) / (eps**2)
         return curvs
+
+
+class FixedCoordinatesTarget:
+    """Target function for optimising a subset of the cosym coordinates.
+
+    The coordinates of the other rows of the rij matrix are held fixed, so only
+    the elements of the rij matrix involving at least one of the free rows
+    contribute to the target function and its derivatives. The cost of each
+    evaluation is then proportional to the number of free rows, rather than to
+    the total number of rows.
+
+    Attributes:
+      dim (int): The number of dimensions used in the analysis.
+    """
+
+    def __init__(self, target, coords, free_rows):
+        """Initialise a FixedCoordinatesTarget object.
+
+        Args:
+          target (Target): The target function for all of the coordinates.
+          coords (np.ndarray): A flattened list of the N-dimensional vectors for
+            all rows, as for Target. The coordinates of the fixed rows are taken
+            from here.
+          free_rows (np.ndarray): The rows for which to optimise the coordinates.
+        """
+        self.dim = target.dim
+        self._x = np.array(coords, dtype=np.float64).reshape((self.dim, -1))
+        self._free = np.asarray(free_rows, dtype=np.int64)
+        self._rij = target.rij_matrix[:, self._free]
+        if target.wij_matrix is not None:
+            self._wij = target.wij_matrix[:, self._free]
+        else:
+            self._wij = np.ones(self._rij.shape)
+
+    def free_coordinates(self, coords: np.ndarray) -> np.ndarray:
+        """Select the coordinates of the free rows.
+
+        Args:
+          coords (np.ndarray): A flattened list of the coordinates for all rows.
+
+        Returns:
+          x (np.ndarray): A flattened list of the coordinates for the free rows.
+        """
+        return coords.reshape((self.dim, -1))[:, self._free].flatten()
+
+    def full_coordinates(self, x: np.ndarray) -> np.ndarray:
+        """Combine the coordinates of the free rows with those of the fixed rows.
+
+        Args:
+          x (np.ndarray): A flattened list of the coordinates for the free rows.
+
+        Returns:
+          coords (np.ndarray): A flattened list of the coordinates for all rows.
+        """
+        coords = self._x.copy()
+        coords[:, self._free] = x.reshape((self.dim, -1))
+        return coords.flatten()
+
+    def compute_functional(self, x: np.ndarray) -> float:
+        """Compute the target function at free coordinates `x`.
+
+        This differs from Target.compute_functional by the constant contribution
+        of the elements between pairs of fixed rows.
+        """
+        coords = self.full_coordinates(x).reshape((self.dim, -1))
+        elements = np.square(self._rij - coords.T @ coords[:, self._free])
+        np.multiply(self._wij, elements, out=elements)
+        # Elements between pairs of free rows appear twice in the full matrix
+        return elements.sum() - 0.5 * elements[self._free].sum()
+
+    def compute_gradients(self, x: np.ndarray) -> np.ndarray:
+        """Compute the gradients of the target function at free coordinates `x`."""
+        coords = self.full_coordinates(x).reshape((self.dim, -1))
+        residuals = self._rij - coords.T @ coords[:, self._free]
+        grad = -2 * coords @ np.multiply(self._wij, residuals)
+        return grad.flatten()
+
+    def curvatures(self, x: np.ndarray) -> np.ndarray:
+        """Compute the curvature of the target function at free coordinates `x`."""
+        coords = self.full_coordinates(x).reshape((self.dim, -1))
+        curvs = 2 * np.square(coords) @ self._wij
+        return curvs.flatten()
@@ -138,6 +138,8 @@
 
 from dials.array_family.flex_ext import (  # noqa: F401; lgtm
     real,
+    reflection_table_groups,
+    reflection_table_row_filter,
     reflection_table_selector,
 )
 from dials_array_family_flex_ext import (  # noqa: F401; lgtm
@@ -5,7 +5,6 @@
 
 from __future__ import annotations
 
-import collections
 import copy
 import functools
 import itertools
@@ -22,6 +21,7 @@
 import cctbx.array_family.flex
 import cctbx.miller
 import libtbx.smart_open
+from dxtbx import flumpy
 from dxtbx.model import ExperimentType
 from scitbx import matrix
 
@@ -31,9 +31,20 @@
 import dials_array_family_flex_ext
 from dials.algorithms.centroid import centroid_px_to_mm_panel
 from dials.util.exclude_images import expand_exclude_multiples, set_invalid_images
+from dials.util.system import CPU_COUNT
 from dials.util.table_as_hdf5_file import HDF5TableFile
-
-__all__ = ["real", "reflection_table_selector"]
+from dials.util.table_as_mmap_file import (
+    MappedReflectionTable,
+    is_mmap_table_file,
+    write_mmap_table,
+)
+
+__all__ = [
+    "real",
+    "reflection_table_groups",
+    "reflection_table_row_filter",
+    "reflection_table_selector",
+]
 
 logger = logging.getLogger(__name__)
 
@@ -46,6 +57,76 @@
     raise TypeError('unknown "real" type')
 
 
+def _packed_match_keys(columns1, columns2):
+    """
+    Combine several integer key columns into a single int64 key per row.
+
+    The same packing is used for both sets of columns, so that equal keys
+    correspond to equal rows. Where the value ranges fit, the columns are packed
+    into the bits of a 64-bit integer; otherwise the keys are the indices of the
+    unique rows.
+
+    :param columns1: A list of integer numpy arrays (1D or 2D) for the first set
+    :param columns2: The corresponding list of arrays for the second set
+    :return: A tuple of the key arrays for each set
+    """
+    parts1 = np.column_stack([c.astype(np.int64) for c in columns1])
+    parts2 = np.column_stack([c.astype(np.int64) for c in columns2])
+    both = np.concatenate([parts1, parts2])
+    if not len(both):
+        return np.zeros(len(parts1), np.int64), np.zeros(len(parts2), np.int64)
+    lower = both.min(axis=0)
+    widths = [int(w).bit_length() for w in both.max(axis=0) - lower]
+    if sum(widths) <= 63:
+        keys = np.zeros(len(both), dtype=np.int64)
+        for k, width in enumerate(widths):
+            keys = (keys << width) | (both[:, k] - lower[k])
+    else:
+        keys = np.unique(both, axis=0, return_inverse=True)[1].reshape(-1)
+    return keys[: len(parts1)], keys[len(parts1) :]
+
+
+def _match_nearest_by_key(keys1, xyz1, keys2, xyz2):
+    """
+    Match rows with equal keys, resolving ambiguities by distance.
+
+    Each row of the first set is paired with the nearest row of the second set
+    with the same key (the lowest index in case of a tie); where several rows of
+    the first set pair with the same row of the second set, only the nearest is
+    kept (again, the lowest index in case of a tie).
+
+    :return: The matched indices into the first and second sets, sorted by the
+             index into the first set
+    """
+    # Sort-merge join: find the range of second-set rows for each first-set key
+    order2 = np.argsort(keys2, kind="stable")
+    sorted_keys2 = keys2[order2]
+    lo = np.searchsorted(sorted_keys2, keys1, side="left")
+    counts = np.searchsorted(sorted_keys2, keys1, side="right") - lo
+
+    # Expand to all candidate pairs, ordered by first then second index
+    i = np.repeat(np.arange(len(keys1)), counts)
+    offsets = np.arange(len(i)) - np.repeat(np.cumsum(counts) - counts, counts)
+    j = order2[np.repeat(lo, counts) + offsets]
+    delta = xyz1[i] - xyz2[j]
+    d = delta[:, 0] ** 2 + delta[:, 1] ** 2 + delta[:, 2] ** 2
+
+    # The nearest second-set row for each first-set row
+    order = np.lexsort((j, d, i))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = i[order][1:] != i[order][:-1]
+    i, j, d = i[order][first], j[order][first], d[order][first]
+
+    # The nearest first-set row for each matched second-set row
+    order = np.lexsort((i, d, j))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = j[order][1:] != j[order][:-1]
+    i, j = i[order][first], j[order][first]
+
+    order = np.argsort(i, kind="stable")
+    return i[order], j[order]
+
+
 @boost_adaptbx.boost.python.inject_into(dials_array_family_flex_ext.reflection_table)
 class _:
     """
@@ -139,7 +220,9 @@ def from_predictions_multi(
         return result
 
     @staticmethod
-    def from_observations(experiments, params=None, is_stills=False):
+    def from_observations(
+        experiments, params=None, is_stills=False, image_callback=None
+    ):
         """
         Construct a reflection table from observations.
 
@@ -149,6 +232,9 @@ def from_observations(experiments, params=None, is_stills=False):
                             ID remapping for dials.stills_process. Do
                             not use for general processing unless you
                             know all the implications.
+        :param image_callback: A function called as image_callback(imageset,
+                               index, reflections) with the spots found on each
+                               image, in image order, as the images are processed
         :return: The reflection table of observations
         """
         from dials.algorithms.spot_finding.factory import SpotFinderFactory
@@ -183,7 +269,10 @@ def from_observations(experiments, params=None, is_stills=False):
         # Get the spot-finder from the input parameters
         logger.info("Configuring spot finder from input parameters")
         spotfinder = SpotFinderFactory.from_parameters(
-            experiments=experiments, params=params, is_stills=is_stills
+            experiments=experiments,
+            params=params,
+            is_stills=is_stills,
+            image_callback=image_callback,
         )
 
         # Find the spots
@@ -225,6 +314,46 @@ def from_msgpack_file(filename):
                 infile.read()
             )
 
+    def as_mmap_file(self, filename, compression=None, nproc=None):
+        """
+        Write the reflection table to file in the memory-mappable column format
+
+        :param filename: The output filename
+        :param compression: Optionally compress the columns, e.g. with "zlib"
+        :param nproc: The number of threads to use for compression
+        """
+        if filename and hasattr(filename, "__fspath__"):
+            filename = filename.__fspath__()
+        # Clean up any removed experiments from the identifiers map
+        self.clean_experiment_identifiers_map()
+        write_mmap_table(
+            self, filename, compression=compression, nproc=nproc or CPU_COUNT
+        )
+
+    @staticmethod
+    def from_mmap_file(filename, columns=None, row_filter=None):
+        """
+        Read the reflection table from file in the memory-mappable column format
+
+        :param filename: The input filename
+        :param columns: If set, only decode these columns
+        :param row_filter: If set, only decode rows selected by this
+                           reflection_table_row_filter
+        :return: The reflection table
+        """
+        with MappedReflectionTable(filename, nproc=CPU_COUNT) as mapped:
+            return mapped.as_reflection_table(columns, row_filter=row_filter)
+
+    @staticmethod
+    def open_mmap_file(filename):
+        """
+        Open a memory-mappable reflection file without decoding any columns.
+
+        The returned object decodes columns on first access; use it as a context
+        manager, or call close(), to release the mapping.
+        """
+        return MappedReflectionTable(filename, nproc=CPU_COUNT)
+
     def as_file(self, filename):
         """
         Write the reflection table to file in either msgpack or pickle format
@@ -233,25 +362,57 @@ def as_file(self, filename):
             self.as_pickle(filename)
         elif os.getenv("DIALS_USE_H5"):
             self.as_hdf5(filename)
+        elif os.getenv("DIALS_USE_MMAP"):
+            self.as_mmap_file(
+                filename, compression=os.getenv("DIALS_MMAP_COMPRESSION") or None
+            )
         else:
             self.as_msgpack_file(filename)
 
     @staticmethod
-    def from_file(filename):
+    def from_file(filename, columns=None, row_filter=None):
         """
         Read the reflection table from either pickle or msgpack
+
+        :param filename: The input filename
+        :param columns: If set, only keep these columns
+        :param row_filter: If set, a reflection_table_row_filter selecting the
+                           rows to keep
+        :return: The reflection table
         """
+        if is_mmap_table_file(filename):
+            # Projection and filtering are applied while decoding
+            return dials_array_family_flex_ext.reflection_table.from_mmap_file(
+                filename, columns=columns, row_filter=row_filter
+            )
         try:
-            return dials_array_family_flex_ext.reflection_table.from_msgpack_file(
+            table = dials_array_family_flex_ext.reflection_table.from_msgpack_file(
                 filename
             )
         except RuntimeError:
             try:
-                return dials_array_family_flex_ext.reflection_table.from_hdf5(filename)
+                table = dials_array_family_flex_ext.reflection_table.from_hdf5(filename)
             except OSError:
-                return dials_array_family_flex_ext.reflection_table.from_pickle(
+                table = dials_array_family_flex_ext.reflection_table.from_pickle(
                     filename
                 )
+        return table.restrict(columns=columns, row_filter=row_filter)
+
+    def restrict(self, columns=None, row_filter=None):
+        """
+        Apply the loading options of from_file to an already loaded table
+
+        :param columns: If set, only keep these columns
+        :param row_filter: If set, a reflection_table_row_filter selecting the
+                           rows to keep
+        :return: The restricted reflection table
+        """
+        table = self
+        if row_filter is not None:
+            table = table.select(row_filter(table))
+        if columns is not None:
+            table = table.select(tuple(columns))
+        return table
 
     @staticmethod
     def empty_standard(nrows):
@@ -554,74 +715,32 @@ def match_with_reference(self, other):
         logger.info(" %d observed reflections input", len(other))
         logger.info(" %d reflections predicted", len(self))
 
-        # Get the miller index, entering flag and turn number for
-        # Both sets of reflections
-        i1 = self["id"]
-        h1 = self["miller_index"]
-        e1 = self["entering"].as_int()
-        x1, y1, z1 = self["xyzcal.px"].parts()
-        p1 = self["panel"]
-
-        i2 = other["id"]
-        h2 = other["miller_index"]
-        e2 = other["entering"].as_int()
-        x2, y2, z2 = other["xyzcal.px"].parts()
-        p2 = other["panel"]
-
-        class Match:
-            def __init__(self):
-                self.a = []
-                self.b = []
-
-        # Create the match lookup
-        lookup = collections.defaultdict(Match)
-        for i in range(len(self)):
-            item = h1[i] + (e1[i], i1[i], p1[i])
-            lookup[item].a.append(i)
-
-        # Add matches from input reflections
-        for i in range(len(other)):
-            item = h2[i] + (e2[i], i2[i], p2[i])
-            if item in lookup:
-                lookup[item].b.append(i)
-
-        # Create the list of matches
-        match1 = []
-        match2 = []
-        for item, value in lookup.items():
-            if len(value.b) == 0:
-                continue
-            elif len(value.a) == 1 and len(value.b) == 1:
-                match1.append(value.a[0])
-                match2.append(value.b[0])
-            else:
-                matched = {}
-                for i in value.a:
-                    d = []
-                    for j in value.b:
-                        dx = x1[i] - x2[j]
-                        dy = y1[i] - y2[j]
-                        dz = z1[i] - z2[j]
-                        d.append((i, j, dx**2 + dy**2 + dz**2))
-                    i, j, d = min(d, key=lambda x: x[2])
-                    if j not in matched:
-                        matched[j] = (i, d)
-                    elif d < matched[j][1]:
-                        matched[j] = (i, d)
-                for key1, value1 in matched.items():
-                    match1.append(value1[0])
-                    match2.append(key1)
-
-        # Select everything which matches
-        sind = cctbx.array_family.flex.size_t(match1)
-        oind = cctbx.array_family.flex.size_t(match2)
-
-        # Sort by self index
-        sort_index = cctbx.array_family.flex.size_t(
-            sorted(range(len(sind)), key=lambda x: sind[x])
+        # Match on miller index, entering flag, experiment id and panel, resolving
+        # ambiguous matches by the nearest predicted position
+        keys1, keys2 = _packed_match_keys(
+            [
+                flumpy.to_numpy(self["miller_index"]),
+                flumpy.to_numpy(self["entering"]).astype(np.int64),
+                flumpy.to_numpy(self["id"]),
+                flumpy.to_numpy(self["panel"]),
+            ],
+            [
+                flumpy.to_numpy(other["miller_index"]),
+                flumpy.to_numpy(other["entering"]).astype(np.int64),
+                flumpy.to_numpy(other["id"]),
+                flumpy.to_numpy(other["panel"]),
+            ],
+        )
+        match1, match2 = _match_nearest_by_key(
+            keys1,
+            flumpy.to_numpy(self["xyzcal.px"]),
+            keys2,
+            flumpy.to_numpy(other["xyzcal.px"]),
         )
-        sind = sind.select(sort_index)
-        oind = oind.select(sort_index)
+
+        # Select everything which matches, sorted by self index
+        sind = flumpy.from_numpy(match1.astype(np.uint64))
+        oind = flumpy.from_numpy(match2.astype(np.uint64))
 
         s2 = self.select(sind)
         o2 = other.select(oind)
@@ -1424,6 +1543,127 @@ def get(self, key, default=None):
             return self[key]
         return default
 
+    def group_by(self, keys, selection=None):
+        """
+        Group the rows of the table by equal values of integer key columns.
+
+        :param keys: The name of the key column, or a list of names
+        :param selection: Optionally, a flex.size_t of the rows to group
+
+        :return: A reflection_table_groups, with the rows of each group in
+                 table order
+        """
+        if isinstance(keys, str):
+            keys = [keys]
+        if selection is None:
+            rows = np.arange(len(self))
+        else:
+            rows = flumpy.to_numpy(selection).astype(np.int64)
+        return reflection_table_groups(
+            rows, [flumpy.to_numpy(self[key])[rows] for key in keys]
+        )
+
+
+class reflection_table_groups:
+    """
+    Rows of a reflection table grouped by equal key values, for reductions
+    over each group.
+
+    The groups are ordered by key. Within a group the rows keep the order in
+    which they were given, and the reductions accumulate over the rows in that
+    order, so the results are identical to those of a loop over each group.
+    """
+
+    def __init__(self, rows, keys):
+        """
+        Initialise the groups
+
+        :param rows: A numpy array of the indices of the rows to group
+        :param keys: A list of numpy arrays of key values for these rows, the
+                     first being the primary key
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        order = np.lexsort(tuple(np.asarray(key) for key in reversed(keys)))
+        self.rows = rows[order]
+        new_group = np.ones(len(rows), dtype=bool)
+        for key in keys:
+            key = np.asarray(key)[order]
+            new_group[1:] &= key[1:] == key[:-1]
+        new_group[1:] = ~new_group[1:]
+        self.starts = np.flatnonzero(new_group)
+        self.sizes = np.diff(np.append(self.starts, len(rows)))
+
+    def __len__(self):
+        """
+        :return: The number of groups
+        """
+        return len(self.starts)
+
+    def select(self, selection):
+        """
+        Select a subset of the groups
+
+        :param selection: A numpy boolean mask over the groups
+
+        :return: The selected groups
+        """
+        selected = copy.copy(self)
+        selected.rows = self.rows[np.repeat(selection, self.sizes)]
+        selected.sizes = self.sizes[selection]
+        selected.starts = np.cumsum(selected.sizes) - selected.sizes
+        return selected
+
+    @property
+    def first(self):
+        """
+        :return: The first row of each group
+        """
+        return self.rows[self.starts]
+
+    @property
+    def others(self):
+        """
+        :return: All rows except for the first of each group, in group order
+        """
+        others = np.ones(len(self.rows), dtype=bool)
+        others[self.starts] = False
+        return self.rows[others]
+
+    def sum(self, values):
+        """
+        Sum values over the rows of each group
+
+        :param values: A numpy array of values for all rows of the table
+
+        :return: A numpy array of the sum for each group
+        """
+        values = np.asarray(values)[self.rows]
+        result = values[self.starts].copy()
+        if not len(result):
+            return result
+        # Add the k'th row of each group with more than k rows, taking the
+        # groups from largest to smallest, so the cost is linear in the rows
+        by_size = np.argsort(-self.sizes, kind="stable")
+        negative_sizes = -self.sizes[by_size]
+        for k in range(1, self.sizes.max()):
+            groups = by_size[: np.searchsorted(negative_sizes, -k, side="left")]
+            result[groups] += values[self.starts[groups] + k]
+        return result
+
+    def weighted_mean(self, values, weights):
+        """
+        The weighted mean of values over the rows of each group
+
+        :param values: A numpy array of values for all rows of the table
+        :param weights: A numpy array of weights for all rows of the table
+
+        :return: Numpy arrays of the weighted mean and the total weight for each
+                 group. The mean is not finite where the total weight is zero.
+        """
+        total_weight = self.sum(weights)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return self.sum(np.asarray(weights) * values) / total_weight, total_weight
+
 
 class reflection_table_selector:
     """
@@ -1542,3 +1782,78 @@ def __call__(self, reflections):
         else:
             mask1 = mask2
         return mask1
+
+
+class reflection_table_row_filter:
+    """
+    A simple row predicate that can be applied while loading reflection tables.
+
+    Rows are kept if all of the configured conditions hold: all bits of the
+    flags mask set, the experiment id in the list of ids and d within the
+    resolution range. Conditions left as None are not applied.
+    """
+
+    def __init__(self, flags=None, ids=None, d_min=None, d_max=None):
+        """
+        Initialise the filter
+
+        :param flags: A flags mask, all bits of which must be set
+        :param ids: A list of experiment ids to keep
+        :param d_min: The high resolution limit
+        :param d_max: The low resolution limit
+        """
+        self.flags = int(flags) if flags else None
+        self.ids = list(ids) if ids is not None else None
+        self.d_min = d_min
+        self.d_max = d_max
+
+    @property
+    def columns(self):
+        """
+        The columns needed to evaluate the filter
+        """
+        columns = []
+        if self.flags is not None:
+            columns.append("flags")
+        if self.ids is not None:
+            columns.append("id")
+        if self.d_min is not None or self.d_max is not None:
+            columns.append("d")
+        return columns
+
+    def mask(self, get_column, nrows):
+        """
+        Evaluate the filter as a numpy boolean mask
+
+        :param get_column: A callable returning a column as a numpy array
+        :param nrows: The number of rows
+
+        :return: The selection as a numpy mask
+        """
+        mask = np.ones(nrows, dtype=bool)
+        if self.flags is not None:
+            mask &= (get_column("flags") & self.flags) == self.flags
+        if self.ids is not None:
+            mask &= np.isin(get_column("id"), self.ids)
+        if self.d_min is not None or self.d_max is not None:
+            d = get_column("d")
+            if self.d_min is not None:
+                mask &= d >= self.d_min
+            if self.d_max is not None:
+                mask &= d <= self.d_max
+        return mask
+
+    def __call__(self, reflections):
+        """
+        Select the reflections
+
+        :param reflections: The reflections
+
+        :return: The selection as a mask
+        """
+        for column in self.columns:
+            if column not in reflections:
+                raise KeyError(f"Row filter requires missing column {column}")
+        return flumpy.from_numpy(
+            self.mask(lambda key: flumpy.to_numpy(reflections[key]), reflections.size())
+        )
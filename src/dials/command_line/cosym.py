@@ -89,6 +89,10 @@
     .type = path
   html = dials.cosym.html
     .type = path
+  state = None
+    .type = path
+    .help = "Save the state of the analysis to this file, which can be used as"
+            "incremental.state for a later analysis with additional datasets."
 }
 """,
     process_includes=True,
@@ -223,19 +227,25 @@ def __init__(self, experiments, reflections, params=None):
             ma.as_non_anomalous_array().merge_equivalents().array() for ma in datasets
         ]
 
+        identifiers = list(self._experiments.identifiers())
         if reference_intensities:
             # Note the minimum cell reduction routines can introduce a change of hand for the reference.
             # The purpose of the reference is to help the clustering, not guarantee the indexing solution.
             datasets.append(reference_intensities)
+            identifiers.append("reference")
             self.cosym_analysis = CosymAnalysis(
                 datasets,
                 self.params,
                 seed_dataset=len(datasets) - 1,
                 apply_sigma_correction=apply_sigma_correction,
+                identifiers=identifiers,
             )
         else:
             self.cosym_analysis = CosymAnalysis(
-                datasets, self.params, apply_sigma_correction=apply_sigma_correction
+                datasets,
+                self.params,
+                apply_sigma_correction=apply_sigma_correction,
+                identifiers=identifiers,
             )
 
     @property
@@ -283,6 +293,9 @@ def export(self):
             "Saving reindexed reflections to %s", self.params.output.reflections
         )
         reindexed_reflections.as_file(self.params.output.reflections)
+        if self.params.output.state:
+            logger.info("Saving cosym state to %s", self.params.output.state)
+            self.cosym_analysis.as_state().as_file(self.params.output.state)
 
     def _apply_reindexing_operators(self, reindexing_ops, subgroup=None):
         """Apply the reindexing operators to the reflections and experiments."""
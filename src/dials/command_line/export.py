@@ -162,6 +162,9 @@
     hklout = integrated.sad
       .type = path
       .help = "The output raw sadabs file"
+    compress = gz bz2 xz
+      .type = choice
+      .help = "Choose compression format (also appended to the file name)"
     run = 1
       .type = int
       .help = "Batch number / run number for output file"
@@ -176,6 +179,9 @@
     hklout = DIALS.HKL
       .type = path
       .help = "The output raw hkl file"
+    compress = gz bz2 xz
+      .type = choice
+      .help = "Choose compression format (also appended to the file name)"
 
   }
 
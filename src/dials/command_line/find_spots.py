@@ -4,6 +4,7 @@
 from __future__ import annotations
 
 import logging
+import os
 
 import libtbx.phil
 from dxtbx.model import ExperimentList
@@ -44,6 +45,14 @@
   dials.find_spots models.expt
 
   dials.find_spots models.expt output.reflections=strong.refl
+
+To find spots on a data collection that is still in progress, processing each
+image as soon as it has been written, use spotfinder.watch.enable=True. The
+spots on each image are reported as they are found, and can be written to a file
+that is updated as the data collection proceeds::
+
+  dials.find_spots master.h5 spotfinder.watch.enable=True \
+    output.partial_reflections=partial.refl
 """
 
 # Set the phil scope
@@ -67,6 +76,17 @@
     log = 'dials.find_spots.log'
       .type = str
       .help = "The log filename"
+
+    partial_reflections = None
+      .type = str
+      .help = "With spotfinder.watch.enable=True, periodically write the spots"
+              "found so far to this file, with the spots on each image found"
+              "independently. The final output is written to"
+              "output.reflections as usual."
+
+    partial_interval = 50
+      .type = int(value_min=1)
+      .help = "The number of images between updates of partial_reflections"
   }
 
   maximum_trusted_value = None
@@ -96,6 +116,54 @@
 working_phil = phil_scope.fetch(sources=[phil_overrides])
 
 
+class OnlineImageReport:
+    """
+    Report the spots on each image as it is processed in watch mode.
+
+    Per-image statistics are logged, and the spots found so far are written to
+    output.partial_reflections every output.partial_interval images.
+    """
+
+    def __init__(self, experiments, params):
+        self.experiments = experiments
+        self.filename = params.output.partial_reflections
+        self.interval = params.output.partial_interval
+        self.reflections = flex.reflection_table()
+        self.n_images = 0
+
+    def __call__(self, imageset, index, reflections):
+        i_expt, experiment = next(
+            (i, expt)
+            for i, expt in enumerate(self.experiments)
+            if expt.imageset is imageset
+        )
+        reflections["id"] = flex.int(reflections.size(), 0)
+        reflections.centroid_px_to_mm(ExperimentList([experiment]))
+        reflections.map_centroids_to_reciprocal_space(ExperimentList([experiment]))
+        stats = per_image_analysis.stats_for_reflection_table(reflections)
+        logger.info(
+            "Image %i: %i spots (%i excluding ice rings), estimated d_min %.2f",
+            index + 1,
+            stats.n_spots_total,
+            stats.n_spots_no_ice,
+            stats.estimated_d_min,
+        )
+
+        if self.filename:
+            reflections["id"] = flex.int(reflections.size(), i_expt)
+            self.reflections.extend(reflections)
+            self.n_images += 1
+            if self.n_images % self.interval == 0:
+                self.write()
+
+    def write(self):
+        """Write the spots found so far, replacing the file atomically."""
+        if not self.filename:
+            return
+        self.reflections.as_file(self.filename + ".tmp")
+        os.replace(self.filename + ".tmp", self.filename)
+
+
 def do_spotfinding(
     experiments: ExperimentList,
     params: libtbx.phil.scope_extract,
@@ -123,7 +191,14 @@ def do_spotfinding(
                 panel.set_trusted_range((trusted[0], params.maximum_trusted_value))
 
     # Loop through all the imagesets and find the strong spots
-    reflections = flex.reflection_table.from_observations(experiments, params)
+    if params.spotfinder.watch.enable:
+        report = OnlineImageReport(experiments, params)
+        reflections = flex.reflection_table.from_observations(
+            experiments, params, image_callback=report
+        )
+        report.write()
+    else:
+        reflections = flex.reflection_table.from_observations(experiments, params)
 
     # Add n_signal column - before deleting shoeboxes
     good = MaskCode.Foreground | MaskCode.Valid
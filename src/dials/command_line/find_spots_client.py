@@ -28,6 +28,18 @@ def work(host, port, filename, params):
     return conn.getresponse().read()
 
 
+def work_batch(host, port, filenames, params):
+    """Send a batch of images in one request, returning one response per image."""
+    conn = http.client.HTTPConnection(host, port)
+    body = json.dumps({"images": list(filenames), "params": list(params)})
+    conn.request("POST", "/", body, {"Content-type": "application/json"})
+    response = conn.getresponse()
+    if response.status != 200:
+        error = response.read()
+        return [error] * len(filenames)
+    return [line for line in response if line.strip()]
+
+
 def response_to_xml(d):
     if "n_spots_total" in d:
         response = f"""<image>{d['image']}</image>
@@ -82,15 +94,28 @@ def work_all(
     json_file=None,
     grid=None,
     nproc=None,
+    batch_size=1,
 ):
     nproc = nproc or CPU_COUNT
     with ThreadPool(processes=nproc) as pool:
-        threads = {}
-        for filename in filenames:
-            threads[filename] = pool.apply_async(work, (host, port, filename, params))
+        if batch_size > 1:
+            batches = [
+                filenames[i : i + batch_size]
+                for i in range(0, len(filenames), batch_size)
+            ]
+            threads = [
+                pool.apply_async(work_batch, (host, port, batch, params))
+                for batch in batches
+            ]
+            responses = (response for t in threads for response in t.get())
+        else:
+            threads = [
+                pool.apply_async(work, (host, port, filename, params))
+                for filename in filenames
+            ]
+            responses = (t.get() for t in threads)
         results = []
-        for filename in filenames:
-            response = threads[filename].get()
+        for response in responses:
             d = json.loads(response)
             results.append(d)
             print(response_to_xml(d))
@@ -188,6 +213,9 @@ def stop(host, port, nproc):
   .type = path
 grid = None
   .type = ints(size=2, value_min=1)
+batch_size = 1
+  .type = int(value_min=1)
+  .help = "Number of images to send to the server in each request"
 """
 )
 
@@ -252,6 +280,7 @@ def run(args=None):
                 json_file=params.json,
                 grid=params.grid,
                 nproc=nproc,
+                batch_size=params.batch_size,
             )
 
 
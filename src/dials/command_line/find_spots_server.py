@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import copy
+import functools
 import http.server as server_base
 import json
 import logging
@@ -16,11 +18,13 @@
 from dials.algorithms.integration.integrator import create_integrator
 from dials.algorithms.profile_model.factory import ProfileModelFactory
 from dials.algorithms.spot_finding import per_image_analysis
+from dials.algorithms.spot_finding.factory import SpotFinderFactory
 from dials.array_family import flex
 from dials.command_line.find_spots import phil_scope as find_spots_phil_scope
 from dials.command_line.index import phil_scope as index_phil_scope
 from dials.command_line.integrate import phil_scope as integrate_phil_scope
 from dials.util import Sorry, show_mail_handle_errors
+from dials.util.exclude_images import expand_exclude_multiples, set_invalid_images
 from dials.util.options import ArgumentParser
 from dials.util.system import CPU_COUNT
 
@@ -39,6 +43,9 @@
 
   dials.find_spots_client [host=hostname] [port=1234] [nproc=8] /path/to/image.cbf
 
+Each server process is persistent, and caches the parsed parameters, spot finder
+configuration and masks between requests for images from the same detector.
+
 The client will return a short xml string indicating the number of spots found
 and several estimates of the resolution limit.
 
@@ -68,6 +75,16 @@
 
   dials.find_spots_client /path/to/image.cbf min_spot_size=2 d_min=2
 
+Multiple images may be sent to the server in a single request, with the results
+streamed back as each image is processed::
+
+  dials.find_spots_client batch_size=20 /path/to/image_*.cbf
+
+The images in a batch are processed one after another by a single server
+process, which saves the overhead of a request per image and reuses the spot
+finding state between them. The client sends several batches at once, so that
+they are processed in parallel by the server processes.
+
 To stop the server::
 
   dials.find_spots_client stop [host=hostname] [port=1234]
@@ -95,12 +112,8 @@ def _filter_by_resolution(experiments, reflections, d_min=None, d_max=None):
     return reflections
 
 
-def work(filename, cl=None):
-    if cl is None:
-        cl = []
-
-    phil_scope = libtbx.phil.parse(
-        """\
+_request_phil_scope = libtbx.phil.parse(
+    """\
 ice_rings {
   filter = True
     .type = bool
@@ -114,16 +127,32 @@ def work(filename, cl=None):
 indexing_min_spots = 10
   .type = int(value_min=1)
 """
+)
+
+# Each worker process keeps the spot finders it has configured, keyed on the
+# request parameters and the format and detector type of the images, so that
+# the threshold function state and masks are reused between requests
+_spot_finders = {}
+_max_cached_spot_finders = 16
+
+
+@functools.lru_cache(maxsize=32)
+def _parse_parameters(cl):
+    """
+    Parse the parameters passed with a request.
+
+    The result is cached, so PHIL is only interpreted once per worker process for
+    each distinct set of parameters. The returned objects are shared between
+    requests and must not be modified.
+
+    :param cl: A tuple of command line parameters
+    :return: A tuple of (request parameters, spot finding parameters, d_min, d_max,
+             unhandled parameters)
+    """
+    interp = _request_phil_scope.command_line_argument_interpreter()
+    request_params, unhandled = interp.process_and_fetch(
+        list(cl), custom_processor="collect_remaining"
     )
-    interp = phil_scope.command_line_argument_interpreter()
-    params, unhandled = interp.process_and_fetch(
-        cl, custom_processor="collect_remaining"
-    )
-    filter_ice = params.extract().ice_rings.filter
-    ice_rings_width = params.extract().ice_rings.width
-    index = params.extract().index
-    integrate = params.extract().integrate
-    indexing_min_spots = params.extract().indexing_min_spots
 
     interp = find_spots_phil_scope.command_line_argument_interpreter()
     phil_scope, unhandled = interp.process_and_fetch(
@@ -134,12 +163,6 @@ def work(filename, cl=None):
     params = phil_scope.extract()
     # no need to write the hot mask in the server/client
     params.spotfinder.write_hot_mask = False
-    experiments = ExperimentListFactory.from_filenames([filename])
-    if params.spotfinder.scan_range and len(experiments) > 1:
-        # This means we've imported a sequence of still image: select
-        # only the experiment, i.e. image, we're interested in
-        ((start, end),) = params.spotfinder.scan_range
-        experiments = experiments[start - 1 : end]
 
     # Avoid overhead of calculating per-pixel resolution masks in spotfinding
     # and instead perform post-filtering of spot centroids by resolution
@@ -148,8 +171,103 @@ def work(filename, cl=None):
     params.spotfinder.filter.d_min = None
     params.spotfinder.filter.d_max = None
 
+    return request_params.extract(), params, d_min, d_max, tuple(unhandled)
+
+
+def _cache_masks(mask_generator, maxsize=4):
+    """
+    Wrap a mask generator to reuse the masks for previously seen models.
+
+    The mask only depends on the detector and beam models (and the spot finding
+    parameters, which are fixed for a given mask generator), so there is no need
+    to regenerate it for every image.
+    """
+    cache = []
+
+    def _generate_mask(imageset):
+        key = (imageset.get_detector(), imageset.get_beam())
+        for i, (cached_key, mask) in enumerate(cache):
+            if cached_key == key:
+                cache.append(cache.pop(i))
+                return mask
+        mask = mask_generator(imageset)
+        cache.append((key, mask))
+        if len(cache) > maxsize:
+            del cache[0]
+        return mask
+
+    return _generate_mask
+
+
+def _get_spot_finder(cl, params, experiments):
+    """
+    Get a configured spot finder for the experiments, reusing a cached one if
+    possible.
+
+    :param cl: The tuple of command line parameters used to create params
+    :param params: The spot finding parameters
+    :param experiments: The experiments to process
+    :return: The spot finder
+    """
+    imageset = experiments[0].imageset
+    key = (
+        cl,
+        imageset.get_format_class(),
+        type(imageset),
+        imageset.get_detector()[0].get_type(),
+    )
+    spot_finder = _spot_finders.get(key)
+    if spot_finder is None:
+        # The factory modifies the parameters, so work on a private copy
+        params = copy.deepcopy(params)
+        if params.spotfinder.filter.min_spot_size is libtbx.Auto:
+            if imageset.get_detector()[0].get_type() == "SENSOR_PAD":
+                # smaller default value for pixel array detectors
+                params.spotfinder.filter.min_spot_size = 3
+            else:
+                params.spotfinder.filter.min_spot_size = 6
+        spot_finder = SpotFinderFactory.from_parameters(
+            params=params, experiments=experiments
+        )
+        spot_finder.mask_generator = _cache_masks(spot_finder.mask_generator)
+        if len(_spot_finders) >= _max_cached_spot_finders:
+            del _spot_finders[next(iter(_spot_finders))]
+        _spot_finders[key] = spot_finder
+    return spot_finder
+
+
+def work(filename, cl=None):
+    if cl is None:
+        cl = []
+    cl = tuple(cl)
+
+    request_params, params, d_min, d_max, unhandled = _parse_parameters(cl)
+    filter_ice = request_params.ice_rings.filter
+    ice_rings_width = request_params.ice_rings.width
+    index = request_params.index
+    integrate = request_params.integrate
+    indexing_min_spots = request_params.indexing_min_spots
+    unhandled = list(unhandled)
+
+    experiments = ExperimentListFactory.from_filenames([filename])
+    if params.spotfinder.scan_range and len(experiments) > 1:
+        # This means we've imported a sequence of still image: select
+        # only the experiment, i.e. image, we're interested in
+        ((start, end),) = params.spotfinder.scan_range
+        experiments = experiments[start - 1 : end]
+
     t0 = time.perf_counter()
-    reflections = flex.reflection_table.from_observations(experiments, params)
+    if params.spotfinder.exclude_images_multiple:
+        exclude_images = expand_exclude_multiples(
+            experiments,
+            params.spotfinder.exclude_images_multiple,
+            params.spotfinder.exclude_images,
+        )
+    else:
+        exclude_images = params.spotfinder.exclude_images
+    experiments = set_invalid_images(experiments, exclude_images)
+    spot_finder = _get_spot_finder(cl, params, experiments)
+    reflections = spot_finder.find_spots(experiments)
 
     if d_min or d_max:
         reflections = _filter_by_resolution(
@@ -293,6 +411,20 @@ def work(filename, cl=None):
     return stats
 
 
+def _process_image(filename, params):
+    """Run the analysis for a single image, capturing any error in the result."""
+    # If we're passing a url through, then unquote and ignore leading /
+    if "%3A//" in filename:
+        filename = urllib.parse.unquote(filename[1:])
+
+    d = {"image": filename}
+    try:
+        d.update(work(filename, params))
+    except Exception as e:
+        d["error"] = str(e)
+    return d
+
+
 class handler(server_base.BaseHTTPRequestHandler):
     def do_GET(self):
         """Respond to a GET request."""
@@ -307,19 +439,8 @@ def do_GET(self):
         filename = self.path.split(";")[0]
         params = self.path.split(";")[1:]
 
-        # If we're passing a url through, then unquote and ignore leading /
-        if "%3A//" in filename:
-            filename = urllib.parse.unquote(filename[1:])
-
-        d = {"image": filename}
-
-        try:
-            stats = work(filename, params)
-            d.update(stats)
-            response = 200
-        except Exception as e:
-            d["error"] = str(e)
-            response = 500
+        d = _process_image(filename, params)
+        response = 500 if "error" in d else 200
 
         self.send_response(response)
         self.send_header("Content-type", "application/json")
@@ -327,6 +448,34 @@ def do_GET(self):
         response = json.dumps(d).encode()
         self.wfile.write(response)
 
+    def do_POST(self):
+        """
+        Respond to a POST request for a batch of images.
+
+        The request body is a JSON object with a list of "images" and an optional
+        list of "params". The results are streamed back as newline-delimited JSON,
+        one line per image, in the order of the request as each image finishes.
+        """
+        try:
+            length = int(self.headers["Content-Length"])
+            request = json.loads(self.rfile.read(length))
+            filenames = list(request["images"])
+            params = list(request.get("params", []))
+        except Exception as e:
+            self.send_response(400)
+            self.send_header("Content-type", "application/json")
+            self.end_headers()
+            self.wfile.write(json.dumps({"error": str(e)}).encode())
+            return
+
+        self.send_response(200)
+        self.send_header("Content-type", "application/x-ndjson")
+        self.end_headers()
+        for filename in filenames:
+            d = _process_image(filename, params)
+            self.wfile.write(json.dumps(d).encode() + b"\n")
+            self.wfile.flush()
+
 
 def serve(httpd):
     try:
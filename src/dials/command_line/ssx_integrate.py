@@ -60,6 +60,7 @@
 from dials.util.combine_experiments import CombineWithReference
 from dials.util.options import ArgumentParser, flatten_experiments, flatten_reflections
 from dials.util.system import CPU_COUNT
+from dials.util.table_as_hdf5_file import HDF5TableStreamWriter
 from dials.util.version import dials_version
 
 logger = logging.getLogger("dials.ssx_integrate")
@@ -79,6 +80,12 @@
     batch_size = 50
       .type = int
       .help = "Number of images to save in each output file"
+    stream = False
+      .type = bool
+      .help = "Stream the integrated reflections of all batches into a single"
+              "chunked HDF5 reflection file (integrated.refl) as each batch is"
+              "integrated, and save a single integrated.expt, rather than saving"
+              "a pair of output files per batch."
     log = "dials.ssx_integrate.log"
       .type = str
     html = "dials.ssx_integrate.html"
@@ -291,7 +298,9 @@ def wrap_integrate_one(input_to_integrate: InputToIntegrate):
     return result
 
 
-def process_batch(sub_tables, sub_expts, configuration, batch_offset=0):
+def process_batch(
+    sub_tables, sub_expts, configuration, batch_offset=0, writer=None, id_offset=0
+):
     # create iterable
     input_iterable: list[InputToIntegrate] = []
     from dxtbx.imageset import ImageSequence, ImageSet
@@ -374,23 +383,36 @@ def process_batch(sub_tables, sub_expts, configuration, batch_offset=0):
                     result.experiment.detector = use_detector
             ids_map = dict(result.table.experiment_identifiers())
             del result.table.experiment_identifiers()[list(ids_map.keys())[0]]
-            result.table["id"] = flex.int(result.table.size(), n_integrated)
-            result.table.experiment_identifiers()[n_integrated] = list(
+            result.table["id"] = flex.int(result.table.size(), n_integrated + id_offset)
+            result.table.experiment_identifiers()[n_integrated + id_offset] = list(
                 ids_map.values()
             )[0]
             n_integrated += 1
-            integrated_reflections.extend(result.table)
+            if writer:
+                # Write straight to disk rather than accumulating the batch
+                writer.append(result.table)
+            else:
+                integrated_reflections.extend(result.table)
             integrated_experiments.append(result.experiment)
             configuration["aggregator"].add_dataset(result.collector, result.crystalno)
 
     integrated_experiments = ExperimentList(integrated_experiments)
-    integrated_reflections.assert_experiment_identifiers_are_consistent(
-        integrated_experiments
-    )
+    if not writer:
+        integrated_reflections.assert_experiment_identifiers_are_consistent(
+            integrated_experiments
+        )
     return integrated_experiments, integrated_reflections
 
 
-def run_integration(reflections, experiments, params):
+def run_integration(reflections, experiments, params, writer=None):
+    """
+    Integrate the data in batches, yielding the results for each batch.
+
+    If a writer (a dials.util.table_as_hdf5_file.HDF5TableStreamWriter) is
+    given, the integrated reflections are appended to it as they are produced,
+    with experiment ids numbered consecutively across batches, and the yielded
+    reflection tables are empty.
+    """
     assert len(reflections) == len(experiments)
     if params.output.nuggets:
         params.output.nuggets = pathlib.Path(params.output.nuggets)
@@ -402,6 +424,7 @@ def run_integration(reflections, experiments, params):
     batches, configuration = setup(reflections, params)
 
     # now process each batch, and do parallel processing within a batch
+    n_integrated = 0
     for i, b in enumerate(batches[:-1]):
         end_ = batches[i + 1]
         logger.info(f"Processing images {b+1} to {end_}")
@@ -409,8 +432,15 @@ def run_integration(reflections, experiments, params):
         sub_expts = experiments[b:end_]
 
         integrated_experiments, integrated_reflections = process_batch(
-            sub_tables, sub_expts, configuration, batch_offset=b
+            sub_tables,
+            sub_expts,
+            configuration,
+            batch_offset=b,
+            writer=writer,
+            id_offset=n_integrated,
         )
+        if writer:
+            n_integrated += len(integrated_experiments)
         yield (
             integrated_experiments,
             integrated_reflections,
@@ -478,34 +508,55 @@ def run(args: list[str] = None, phil=working_phil) -> None:
 
     integrated_crystal_symmetries = []
 
-    for i, (int_expt, int_refl, aggregator) in enumerate(
-        run_integration(reflections, experiments, params)
-    ):
-        # combine beam and detector models if not already
-        if len(int_expt.detectors()) > 1 or len(int_expt.beams()) > 1:
-            combine = CombineWithReference(
-                detector=int_expt[0].detector, beam=int_expt[0].beam
-            )
-            elist = ExperimentList()
-            for expt in int_expt:
-                elist.append(combine(expt))
-            int_expt = elist
-        reflections_filename = f"integrated_{i+1}.refl"
-        experiments_filename = f"integrated_{i+1}.expt"
-        logger.info(f"Saving {int_refl.size()} reflections to {reflections_filename}")
-        int_refl.as_file(reflections_filename)
-        logger.info(f"Saving the experiments to {experiments_filename}")
-        int_expt.as_file(experiments_filename)
-
-        integrated_crystal_symmetries.extend(
-            [
-                crystal.symmetry(
-                    unit_cell=copy.deepcopy(cryst.get_unit_cell()),
-                    space_group=copy.deepcopy(cryst.get_space_group()),
+    if params.output.stream:
+        writer = HDF5TableStreamWriter("integrated.refl")
+        all_integrated_experiments = ExperimentList()
+    else:
+        writer = None
+
+    try:
+        for i, (int_expt, int_refl, aggregator) in enumerate(
+            run_integration(reflections, experiments, params, writer=writer)
+        ):
+            # combine beam and detector models if not already
+            if len(int_expt.detectors()) > 1 or len(int_expt.beams()) > 1:
+                combine = CombineWithReference(
+                    detector=int_expt[0].detector, beam=int_expt[0].beam
                 )
-                for cryst in int_expt.crystals()
-            ]
-        )
+                elist = ExperimentList()
+                for expt in int_expt:
+                    elist.append(combine(expt))
+                int_expt = elist
+            if writer:
+                all_integrated_experiments.extend(int_expt)
+            else:
+                reflections_filename = f"integrated_{i+1}.refl"
+                experiments_filename = f"integrated_{i+1}.expt"
+                logger.info(
+                    f"Saving {int_refl.size()} reflections to {reflections_filename}"
+                )
+                int_refl.as_file(reflections_filename)
+                logger.info(f"Saving the experiments to {experiments_filename}")
+                int_expt.as_file(experiments_filename)
+
+            integrated_crystal_symmetries.extend(
+                [
+                    crystal.symmetry(
+                        unit_cell=copy.deepcopy(cryst.get_unit_cell()),
+                        space_group=copy.deepcopy(cryst.get_space_group()),
+                    )
+                    for cryst in int_expt.crystals()
+                ]
+            )
+    finally:
+        # Close the stream, so that the file is complete even if integration failed
+        if writer:
+            writer.close()
+
+    if writer:
+        logger.info("Saved the integrated reflections to integrated.refl")
+        logger.info("Saving the experiments to integrated.expt")
+        all_integrated_experiments.as_file("integrated.expt")
 
     plots, cluster_plots = ({}, {})
     if integrated_crystal_symmetries:
@@ -1,7 +1,9 @@
 from __future__ import annotations
 
 import collections
+import concurrent.futures
 import copy
+import functools
 import glob
 import logging
 import os
@@ -22,6 +24,7 @@
 import dials.util
 from dials.array_family import flex
 from dials.util import log
+from dials.util.executor import futures_initializer, process_items
 
 logger = logging.getLogger("dials.command_line.stills_process")
 
@@ -163,12 +166,23 @@ def _control_phil_str():
   }
 
   mp {
-    method = *multiprocessing sge lsf pbs mpi
+    method = *multiprocessing sge lsf pbs mpi futures
       .type = choice
-      .help = "The multiprocessing method to use"
+      .help = The multiprocessing method to use. Images are handed out to     \
+              processes as they become idle. With futures, each batch of      \
+              images is processed in a concurrent.futures process pool by a   \
+              new Processor, so composite output is written for each batch.
     nproc = 1
       .type = int(value_min=1)
       .help = "The number of processes to use."
+    batch_size = 1
+      .type = int(value_min=1)
+      .help = The number of images sent to a process at a time. Larger        \
+              batches reduce the communication overhead for small images.
+    max_retries = 1
+      .type = int(value_min=0)
+      .help = The number of times to retry an image after an unhandled error, \
+              possibly in a different process.
     composite_stride = None
       .type = int
       .help = For MPI, if using composite mode, specify how many ranks to    \
@@ -433,8 +447,6 @@ def load_reference_geometry(self):
 
     def run(self, args=None):
         """Execute the script."""
-        from libtbx import easy_mp
-
         try:
             from mpi4py import MPI
         except ImportError:
@@ -592,9 +604,6 @@ def run(self, args=None):
                     )
 
         self.load_reference_geometry()
-        from dials.command_line.dials_import import ManualGeometryUpdater
-
-        update_geometry = ManualGeometryUpdater(params)
 
         # Import stuff
         logger.info("Loading files...")
@@ -638,46 +647,6 @@ def run(self, args=None):
                     split_experiments2.append(split_experiments[i])
             split_experiments = split_experiments2
 
-            # Wrapper function
-            def do_work(i, item_list, processor=None, finalize=True):
-                if not processor:
-                    processor = Processor(
-                        copy.deepcopy(params), composite_tag="%04d" % i, rank=i
-                    )
-
-                for item in item_list:
-                    tag = item[0]
-                    experiments = split_experiments[item[1]]
-                    try:
-                        assert len(experiments) == 1
-                        experiment = experiments[0]
-                        experiment.load_models()
-                        imageset = experiment.imageset
-                        update_geometry(imageset)
-                        experiment.beam = imageset.get_beam()
-                        experiment.detector = imageset.get_detector()
-                    except RuntimeError as e:
-                        logger.warning("Error updating geometry on item %s, %s", tag, e)
-                        continue
-
-                    if self.reference_detector is not None:
-                        experiment = experiments[0]
-                        if self.params.input.sync_reference_geom:
-                            imageset = experiment.imageset
-                            sync_geometry(
-                                self.reference_detector.hierarchy(),
-                                imageset.get_detector().hierarchy(),
-                            )
-                            experiment.detector = imageset.get_detector()
-                        else:
-                            experiment.detector = copy.deepcopy(self.reference_detector)
-
-                    processor.process_experiments(tag, experiments)
-                    imageset.clear_cache()
-                if finalize:
-                    processor.finalize()
-                return processor
-
             iterable = list(zip(tags, range(len(split_experiments))))
 
         else:
@@ -701,55 +670,8 @@ def do_work(i, item_list, processor=None, finalize=True):
                     all_paths2.append(sorted_paths[i])
             all_paths = all_paths2
 
-            # Wrapper function
-            def do_work(i, item_list, processor=None, finalize=True):
-                if not processor:
-                    processor = Processor(
-                        copy.deepcopy(params), composite_tag="%04d" % i, rank=i
-                    )
-                for item in item_list:
-                    tag, filename = item
-
-                    experiments = do_import(filename, load_models=True)
-                    imagesets = experiments.imagesets()
-                    if len(imagesets) == 0 or len(imagesets[0]) == 0:
-                        logger.info("Zero length imageset in file: %s", filename)
-                        return
-                    if len(imagesets) > 1:
-                        raise Abort(f"Found more than one imageset in file: {filename}")
-                    if len(imagesets[0]) > 1:
-                        raise Abort(
-                            "Found a multi-image file. Run again with pre_import=True"
-                        )
-
-                    try:
-                        update_geometry(imagesets[0])
-                        experiment = experiments[0]
-                        experiment.beam = imagesets[0].get_beam()
-                        experiment.detector = imagesets[0].get_detector()
-                    except RuntimeError as e:
-                        logger.warning("Error updating geometry on item %s, %s", tag, e)
-                        continue
-
-                    if self.reference_detector is not None:
-                        if self.params.input.sync_reference_geom:
-                            imageset = experiments[0].imageset
-                            sync_geometry(
-                                self.reference_detector.hierarchy(),
-                                imageset.get_detector().hierarchy(),
-                            )
-                            experiments[0].detector = imageset.get_detector()
-                        else:
-                            experiments[0].detector = copy.deepcopy(
-                                self.reference_detector
-                            )
-
-                    processor.process_experiments(tag, experiments)
-                if finalize:
-                    processor.finalize()
-                return processor
-
             iterable = list(zip(tags, all_paths))
+            split_experiments = None
 
         if params.input.max_images:
             iterable = iterable[: params.input.max_images]
@@ -775,84 +697,36 @@ def process_this_event(nevent):
                 n_accept = n_mod_denom < process_fractions.numerator
                 return n_accept
 
+        if process_fractions:
+            iterable = [
+                item for i, item in enumerate(iterable) if process_this_event(i)
+            ]
+
         # Process the data
+        factory = functools.partial(
+            _ImageProcessor, params, self.reference_detector, split_experiments
+        )
+        kwargs = {
+            "nproc": params.mp.nproc,
+            "batch_size": params.mp.batch_size,
+            "max_retries": params.mp.max_retries,
+        }
         if params.mp.method == "mpi":
-            if size <= 2:  # client/server only makes sense for n>2
-                subset = [
-                    item for i, item in enumerate(iterable) if (i + rank) % size == 0
-                ]
-                do_work(rank, subset)
-            else:
-                processor = Processor(
-                    copy.deepcopy(params), composite_tag="%04d" % rank, rank=rank
+            process_items(factory, iterable, method="mpi", comm=comm, **kwargs)
+        elif params.mp.method == "futures":
+            # Send the factory, with the experiments, once to each process
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=params.mp.nproc,
+                initializer=futures_initializer,
+                initargs=(factory,),
+            ) as executor:
+                process_items(
+                    None, iterable, method="futures", executor=executor, **kwargs
                 )
-
-                if rank == 0:
-                    # server process
-                    num_iter = len(iterable)
-                    for item_num, item in enumerate(iterable):
-                        print(
-                            "Processing %d / %d shots" % (item_num, num_iter),
-                            flush=True,
-                        )
-                        if process_fractions and not process_this_event(item_num):
-                            continue
-
-                        print("Getting next available process")
-                        rankreq = comm.recv(source=MPI.ANY_SOURCE)
-                        print(f"Process {rankreq} is ready, sending {item[0]}\n")
-                        comm.send(item, dest=rankreq)
-                    # send a stop command to each process
-                    print("MPI DONE, sending stops\n")
-                    for rankreq in range(size - 1):
-                        rankreq = comm.recv(source=MPI.ANY_SOURCE)
-                        print("Sending stop to %d\n" % rankreq)
-                        comm.send("endrun", dest=rankreq)
-                    print("All stops sent.")
-
-                else:
-                    # client process
-                    while True:
-                        # inform the server this process is ready for an event
-                        print("Rank %d getting next task" % rank)
-                        comm.send(rank, dest=0)
-                        print("Rank %d waiting for response" % rank)
-                        item = comm.recv(source=0)
-                        if item == "endrun":
-                            print("Rank %d received endrun" % rank)
-                            break
-                        print("Rank %d beginning processing" % rank)
-                        try:
-                            processor = do_work(rank, [item], processor, finalize=False)
-                        except Exception as e:
-                            print(
-                                "Rank %d unhandled exception processing event" % rank,
-                                str(e),
-                            )
-                        print("Rank %d event processed" % rank)
-                processor.finalize()
+        elif params.mp.nproc == 1:
+            process_items(factory, iterable, method="serial", **kwargs)
         else:
-            from dxtbx.command_line.image_average import splitit
-
-            if params.mp.nproc == 1:
-                do_work(0, iterable)
-            else:
-                result = list(
-                    easy_mp.multi_core_run(
-                        myfunction=do_work,
-                        argstuples=list(enumerate(splitit(iterable, params.mp.nproc))),
-                        nproc=params.mp.nproc,
-                    )
-                )
-                error_list = [r[2] for r in result]
-                if error_list.count(None) != len(error_list):
-                    print(
-                        "Some processes failed execution. Not all images may have processed. Error messages:"
-                    )
-                    for error in error_list:
-                        if error is None:
-                            continue
-                        print(error)
+            process_items(factory, iterable, method="multiprocessing", **kwargs)
 
         # Total Time
         logger.info("")
@@ -867,6 +741,92 @@ def process_this_event(nevent):
             )
 
 
+class _ImageProcessor:
+    """Process images with a Processor, as a worker for process_items."""
+
+    def __init__(self, params, reference_detector, split_experiments, rank):
+        from dials.command_line.dials_import import ManualGeometryUpdater
+
+        self.params = params
+        self.reference_detector = reference_detector
+        self.split_experiments = split_experiments
+        self.update_geometry = ManualGeometryUpdater(params)
+        self.processor = Processor(
+            copy.deepcopy(params), composite_tag="%04d" % rank, rank=rank
+        )
+
+    def process(self, item):
+        if self.split_experiments is not None:
+            self._process_imported(*item)
+        else:
+            self._process_file(*item)
+
+    def finalize(self):
+        self.processor.finalize()
+
+    def _process_imported(self, tag, index):
+        experiments = self.split_experiments[index]
+        try:
+            assert len(experiments) == 1
+            experiment = experiments[0]
+            experiment.load_models()
+            imageset = experiment.imageset
+            self.update_geometry(imageset)
+            experiment.beam = imageset.get_beam()
+            experiment.detector = imageset.get_detector()
+        except RuntimeError as e:
+            logger.warning("Error updating geometry on item %s, %s", tag, e)
+            return
+
+        if self.reference_detector is not None:
+            experiment = experiments[0]
+            if self.params.input.sync_reference_geom:
+                imageset = experiment.imageset
+                sync_geometry(
+                    self.reference_detector.hierarchy(),
+                    imageset.get_detector().hierarchy(),
+                )
+                experiment.detector = imageset.get_detector()
+            else:
+                experiment.detector = copy.deepcopy(self.reference_detector)
+
+        self.processor.process_experiments(tag, experiments)
+        imageset.clear_cache()
+
+    def _process_file(self, tag, filename):
+        experiments = do_import(filename, load_models=True)
+        imagesets = experiments.imagesets()
+        if len(imagesets) == 0 or len(imagesets[0]) == 0:
+            logger.info("Zero length imageset in file: %s", filename)
+            return
+        if len(imagesets) > 1:
+            raise Abort(f"Found more than one imageset in file: {filename}")
+        if len(imagesets[0]) > 1:
+            raise Abort("Found a multi-image file. Run again with pre_import=True")
+
+        try:
+            self.update_geometry(imagesets[0])
+            experiment = experiments[0]
+            experiment.beam = imagesets[0].get_beam()
+            experiment.detector = imagesets[0].get_detector()
+        except RuntimeError as e:
+            logger.warning("Error updating geometry on item %s, %s", tag, e)
+            return
+
+        if self.reference_detector is not None:
+            if self.params.input.sync_reference_geom:
+                imageset = experiments[0].imageset
+                sync_geometry(
+                    self.reference_detector.hierarchy(),
+                    imageset.get_detector().hierarchy(),
+                )
+                experiments[0].detector = imageset.get_detector()
+            else:
+                experiments[0].detector = copy.deepcopy(self.reference_detector)
+
+        self.processor.process_experiments(tag, experiments)
+
+
 class Processor:
     def __init__(self, params, composite_tag=None, rank=0):
         self.params = params
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import logging
+import threading
 
 import libtbx
 from scitbx import matrix
@@ -31,6 +32,18 @@ def __init__(self, params):
         :param params: The input parameters
         """
         self.params = params
+        # The algorithm used by each thread, with its buffers for each image size
+        self._local = threading.local()
+
+    def __getstate__(self):
+        # Don't send the threshold buffers to other processes
+        state = self.__dict__.copy()
+        del state["_local"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
 
     def compute_threshold(self, image, mask, **kwargs):
         r"""
@@ -52,17 +65,23 @@ def compute_threshold(self, image, mask, **kwargs):
                 params.spotfinder.threshold.dispersion.global_threshold,
             )
 
-        self._algorithm = DispersionExtendedThresholdStrategy(
-            kernel_size=params.spotfinder.threshold.dispersion.kernel_size,
-            gain=params.spotfinder.threshold.dispersion.gain,
-            mask=params.spotfinder.lookup.mask,
-            n_sigma_b=params.spotfinder.threshold.dispersion.sigma_background,
-            n_sigma_s=params.spotfinder.threshold.dispersion.sigma_strong,
-            min_count=params.spotfinder.threshold.dispersion.min_local,
-            global_threshold=params.spotfinder.threshold.dispersion.global_threshold,
-        )
+        # Keep the algorithm, with its buffers for each image size, for the
+        # following images. Each thread has its own, as the threshold runs
+        # without the GIL in the threads of the pipelined mode.
+        algorithm = getattr(self._local, "algorithm", None)
+        if algorithm is None:
+            algorithm = DispersionExtendedThresholdStrategy(
+                kernel_size=params.spotfinder.threshold.dispersion.kernel_size,
+                gain=params.spotfinder.threshold.dispersion.gain,
+                mask=params.spotfinder.lookup.mask,
+                n_sigma_b=params.spotfinder.threshold.dispersion.sigma_background,
+                n_sigma_s=params.spotfinder.threshold.dispersion.sigma_strong,
+                min_count=params.spotfinder.threshold.dispersion.min_local,
+                global_threshold=params.spotfinder.threshold.dispersion.global_threshold,
+            )
+            self._local.algorithm = algorithm
 
-        return self._algorithm(image, mask)
+        return algorithm(image, mask)
 
 
 def estimate_global_threshold(image, mask=None, plot=False):
@@ -1,10 +1,13 @@
 from __future__ import annotations
 
+import bz2
 import contextlib
 import dataclasses
 import faulthandler
 import functools
+import gzip
 import io
+import lzma
 import os
 import pathlib
 import signal
@@ -27,6 +30,7 @@
 __all__ = [
     "debug_console",
     "debug_context_manager",
+    "open_for_writing",
     "progress",
     "show_mail_handle_errors",
     "Sorry",
@@ -235,3 +239,22 @@ def parse_htcondor_job_classad(filepath: pathlib.Path) -> HTCondorJobClassAd:
             cpus_provisioned=cpus_provisioned,
             memory_provisioned=memory_provisioned,
         )
+
+
+def open_for_writing(filename, compress=None):
+    """Open a text file for writing, optionally compressed.
+
+    Args:
+        filename: The file to write to
+        compress: None, or the compression format, one of "gz", "bz2" or "xz"
+
+    Returns:
+        The open file object
+    """
+    if compress == "gz":
+        return gzip.open(filename, "wt")
+    elif compress == "bz2":
+        return bz2.open(filename, "wt")
+    elif compress == "xz":
+        return lzma.open(filename, "wt")
+    return open(filename, "w")
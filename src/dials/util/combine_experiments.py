@@ -5,8 +5,11 @@
 import sys
 from dataclasses import dataclass
 
+import numpy as np
+
 import dxtbx.model
 import dxtbx.model.compare as compare
+from dxtbx import flumpy
 from dxtbx.model.experiment_list import (
     BeamComparison,
     DetectorComparison,
@@ -486,6 +489,9 @@ def combine_experiments(params, experiment_lists, reflection_tables):
     skipped_expts_min_refl = 0
     skipped_expts_max_refl = 0
 
+    # Index of each imageset in the combined experiments, keyed by identity
+    imageset_index = {}
+
     # loop through the input, building up the global lists
     nrefs_per_exp = []
     for refs, exps in zip(reflection_tables, experiment_lists):
@@ -493,13 +499,30 @@ def combine_experiments(params, experiment_lists, reflection_tables):
         ids_map = dict(refs.experiment_identifiers())
         # Keep track of mapping of imageset_ids old->new within this experimentlist
         imageset_result_map = {}
+        old_imageset_index = {
+            id(imageset): i for i, imageset in enumerate(exps.imagesets())
+        }
 
         for k in refs.experiment_identifiers().keys():
             del refs.experiment_identifiers()[k]
+
+        # Group the reflections by experiment, keeping their order within each
+        # experiment, so that the rows for experiment i are order[start[i]:end[i]]
+        ids = refs["id"].as_numpy_array()
+        order = np.argsort(ids, kind="stable")
+        bounds = np.searchsorted(ids[order], np.arange(len(exps) + 1))
+        has_imageset_id = "imageset_id" in refs
+        if has_imageset_id:
+            old_imageset_ids = refs["imageset_id"].as_numpy_array()
+
+        # The rows to keep, with their new id and imageset_id values
+        selections = []
+        new_ids = []
+        new_imageset_ids = []
+        identifiers = {}
         for i, exp in enumerate(exps):
-            sel = refs["id"] == i
-            sub_ref = refs.select(sel)
-            n_sub_ref = len(sub_ref)
+            sel = order[bounds[i] : bounds[i + 1]]
+            n_sub_ref = len(sel)
             if (
                 params.output.min_reflections_per_experiment is not None
                 and n_sub_ref < params.output.min_reflections_per_experiment
@@ -514,13 +537,12 @@ def combine_experiments(params, experiment_lists, reflection_tables):
                 continue
 
             nrefs_per_exp.append(n_sub_ref)
-            sub_ref["id"] = flex.int(len(sub_ref), global_id)
+            selections.append(sel)
+            new_ids.append(np.full(n_sub_ref, global_id))
 
             # now update identifiers if set.
             if i in ids_map:
-                sub_ref.experiment_identifiers()[global_id] = ids_map[i]
-            if params.output.delete_shoeboxes and "shoebox" in sub_ref:
-                del sub_ref["shoebox"]
+                identifiers[global_id] = ids_map[i]
 
             try:
                 experiments.append(combine(exp))
@@ -531,36 +553,71 @@ def combine_experiments(params, experiment_lists, reflection_tables):
                     f"Model didn't match reference within required tolerance for experiment {index} in input file {i}:"
                     f"\n{str(e)}\nAdjust tolerances or set compare_models=False to ignore differences."
                 )
+            imageset = experiments[-1].imageset
+            if imageset is not None:
+                imageset_index.setdefault(id(imageset), len(imageset_index))
 
             # Rewrite imageset_id, if the experiment has an imageset
-            if exp.imageset and "imageset_id" in sub_ref:
-                # Get the index of the imageset for this experiment and record how it changed
-                new_imageset_id = experiments.imagesets().index(
-                    experiments[-1].imageset
-                )
-                old_imageset_id = exps.imagesets().index(exp.imageset)
-                imageset_result_map[old_imageset_id] = new_imageset_id
-
-                # Check for invalid(?) imageset_id indices... and leave if they are wrong
-                if len(set(sub_ref["imageset_id"])) != 1:
-                    logger.warning(
-                        "Warning: Experiment %d reflections appear to have come from multiple imagesets - output may be incorrect",
-                        i,
-                    )
-                else:
-                    sub_ref["imageset_id"] = flex.int(len(sub_ref), new_imageset_id)
-
-            reflections.extend(sub_ref)
+            if has_imageset_id:
+                sub_imageset_ids = old_imageset_ids[sel]
+                if exp.imageset:
+                    # Get the index of the imageset for this experiment and record how it changed
+                    new_imageset_id = imageset_index[id(imageset)]
+                    old_imageset_id = old_imageset_index[id(exp.imageset)]
+                    imageset_result_map[old_imageset_id] = new_imageset_id
+
+                    # Check for invalid(?) imageset_id indices... and leave if they are wrong
+                    if (
+                        n_sub_ref == 0
+                        or (sub_imageset_ids != sub_imageset_ids[0]).any()
+                    ):
+                        logger.warning(
+                            "Warning: Experiment %d reflections appear to have come from multiple imagesets - output may be incorrect",
+                            i,
+                        )
+                    else:
+                        sub_imageset_ids = np.full(n_sub_ref, new_imageset_id)
+                new_imageset_ids.append(sub_imageset_ids)
 
             global_id += 1
 
         # Include unindexed reflections, if we can safely remap their imagesets
-        if "imageset_id" in reflections:
-            unindexed_refs = refs.select(refs["id"] == -1)
-            for old_id in set(unindexed_refs["imageset_id"]):
-                subs = unindexed_refs.select(unindexed_refs["imageset_id"] == old_id)
-                subs["imageset_id"] = flex.int(len(subs), imageset_result_map[old_id])
-                reflections.extend(subs)
+        if has_imageset_id and (selections or "imageset_id" in reflections):
+            unindexed = order[: bounds[0]]
+            unindexed = unindexed[ids[unindexed] == -1]
+            # Group these by imageset, in order of imageset_id
+            unindexed = unindexed[
+                np.argsort(old_imageset_ids[unindexed], kind="stable")
+            ]
+            old_ids, inverse = np.unique(
+                old_imageset_ids[unindexed], return_inverse=True
+            )
+            remapped = np.array(
+                [imageset_result_map[old_id] for old_id in old_ids.tolist()],
+                dtype=np.int64,
+            )[inverse]
+            selections.append(unindexed)
+            new_ids.append(np.full(len(unindexed), -1))
+            new_imageset_ids.append(remapped)
+
+        if not selections:
+            continue
+
+        # Select the reflections to keep from this input, all at once
+        sub_ref = refs.select(
+            flumpy.from_numpy(np.concatenate(selections).astype(np.uint64))
+        )
+        sub_ref["id"] = flumpy.from_numpy(np.concatenate(new_ids).astype(np.int32))
+        if has_imageset_id:
+            sub_ref["imageset_id"] = flumpy.from_numpy(
+                np.concatenate(new_imageset_ids).astype(np.int32)
+            )
+        for k, identifier in identifiers.items():
+            sub_ref.experiment_identifiers()[k] = identifier
+        if params.output.delete_shoeboxes and "shoebox" in sub_ref:
+            del sub_ref["shoebox"]
+
+        reflections.extend(sub_ref)
 
     # Finished building global lists
 
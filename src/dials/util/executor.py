@@ -0,0 +1,524 @@
+"""Distribute items between stateful workers.
+
+Each worker is created by a factory, called with the rank of the worker, and
+must provide process(item) and finalize() methods. Items are handed out in
+batches to workers as they become idle, so that the load is balanced
+dynamically, and items for which process(item) raises an exception are retried,
+possibly by a different worker. If a worker process exits unexpectedly, or a
+worker on an MPI rank raises an exception other than in process(item), its
+whole batch is retried, so some items may be processed more than once. A Sorry
+(or Abort) raised by process(item) is a user error rather than a failure of the
+item, so it is not retried and stops all processing. The available methods are:
+
+- serial: a single worker in the current process.
+- multiprocessing: a worker in each of nproc local processes.
+- mpi: a worker on each MPI rank. If there are more than two ranks, rank 0 hands
+  out the work and its worker only calls finalize().
+- futures: each batch is submitted to a concurrent.futures style executor, and
+  processed by a new worker which is finalized after the batch. To avoid
+  sending the factory with every batch, create the executor with
+  initializer=futures_initializer and initargs=(factory,), and pass None as the
+  factory to process_items.
+"""
+
+from __future__ import annotations
+
+import collections
+import concurrent.futures
+import logging
+import multiprocessing
+import os
+import queue
+import socket
+import time
+
+from libtbx.utils import Abort, Sorry
+
+import dials.util
+
+logger = logging.getLogger(__name__)
+
+# The MPI tag used for messages between the ranks, to keep them separate from
+# any other messages sent by the workers
+_MPI_TAG = 7419
+
+# Errors raised by a worker which stop all processing instead of failing an item
+_FATAL_ERRORS = (Sorry, Abort)
+
+
+class _FatalError:
+    """A message from a worker carrying one of _FATAL_ERRORS."""
+
+    def __init__(self, error):
+        self.error = error
+
+
+class WorkerStatistics:
+    """Throughput counters for a worker."""
+
+    def __init__(self, name):
+        self.name = name
+        self.n_batches = 0
+        self.n_items = 0
+        self.n_failed = 0
+        self.time = 0.0
+
+    def merge(self, other):
+        """Add the counters from another WorkerStatistics."""
+        self.n_batches += other.n_batches
+        self.n_items += other.n_items
+        self.n_failed += other.n_failed
+        self.time += other.time
+
+    @property
+    def throughput(self):
+        """The number of items processed per second."""
+        if not self.time:
+            return 0.0
+        return (self.n_items + self.n_failed) / self.time
+
+
+def log_statistics(statistics):
+    """Log a table of the throughput of each worker."""
+    rows = [
+        (
+            s.name,
+            s.n_batches,
+            s.n_items,
+            s.n_failed,
+            f"{s.time:.1f}",
+            f"{s.throughput:.2f}",
+        )
+        for s in statistics
+    ]
+    logger.info(
+        "Throughput per worker:\n%s",
+        dials.util.tabulate(
+            rows,
+            headers=("Worker", "Batches", "Processed", "Failed", "Time (s)", "Items/s"),
+        ),
+    )
+
+
+class _Worker:
+    """Wrap a worker to process batches and count the throughput."""
+
+    def __init__(self, factory, rank, name=None):
+        self._factory = factory
+        self._rank = rank
+        self._worker = None
+        self.statistics = WorkerStatistics(name or f"rank {rank}")
+
+    @property
+    def worker(self):
+        if self._worker is None:
+            self._worker = self._factory(self._rank)
+        return self._worker
+
+    def process_batch(self, batch):
+        """Process a batch of (index, item) pairs.
+
+        Returns:
+            A list of (index, error) pairs, where error is None if the item was
+            processed successfully, and a description of the exception otherwise.
+        """
+        worker = self.worker
+        start = time.perf_counter()
+        results = []
+        for index, item in batch:
+            try:
+                worker.process(item)
+            except _FATAL_ERRORS:
+                raise
+            except Exception as e:
+                logger.warning(
+                    "Error processing item %d on %s",
+                    index,
+                    self.statistics.name,
+                    exc_info=True,
+                )
+                results.append((index, f"{type(e).__name__}: {e}"))
+                self.statistics.n_failed += 1
+            else:
+                results.append((index, None))
+                self.statistics.n_items += 1
+        self.statistics.n_batches += 1
+        self.statistics.time += time.perf_counter() - start
+        return results
+
+    def finalize(self):
+        self.worker.finalize()
+
+
+class _Dispatcher:
+    """Hand out batches of items, and retry those which failed."""
+
+    def __init__(self, items, batch_size=1, max_retries=0):
+        self._items = list(items)
+        self._batch_size = batch_size
+        self._max_retries = max_retries
+        self._pending = collections.deque(range(len(self._items)))
+        self._attempts = [0] * len(self._items)
+        self._outstanding = 0
+        self.failed = {}
+
+    @property
+    def done(self):
+        """True once every item has been processed or has failed for good."""
+        return not self._pending and not self._outstanding
+
+    def next_batch(self):
+        """Return the next batch of (index, item) pairs, or None if none are pending."""
+        if not self._pending:
+            return None
+        batch = []
+        while self._pending and len(batch) < self._batch_size:
+            index = self._pending.popleft()
+            self._attempts[index] += 1
+            batch.append((index, self._items[index]))
+        self._outstanding += 1
+        return batch
+
+    def record(self, results):
+        """Record the (index, error) results of a batch from next_batch."""
+        self._outstanding -= 1
+        for index, error in results:
+            if error is None:
+                continue
+            if self._attempts[index] <= self._max_retries:
+                logger.info("Retrying item %d after error: %s", index, error)
+                self._pending.append(index)
+            else:
+                self.failed[index] = error
+
+    def abandon(self):
+        """Mark any pending items as failed, when there are no workers left."""
+        while self._pending:
+            self.failed[self._pending.popleft()] = "No workers remaining"
+
+    def failed_items(self):
+        return [
+            (self._items[index], error) for index, error in sorted(self.failed.items())
+        ]
+
+
+def _run_serial(dispatcher, worker):
+    while not dispatcher.done:
+        dispatcher.record(worker.process_batch(dispatcher.next_batch()))
+
+
+def _worker_loop(worker, send, receive):
+    """Process batches until told to stop, then send the statistics."""
+    # An empty result tells the distributor that this worker is ready
+    send([])
+    while (batch := receive()) is not None:
+        send(worker.process_batch(batch))
+    send(worker.statistics)
+
+
+# A message from a worker which exited unexpectedly
+_LOST = "lost"
+
+
+def _distribute(dispatcher, ranks, send, receive):
+    """Hand out batches to the workers of the given ranks as they become idle.
+
+    Args:
+        dispatcher (_Dispatcher): The items to process.
+        ranks: The ranks of the workers, each running _worker_loop.
+        send: A function send(rank, message) to send a message to a worker.
+        receive: A function returning the next (rank, message) from any worker.
+
+    Returns:
+        A list of the WorkerStatistics of each worker.
+    """
+    idle = []
+    busy = {}
+    statistics = {}
+    while len(statistics) < len(ranks):
+        rank, message = receive()
+        if isinstance(message, _FatalError):
+            raise message.error
+        if isinstance(message, WorkerStatistics):
+            statistics[rank] = message
+            continue
+        if message == _LOST:
+            logger.warning("Worker %s exited unexpectedly", rank)
+            statistics[rank] = WorkerStatistics(f"rank {rank} (exited)")
+            if rank in busy:
+                batch = busy.pop(rank)
+                dispatcher.record([(i, "Worker exited") for i, _ in batch])
+            if rank in idle:
+                idle.remove(rank)
+        else:
+            if rank in busy:
+                del busy[rank]
+                dispatcher.record(message)
+            idle.append(rank)
+
+        while idle:
+            batch = dispatcher.next_batch()
+            if batch is None:
+                break
+            busy[idle[-1]] = batch
+            send(idle.pop(), batch)
+        if dispatcher.done:
+            for rank in idle:
+                send(rank, None)
+            idle = []
+    if not dispatcher.done:
+        # Every worker exited before all the items were processed
+        dispatcher.abandon()
+    return [statistics[rank] for rank in ranks]
+
+
+def _multiprocessing_worker_main(factory, rank, tasks, results):
+    worker = _Worker(factory, rank)
+    try:
+        _worker_loop(worker, lambda message: results.put((rank, message)), tasks.get)
+    except _FATAL_ERRORS as e:
+        results.put((rank, _FatalError(e)))
+        return
+    worker.finalize()
+
+
+def _run_multiprocessing(dispatcher, factory, nproc):
+    # Fork where possible so that the worker factory need not be pickled
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+    else:
+        context = multiprocessing.get_context()
+    results = context.Queue()
+    tasks = [context.Queue() for _ in range(nproc)]
+    processes = [
+        context.Process(
+            target=_multiprocessing_worker_main,
+            args=(factory, rank, tasks[rank], results),
+        )
+        for rank in range(nproc)
+    ]
+    for process in processes:
+        process.start()
+
+    finished = set()
+
+    def receive():
+        while True:
+            try:
+                rank, message = results.get(timeout=1)
+            except queue.Empty:
+                for rank, process in enumerate(processes):
+                    if rank not in finished and process.exitcode is not None:
+                        finished.add(rank)
+                        return rank, _LOST
+            else:
+                if isinstance(message, WorkerStatistics):
+                    finished.add(rank)
+                return rank, message
+
+    try:
+        statistics = _distribute(
+            dispatcher,
+            list(range(nproc)),
+            lambda rank, message: tasks[rank].put(message),
+            receive,
+        )
+    except BaseException:
+        # Don't wait for the other workers to finish their batches
+        for process in processes:
+            process.terminate()
+        raise
+    finally:
+        for process in processes:
+            process.join()
+    for rank, process in enumerate(processes):
+        if process.exitcode:
+            logger.warning("Worker %d exited with code %d", rank, process.exitcode)
+    return statistics
+
+
+def _run_mpi(items, batch_size, max_retries, factory, comm):
+    from mpi4py import MPI
+
+    rank = comm.Get_rank()
+    size = comm.Get_size()
+    worker = _Worker(factory, rank)
+
+    if size <= 2:
+        # Distributing the work only makes sense for more than two ranks, so
+        # just split the items between the ranks
+        dispatcher = _Dispatcher(items[rank::size], batch_size, max_retries)
+        try:
+            _run_serial(dispatcher, worker)
+        except _FATAL_ERRORS as e:
+            # The other rank would wait for this one forever
+            logger.error("%s", e)
+            comm.Abort(1)
+        except Exception:
+            logger.error("Worker on rank %d failed", rank, exc_info=True)
+            comm.Abort(1)
+        gathered = comm.gather((worker.statistics, dispatcher.failed_items()), root=0)
+        worker.finalize()
+        if rank != 0:
+            return None, []
+        return (
+            [statistics for statistics, _ in gathered],
+            [failed for _, rank_failed in gathered for failed in rank_failed],
+        )
+
+    dispatcher = _Dispatcher(items, batch_size, max_retries)
+    if rank == 0:
+
+        def receive():
+            status = MPI.Status()
+            message = comm.recv(source=MPI.ANY_SOURCE, tag=_MPI_TAG, status=status)
+            return status.Get_source(), message
+
+        try:
+            statistics = _distribute(
+                dispatcher,
+                list(range(1, size)),
+                lambda dest, message: comm.send(message, dest=dest, tag=_MPI_TAG),
+                receive,
+            )
+        except _FATAL_ERRORS as e:
+            # The other ranks would wait for work forever
+            logger.error("%s", e)
+            comm.Abort(1)
+        except Exception:
+            logger.error("Failed to distribute the work", exc_info=True)
+            comm.Abort(1)
+    else:
+        try:
+            _worker_loop(
+                worker,
+                lambda message: comm.send(message, dest=0, tag=_MPI_TAG),
+                lambda: comm.recv(source=0, tag=_MPI_TAG),
+            )
+        except _FATAL_ERRORS as e:
+            # Rank 0 aborts the whole job
+            comm.send(_FatalError(e), dest=0, tag=_MPI_TAG)
+            raise
+        except Exception:
+            # For example, if the factory failed. Rank 0 would wait for this
+            # rank forever, so tell it to retry the batch with the other ranks.
+            # The worker is not finalized, as for a worker process which exited.
+            logger.error("Worker on rank %d failed", rank, exc_info=True)
+            comm.send(_LOST, dest=0, tag=_MPI_TAG)
+            return None, []
+    # Every rank finalizes only once all the messages above have been received,
+    # in case the workers communicate with each other when finalizing
+    worker.finalize()
+    if rank != 0:
+        return None, []
+    return statistics, dispatcher.failed_items()
+
+
+# The worker factory in each process of a futures executor, if set by
+# futures_initializer
+_futures_factory = None
+
+
+def futures_initializer(factory):
+    """Set the worker factory in a process of a futures executor, to be used
+    when process_items is given None as the factory."""
+    global _futures_factory
+    _futures_factory = factory
+
+
+def _process_batch_with_new_worker(factory, rank, batch):
+    if factory is None:
+        factory = _futures_factory
+    worker = _Worker(factory, rank, name=f"{socket.gethostname()}:{os.getpid()}")
+    results = worker.process_batch(batch)
+    worker.finalize()
+    return results, worker.statistics
+
+
+def _run_futures(dispatcher, factory, executor):
+    statistics = {}
+    futures = {}
+    n_submitted = 0
+    while not dispatcher.done:
+        while (batch := dispatcher.next_batch()) is not None:
+            future = executor.submit(
+                _process_batch_with_new_worker, factory, n_submitted, batch
+            )
+            futures[future] = batch
+            n_submitted += 1
+        done, _ = concurrent.futures.wait(
+            futures, return_when=concurrent.futures.FIRST_COMPLETED
+        )
+        for future in done:
+            batch = futures.pop(future)
+            try:
+                results, batch_statistics = future.result()
+            except _FATAL_ERRORS:
+                for future in futures:
+                    future.cancel()
+                raise
+            except Exception as e:
+                results = [(index, f"{type(e).__name__}: {e}") for index, _ in batch]
+            else:
+                # Accumulate the statistics for each worker process
+                statistics.setdefault(
+                    batch_statistics.name, WorkerStatistics(batch_statistics.name)
+                ).merge(batch_statistics)
+            dispatcher.record(results)
+    return list(statistics.values())
+
+
+def process_items(
+    factory,
+    items,
+    method="serial",
+    nproc=1,
+    batch_size=1,
+    max_retries=0,
+    comm=None,
+    executor=None,
+):
+    """Process items with workers created by factory.
+
+    Args:
+        factory: A callable taking the rank of a worker and returning an object
+            with process(item) and finalize() methods. For the futures method,
+            None to use the factory set by futures_initializer.
+        items: The items to process.
+        method (str): One of "serial", "multiprocessing", "mpi" or "futures".
+        nproc (int): The number of processes for the multiprocessing method.
+        batch_size (int): The number of items handed to a worker at a time.
+        max_retries (int): The number of times to retry an item which failed.
+        comm: The MPI communicator for the mpi method.
+        executor: The concurrent.futures.Executor for the futures method.
+
+    Returns:
+        A list of (item, error) for the items which could not be processed. For
+        the mpi method, this is only returned on rank 0.
+    """
+    if method == "mpi":
+        statistics, failed = _run_mpi(
+            list(items), batch_size, max_retries, factory, comm
+        )
+    else:
+        dispatcher = _Dispatcher(items, batch_size=batch_size, max_retries=max_retries)
+    if method == "serial":
+        worker = _Worker(factory, 0)
+        _run_serial(dispatcher, worker)
+        worker.finalize()
+        statistics = [worker.statistics]
+        failed = dispatcher.failed_items()
+    elif method == "multiprocessing":
+        statistics = _run_multiprocessing(dispatcher, factory, nproc)
+        failed = dispatcher.failed_items()
+    elif method == "futures":
+        statistics = _run_futures(dispatcher, factory, executor)
+        failed = dispatcher.failed_items()
+    elif method != "mpi":
+        raise ValueError(f"Unknown method: {method}")
+
+    if statistics is not None:
+        log_statistics(statistics)
+        for item, error in failed:
+            logger.warning("Failed to process %s: %s", item, error)
+    return failed
@@ -1,10 +1,7 @@
 from __future__ import annotations
 
-import bz2
 import datetime
-import gzip
 import logging
-import lzma
 import math
 import time
 
@@ -18,6 +15,7 @@
 
 import dials.util.version
 from dials.algorithms.symmetry import median_unit_cell
+from dials.util import open_for_writing
 from dials.util.filter_reflections import filter_reflection_table
 
 logger = logging.getLogger(__name__)
@@ -73,15 +71,7 @@ def write(self, experiments, reflections):
             "." + self.params.mmcif.compress
         ):
             filename += "." + self.params.mmcif.compress
-        if self.params.mmcif.compress == "gz":
-            open_fn = gzip.open
-        elif self.params.mmcif.compress == "bz2":
-            open_fn = bz2.open
-        elif self.params.mmcif.compress == "xz":
-            open_fn = lzma.open
-        else:
-            open_fn = open
-        with open_fn(filename, "wt") as fh:
+        with open_for_writing(filename, self.params.mmcif.compress) as fh:
             self._cif.show(out=fh, loop_format_strings=loop_format_strings)
 
         # Log
@@ -5,8 +5,12 @@
 import os
 import re
 
+import numpy as np
+
+from dxtbx import flumpy
 from scitbx import matrix
 
+from dials.util import matrix_arrays, open_for_writing
 from dials.util.filter_reflections import filter_reflection_table
 
 logger = logging.getLogger(__name__)
@@ -47,13 +51,20 @@ def export_sadabs(integrated_data, experiment_list, params):
     assert experiment.scan is not None
 
     # sort data before output
-    nref = len(integrated_data["miller_index"])
-    indices = flex.size_t_range(nref)
-    perm = sorted(indices, key=lambda k: integrated_data["miller_index"][k])
-    integrated_data = integrated_data.select(flex.size_t(perm))
+    h, k, l = (
+        flumpy.to_numpy(c)
+        for c in integrated_data["miller_index"].as_vec3_double().parts()
+    )
+    perm = np.lexsort((l, k, h))
+    integrated_data = integrated_data.select(flumpy.from_numpy(perm.astype(np.uint64)))
 
     assert experiment.goniometer is not None
 
+    hklout = params.sadabs.hklout
+    compress = params.sadabs.compress
+    if compress and not hklout.endswith("." + compress):
+        hklout += "." + compress
+
     # Warn of unhelpful SADABS behaviour for certain multi-sequence data sets
     hkl_file_root, _ = os.path.splitext(params.sadabs.hklout)
     if not params.sadabs.run or re.search("_0+$", hkl_file_root):
@@ -160,59 +171,84 @@ def export_sadabs(integrated_data, experiment_list, params):
     else:
         static = False
 
-    with open(params.sadabs.hklout, "w") as fout:
-        for j in range(nref):
-            h, k, l = miller_index[j]
-
-            if params.sadabs.predict:
-                x_mm, y_mm, z_rad = integrated_data["xyzcal.mm"][j]
-            else:
-                x_mm, y_mm, z_rad = integrated_data["xyzobs.mm.value"][j]
-
-            z0 = integrated_data["xyzcal.px"][j][2]
-            istol = int(round(10000 * unit_cell.stol((h, k, l))))
-
-            if params.sadabs.predict or static:
-                # work from a scan static model & assume perfect goniometer
-                # FIXME maybe should work back in the option to predict spot positions
-                UB = matrix.sqr(experiment.crystal.get_A())
-                phi = phi_start + z0 * phi_range
-                R = axis.axis_and_angle_as_r3_rotation_matrix(phi, deg=True)
-                RUB = S * R * F * UB
-            else:
-                # properly compute RUB for every reflection
-                UB = matrix.sqr(experiment.crystal.get_A_at_scan_point(int(round(z0))))
-                phi = phi_start + z0 * phi_range
-                R = axis.axis_and_angle_as_r3_rotation_matrix(phi, deg=True)
-                RUB = S * R * F * UB
-
-            x = RUB * (h, k, l)
-            s = (s0 + x).normalize()
-
-            # can also compute s based on centre of mass of spot
-            # s = (origin + x_mm * fast_axis + y_mm * slow_axis).normalize()
-
-            astar = (RUB * (1, 0, 0)).normalize()
-            bstar = (RUB * (0, 1, 0)).normalize()
-            cstar = (RUB * (0, 0, 1)).normalize()
-
-            ix = beam.dot(astar)
-            iy = beam.dot(bstar)
-            iz = beam.dot(cstar)
-
-            dx = s.dot(astar)
-            dy = s.dot(bstar)
-            dz = s.dot(cstar)
-
-            x = x_mm * scl_x
-            y = y_mm * scl_y
-            z = (z_rad * 180 / math.pi - phi_start) / phi_range
-
-            fout.write(
-                "%4d%4d%4d%8.2f%8.2f%4d%8.5f%8.5f%8.5f%8.5f%8.5f%8.5f"
-                % (h, k, l, I[j], sigI[j], params.sadabs.run, ix, dx, iy, dy, iz, dz)
-            )
-            fout.write("%7.2f%7.2f%8.2f%7.2f%5d\n" % (x, y, z, detector2t, istol))
-
-    fout.close()
-    logger.info("Output %d reflections to %s", nref, params.sadabs.hklout)
+    # compute the geometry for all reflections at once
+    if params.sadabs.predict:
+        x_mm, y_mm, z_rad = integrated_data["xyzcal.mm"].parts()
+    else:
+        x_mm, y_mm, z_rad = integrated_data["xyzobs.mm.value"].parts()
+    x_mm, y_mm, z_rad = (flumpy.to_numpy(c) for c in (x_mm, y_mm, z_rad))
+
+    hkl = flumpy.to_numpy(miller_index.as_vec3_double()).astype(np.int64)
+    h, k, l = hkl.T
+    z0 = flumpy.to_numpy(integrated_data["xyzcal.px"].parts()[2])
+    istol = np.rint(10000 * flumpy.to_numpy(unit_cell.stol(miller_index))).astype(
+        np.int64
+    )
+
+    phi = phi_start + z0 * phi_range
+    R = matrix_arrays.axis_and_angle_as_r3_rotation_matrix(axis, phi, deg=True)
+    if params.sadabs.predict or static:
+        # work from a scan static model & assume perfect goniometer
+        # FIXME maybe should work back in the option to predict spot positions
+        UB = matrix.sqr(experiment.crystal.get_A())
+    else:
+        # properly compute RUB for every reflection
+        scan_points, i_scan_point = np.unique(
+            np.rint(z0).astype(np.int64), return_inverse=True
+        )
+        UB = np.array(
+            [experiment.crystal.get_A_at_scan_point(int(i)) for i in scan_points]
+        ).reshape(-1, 9)[i_scan_point.ravel()]
+    RUB = matrix_arrays.multiply(
+        matrix_arrays.multiply(matrix_arrays.multiply(S, R), F), UB
+    )
+
+    x = matrix_arrays.multiply_column(RUB, hkl)
+    s = matrix_arrays.normalize(s0.elems + x)
+
+    # can also compute s based on centre of mass of spot
+    # s = (origin + x_mm * fast_axis + y_mm * slow_axis).normalize()
+
+    astar = matrix_arrays.normalize(matrix_arrays.multiply_column(RUB, (1, 0, 0)))
+    bstar = matrix_arrays.normalize(matrix_arrays.multiply_column(RUB, (0, 1, 0)))
+    cstar = matrix_arrays.normalize(matrix_arrays.multiply_column(RUB, (0, 0, 1)))
+
+    ix = matrix_arrays.dot(beam, astar)
+    iy = matrix_arrays.dot(beam, bstar)
+    iz = matrix_arrays.dot(beam, cstar)
+
+    dx = matrix_arrays.dot(s, astar)
+    dy = matrix_arrays.dot(s, bstar)
+    dz = matrix_arrays.dot(s, cstar)
+
+    x = x_mm * scl_x
+    y = y_mm * scl_y
+    z = (z_rad * 180 / math.pi - phi_start) / phi_range
+
+    with open_for_writing(hklout, compress) as fout:
+        matrix_arrays.write_records(
+            fout,
+            "%4d%4d%4d%8.2f%8.2f%4d%8.5f%8.5f%8.5f%8.5f%8.5f%8.5f"
+            "%7.2f%7.2f%8.2f%7.2f%5d\n",
+            (
+                h,
+                k,
+                l,
+                flumpy.to_numpy(I),
+                flumpy.to_numpy(sigI),
+                np.full(nref, params.sadabs.run),
+                ix,
+                dx,
+                iy,
+                dy,
+                iz,
+                dz,
+                x,
+                y,
+                z,
+                np.full(nref, detector2t),
+                istol,
+            ),
+        )
+
+    logger.info("Output %d reflections to %s", nref, hklout)
@@ -4,14 +4,17 @@
 import logging
 import os
 
+import numpy as np
+
 import dxtbx.model  # noqa: F401
 import libtbx.phil  # noqa: F401
 from cctbx.miller import map_to_asu
+from dxtbx import flumpy
 from rstbx.cftbx.coordinate_frame_helpers import align_reference_frame
 from scitbx import matrix
 
 from dials.array_family import flex
-from dials.util import Sorry
+from dials.util import Sorry, matrix_arrays, open_for_writing
 from dials.util.filter_reflections import (
     FilteringReductionMethods,
     filter_reflection_table,
@@ -57,6 +60,10 @@ def _export_experiment(
         params: The PHIL configuration object
         var_model:
     """
+    compress = params.xds_ascii.compress
+    if compress and not filename.endswith("." + compress):
+        filename += "." + compress
+
     # export for xds_ascii should only be for non-scaled reflections
     assert any(
         i in integrated_data for i in ["intensity.sum.value", "intensity.prf.value"]
@@ -85,15 +92,15 @@ def _export_experiment(
     ) = FilteringReductionMethods.calculate_lp_qe_correction_and_filter(integrated_data)
 
     # sort data before output
-    nref = len(integrated_data["miller_index"])
-    indices = flex.size_t_range(nref)
-
     unique = copy.deepcopy(integrated_data["miller_index"])
 
     map_to_asu(experiment.crystal.get_space_group().type(), False, unique)
 
-    perm = sorted(indices, key=lambda k: unique[k])
-    integrated_data = integrated_data.select(flex.size_t(perm))
+    # a stable sort on (h, k, l), equivalent to sorting the indices by the
+    # Miller index tuples
+    h, k, l = (flumpy.to_numpy(c) for c in unique.as_vec3_double().parts())
+    perm = np.lexsort((l, k, h))
+    integrated_data = integrated_data.select(flumpy.from_numpy(perm.astype(np.uint64)))
 
     if experiment.goniometer is None:
         print("Warning: No goniometer. Experimentally exporting with (1 0 0) axis")
@@ -124,7 +131,7 @@ def _export_experiment(
     if "partiality" in integrated_data:
         partiality = 100 * integrated_data["partiality"]
     else:
-        prof_corr = flex.double(nref, 100.0)
+        partiality = flex.double(nref, 100.0)
 
     if "intensity.sum.value" in integrated_data:
         I = integrated_data["intensity.sum.value"]
@@ -139,7 +146,7 @@ def _export_experiment(
         V = var_model[0] * (V + var_model[1] * I * I)
         sigI = flex.sqrt(V)
 
-    fout = open(filename, "w")
+    fout = open_for_writing(filename, compress)
 
     # first write the header - in the "standard" coordinate frame...
 
@@ -227,52 +234,54 @@ def _export_experiment(
         )
     )
 
-    # then write the data records
+    # then write the data records, with the geometry calculated for all
+    # reflections at once
 
     s0 = Rd * matrix.col(experiment.beam.get_s0())
 
-    for j in range(nref):
-        x, y, z = integrated_data["xyzcal.px"][j]
-        phi = phi_start + z * phi_range
-        h, k, l = miller_index[j]
-        X = (UB * (h, k, l)).rotate(axis, phi, deg=True)
-        s = s0 + X
-        g = s.cross(s0).normalize()
-
-        # find component of beam perpendicular to f, e
-        e = -(s + s0).normalize()
-        if h == k and k == l:
-            u = (h, -h, 0)
-        else:
-            u = (k - l, l - h, h - k)
-        q = (
-            (matrix.col(u).transpose() * UB.inverse())
-            .normalize()
-            .transpose()
-            .rotate(axis, phi, deg=True)
-        )
+    x, y, z = (flumpy.to_numpy(c) for c in integrated_data["xyzcal.px"].parts())
+    phi = phi_start + z * phi_range
+    hkl = flumpy.to_numpy(miller_index.as_vec3_double()).astype(np.int64)
+    h, k, l = hkl.T
+    X = matrix_arrays.rotate_around_origin(
+        matrix_arrays.multiply_column(UB, hkl), axis, phi, deg=True
+    )
+    s = s0.elems + X
+    g = matrix_arrays.normalize(matrix_arrays.cross(s, s0))
+
+    # find component of beam perpendicular to f, e
+    e = -matrix_arrays.normalize(s + s0.elems)
+    u = np.column_stack((k - l, l - h, h - k))
+    hkl_equal = (h == k) & (k == l)
+    u[hkl_equal] = np.column_stack((h, -h, np.zeros_like(h)))[hkl_equal]
+    q = matrix_arrays.rotate_around_origin(
+        matrix_arrays.normalize(matrix_arrays.multiply_row(u, UB.inverse())),
+        axis,
+        phi,
+        deg=True,
+    )
 
-        psi = q.angle(g, deg=True)
-        if q.dot(e) < 0:
-            psi *= -1
-
-        fout.write(
-            "%d %d %d %f %f %f %f %f %f %.1f %.1f %f\n"
-            % (
-                h,
-                k,
-                l,
-                I[j],
-                sigI[j],
-                x,
-                y,
-                z,
-                scl[j],
-                partiality[j],
-                prof_corr[j],
-                psi,
-            )
-        )
+    psi = matrix_arrays.angle(q, g, deg=True)
+    psi = np.where(matrix_arrays.dot(q, e) < 0, -psi, psi)
+
+    matrix_arrays.write_records(
+        fout,
+        "%d %d %d %f %f %f %f %f %f %.1f %.1f %f\n",
+        (
+            h,
+            k,
+            l,
+            flumpy.to_numpy(I),
+            flumpy.to_numpy(sigI),
+            x,
+            y,
+            z,
+            flumpy.to_numpy(scl),
+            flumpy.to_numpy(partiality),
+            flumpy.to_numpy(prof_corr),
+            psi,
+        ),
+    )
 
     fout.write("!END_OF_DATA\n")
     fout.close()
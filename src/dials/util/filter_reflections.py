@@ -44,10 +44,12 @@
 from __future__ import annotations
 
 import logging
-from collections import defaultdict
 from typing import Any
 
+import numpy as np
+
 from cctbx import crystal, miller
+from dxtbx import flumpy
 
 from dials.algorithms.scaling.outlier_rejection import reject_outliers
 from dials.array_family import flex
@@ -413,15 +415,21 @@ def combine_and_filter_partials(
                 dataset_ids = set(reflection_table["id"])
                 n_datasets = len(dataset_ids)
                 if n_datasets > 1:
-                    total_reflection_table = flex.reflection_table()
-                    for id_ in dataset_ids:
-                        single_table = reflection_table.select(
-                            reflection_table["id"] == id_
-                        )
-                        total_reflection_table.extend(
-                            sum_partial_reflections(single_table)
-                        )
-                    reflection_table = total_reflection_table
+                    reflection_table = sum_partial_reflections(
+                        reflection_table, by_dataset=True
+                    )
+                    # Order the datasets as if they had been summed separately
+                    position = {id_: i for i, id_ in enumerate(dataset_ids)}
+                    unique_ids, index = np.unique(
+                        flumpy.to_numpy(reflection_table["id"]), return_inverse=True
+                    )
+                    dataset_position = np.array(
+                        [position[id_] for id_ in unique_ids.tolist()]
+                    )[index]
+                    order = np.argsort(dataset_position, kind="stable")
+                    reflection_table = reflection_table.select(
+                        flumpy.from_numpy(order.astype(np.uint64))
+                    )
                 else:
                     reflection_table = sum_partial_reflections(reflection_table)
                 reflection_table["fractioncalc"] = reflection_table["partiality"]
@@ -795,12 +803,14 @@ def apply_scaling_factors(reflection_table):
         return reflection_table
 
 
-def sum_partial_reflections(reflection_table):
+def sum_partial_reflections(reflection_table, by_dataset=False):
     """Sum partial reflections if more than one recording of a reflection present.
 
     This is a weighted sum for summation integration; weighted average for
     profile fitted reflections. N.B. this will report total partiality for
     the summed reflection.
+
+    If by_dataset is True, only partials with the same id are summed together.
     """
 
     if ("partiality" not in reflection_table) or ("partial_id" not in reflection_table):
@@ -820,72 +830,67 @@ def sum_partial_reflections(reflection_table):
         sel = sel & (reflection_table["intensity." + intensity + ".variance"] > 0)
     isel = sel.iselection()
 
-    # create map of partial_id to reflections
-    delete = flex.size_t()
-    partial_map = defaultdict(list)
-    for j in isel:
-        partial_map[reflection_table["partial_id"][j]].append(j)
-
-    # now work through this map - get total partiality for every reflection;
-    # here only consider reflections with > 1 component;
-    partial_ids = []
-    for p_id in partial_map:
-        if len(partial_map[p_id]) > 1:
-            partial_ids.append(p_id)
-
-    header = ["Partial id", "Partiality"]
-    for i in intensities:
-        header.extend([str(i) + " intensity", str(i) + " variance"])
-    rows = []
-
-    # Now loop through 'matched' partials, summing and then deleting before return
-    for p_id in partial_ids:
-        j = partial_map[p_id]
-        for i in j:
-            data = [str(p_id), str(reflection_table["partiality"][i])]
-            for intensity in intensities:
-                data.extend(
-                    [
-                        str(reflection_table["intensity." + intensity + ".value"][i]),
-                        str(
-                            reflection_table["intensity." + intensity + ".variance"][i]
-                        ),
-                    ]
-                )
-            rows.append(data)
-
-        # do the summing of the partiality values separately to allow looping
-        # over multiple times
-        total_partiality = sum(reflection_table["partiality"][i] for i in j)
-        if "prf" in intensities:
-            reflection_table = _sum_prf_partials(reflection_table, j)
-        if "sum" in intensities:
-            reflection_table = _sum_sum_partials(reflection_table, j)
-        if "scale" in intensities:
-            reflection_table = _sum_scale_partials(reflection_table, j)
-        # FIXME now that the partials have been summed, should fractioncalc be set
-        # to one (except for summation case?)
-        reflection_table["partiality"][j[0]] = total_partiality
-        delete.extend(flex.size_t(j[1:]))
-        data = ["combined " + str(p_id), str(total_partiality)]
+    # group the reflections by partial_id, and only consider groups with > 1
+    # component
+    keys = ["id", "partial_id"] if by_dataset else ["partial_id"]
+    groups = reflection_table.group_by(keys, selection=isel)
+    groups = groups.select(groups.sizes > 1)
+
+    # Keep the input values for the summary table
+    debug = logger.getEffectiveLevel() <= logging.DEBUG
+    if debug:
+        columns = ["partiality"]
         for intensity in intensities:
-            data.extend(
-                [
-                    str(reflection_table["intensity." + intensity + ".value"][j[0]]),
-                    str(reflection_table["intensity." + intensity + ".variance"][j[0]]),
-                ]
+            columns.extend(
+                [f"intensity.{intensity}.value", f"intensity.{intensity}.variance"]
             )
-        rows.append(data)
-    reflection_table.del_selected(delete)
+        before = {column: reflection_table[column].deep_copy() for column in columns}
+
+    # Sum all groups at once, setting the results in the first reflection of
+    # each group, then delete the other reflections
+    if "prf" in intensities:
+        reflection_table = _sum_prf_partials_in_groups(reflection_table, groups)
+    if "sum" in intensities:
+        reflection_table = _sum_sum_partials_in_groups(reflection_table, groups)
+    if "scale" in intensities:
+        reflection_table = _sum_scale_partials_in_groups(reflection_table, groups)
+    # FIXME now that the partials have been summed, should fractioncalc be set
+    # to one (except for summation case?)
+    _set_in_first_of_groups(
+        reflection_table,
+        "partiality",
+        groups,
+        groups.sum(flumpy.to_numpy(reflection_table["partiality"])),
+    )
+
+    # Formatting this table can be sloooow for large numbers of reflections, so skip
+    # this unless debug output has been requested
+    if debug:
+        header = ["Partial id", "Partiality"]
+        for i in intensities:
+            header.extend([str(i) + " intensity", str(i) + " variance"])
+        rows = []
+        partial_id = reflection_table["partial_id"]
+        # In order of the first reflection of each group
+        for g in np.argsort(groups.first, kind="stable"):
+            start = groups.starts[g]
+            j = groups.rows[start : start + groups.sizes[g]].tolist()
+            p_id = partial_id[j[0]]
+            for i in j:
+                rows.append([str(p_id)] + [str(before[c][i]) for c in columns])
+            rows.append(
+                ["combined " + str(p_id)]
+                + [str(reflection_table[c][j[0]]) for c in columns]
+            )
+
+    reflection_table.del_selected(flumpy.from_numpy(groups.others.astype(np.uint64)))
     if nrefl > reflection_table.size():
         logger.info(
             "Combined %s partial reflections with other partial reflections",
             nrefl - reflection_table.size(),
         )
 
-    # Formatting this table can be sloooow for large numbers of reflections, so skip
-    # this unless debug output has been requested
-    if logger.getEffectiveLevel() <= logging.DEBUG:
+    if debug:
         logger.debug("\nSummary of combination of partial reflections")
         logger.debug(tabulate(rows, header))
     return reflection_table
@@ -895,59 +900,86 @@ def sum_partial_reflections(reflection_table):
 # weighting by (I/sig(I))^2 not just 1/variance for prf. See tests?
 
 
-def _sum_prf_partials(reflection_table, partials_isel_for_pid):
-    """Sum prf partials and set the updated value in the first entry."""
-    j = partials_isel_for_pid
-    value = reflection_table["intensity.prf.value"][j[0]]
-    variance = reflection_table["intensity.prf.variance"][j[0]]
-    weight = value * value / variance
-    value *= weight
-    variance *= weight
-    total_weight = weight
-    for i in j[1:]:
-        _value = reflection_table["intensity.prf.value"][i]
-        _variance = reflection_table["intensity.prf.variance"][i]
-        _weight = _value * _value / _variance
-        value += _weight * _value
-        variance += _weight * _variance
-        total_weight += _weight
-    # now write these back into original reflection
-    if total_weight:
-        reflection_table["intensity.prf.value"][j[0]] = value / total_weight
-        reflection_table["intensity.prf.variance"][j[0]] = variance / total_weight
-    else:
-        variance = sum(reflection_table["intensity.prf.variance"][_j] for _j in j)
-        reflection_table["intensity.prf.value"][j[0]] = 0
-        reflection_table["intensity.prf.variance"][j[0]] = variance
+def _set_in_first_of_groups(reflection_table, column, groups, values):
+    """Set values of a column in the first reflection of each group."""
+    reflection_table[column].set_selected(
+        flumpy.from_numpy(groups.first.astype(np.uint64)),
+        flumpy.from_numpy(np.ascontiguousarray(values, dtype=np.float64)),
+    )
+
+
+def _single_group(partials_isel_for_pid):
+    """Group containing just the given reflections, in the given order."""
+    rows = np.asarray(partials_isel_for_pid, dtype=np.int64)
+    return flex.reflection_table_groups(rows, [np.zeros(len(rows), dtype=np.int64)])
+
+
+def _sum_prf_partials_in_groups(reflection_table, groups):
+    """Sum prf partials in each group and set the updated value in the first entry."""
+    value = flumpy.to_numpy(reflection_table["intensity.prf.value"])
+    variance = flumpy.to_numpy(reflection_table["intensity.prf.variance"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weight = value * value / variance
+    mean_value, total_weight = groups.weighted_mean(value, weight)
+    mean_variance, _ = groups.weighted_mean(variance, weight)
+    no_weight = total_weight == 0
+    mean_value[no_weight] = 0
+    mean_variance[no_weight] = groups.sum(variance)[no_weight]
+    # now write these back into original reflections
+    _set_in_first_of_groups(reflection_table, "intensity.prf.value", groups, mean_value)
+    _set_in_first_of_groups(
+        reflection_table, "intensity.prf.variance", groups, mean_variance
+    )
     return reflection_table
 
 
-def _sum_sum_partials(reflection_table, partials_isel_for_pid):
-    """Sum sum partials and set the updated value in the first entry."""
-    j = partials_isel_for_pid
-    value = reflection_table["intensity.sum.value"][j[0]]
-    variance = reflection_table["intensity.sum.variance"][j[0]]
-    for i in j[1:]:
-        value += reflection_table["intensity.sum.value"][i]
-        variance += reflection_table["intensity.sum.variance"][i]
-    reflection_table["intensity.sum.value"][j[0]] = value
-    reflection_table["intensity.sum.variance"][j[0]] = variance
+def _sum_sum_partials_in_groups(reflection_table, groups):
+    """Sum sum partials in each group and set the updated value in the first entry."""
+    value = groups.sum(flumpy.to_numpy(reflection_table["intensity.sum.value"]))
+    variance = groups.sum(flumpy.to_numpy(reflection_table["intensity.sum.variance"]))
+    _set_in_first_of_groups(reflection_table, "intensity.sum.value", groups, value)
+    _set_in_first_of_groups(
+        reflection_table, "intensity.sum.variance", groups, variance
+    )
     return reflection_table
 
 
-def _sum_scale_partials(reflection_table, partials_isel_for_pid):
-    """Sum scale partials and set the updated value in the first entry."""
+def _sum_scale_partials_in_groups(reflection_table, groups):
+    """Sum scale partials in each group and set the updated value in the first
+    entry."""
     # Weight scaled intensity partials by 1/variance. See
     # https://en.wikipedia.org/wiki/Weighted_arithmetic_mean, section
     # 'Dealing with variance'
-    j = partials_isel_for_pid
-    variance = reflection_table["intensity.scale.variance"][j[0]]
-    value = reflection_table["intensity.scale.value"][j[0]] / variance
-    total_weight = 1.0 / variance
-    for i in j[1:]:
-        _variance = reflection_table["intensity.scale.variance"][i]
-        value += reflection_table["intensity.scale.value"][i] / _variance
-        total_weight += 1.0 / _variance
-    reflection_table["intensity.scale.value"][j[0]] = value / total_weight
-    reflection_table["intensity.scale.variance"][j[0]] = 1.0 / total_weight
+    value = flumpy.to_numpy(reflection_table["intensity.scale.value"])
+    variance = flumpy.to_numpy(reflection_table["intensity.scale.variance"])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        weighted_value = groups.sum(value / variance)
+        total_weight = groups.sum(1.0 / variance)
+    _set_in_first_of_groups(
+        reflection_table, "intensity.scale.value", groups, weighted_value / total_weight
+    )
+    _set_in_first_of_groups(
+        reflection_table, "intensity.scale.variance", groups, 1.0 / total_weight
+    )
     return reflection_table
+
+
+def _sum_prf_partials(reflection_table, partials_isel_for_pid):
+    """Sum prf partials and set the updated value in the first entry."""
+    return _sum_prf_partials_in_groups(
+        reflection_table, _single_group(partials_isel_for_pid)
+    )
+
+
+def _sum_sum_partials(reflection_table, partials_isel_for_pid):
+    """Sum sum partials and set the updated value in the first entry."""
+    return _sum_sum_partials_in_groups(
+        reflection_table, _single_group(partials_isel_for_pid)
+    )
+
+
+def _sum_scale_partials(reflection_table, partials_isel_for_pid):
+    """Sum scale partials and set the updated value in the first entry."""
+    return _sum_scale_partials_in_groups(
+        reflection_table, _single_group(partials_isel_for_pid)
+    )
@@ -1,14 +1,21 @@
 from __future__ import annotations
 
 import copy
+import hashlib
+import json
 import logging
 import math
+import os
 import sys
+import tempfile
 import time
-from collections import namedtuple
+from collections import OrderedDict, namedtuple
+
+import numpy as np
 
 import libtbx.phil
 from cctbx import crystal
+from dxtbx import flumpy
 from dxtbx.masking import (
     mask_untrusted_circle,
     mask_untrusted_polygon,
@@ -18,6 +25,7 @@
 from iotbx.phil import parse
 
 from dials.array_family import flex
+from dials.util import Sorry
 from dials.util.ext import ResolutionMaskGenerator
 
 logger = logging.getLogger(__name__)
@@ -106,14 +114,17 @@
 CacheInfo = namedtuple("CacheInfo", ["hits", "misses", "maxsize", "currsize"])
 
 
-def lru_equality_cache(maxsize=10):
+def lru_equality_cache(maxsize=10, key=None):
     """LRU cache that compares keys based on equality... inefficiently.
 
     Used for dxtbx models that don't have unique id values so can't be
-    cached with a normal lru_cache.
+    cached with a normal lru_cache. If a key function is given, the cache
+    instead looks up the hashable value it returns for the arguments.
 
     Args:
         maxsize (int): The maximum number of old results to remember
+        key: A function of the arguments returning a hashable value that is
+            equal for arguments that should share a result
     """
 
     def _decorator(f):
@@ -121,11 +132,23 @@ class Scope:
             pass
 
         cache_data = Scope()
-        cache_data.cache = []
+        cache_data.cache = [] if key is None else OrderedDict()
         cache_data.hits = 0
         cache_data.misses = 0
 
         def _wrapper_function(*args, **kwargs):
+            if key is not None:
+                k = key(*args, **kwargs)
+                if k in cache_data.cache:
+                    cache_data.cache.move_to_end(k)
+                    cache_data.hits += 1
+                    return cache_data.cache[k]
+                result = f(*args, **kwargs)
+                cache_data.misses += 1
+                cache_data.cache[k] = result
+                if len(cache_data.cache) > maxsize:
+                    cache_data.cache.popitem(last=False)
+                return result
             for i, (key_args, key_kwargs, key_result) in enumerate(cache_data.cache):
                 if key_args == args and key_kwargs == kwargs:
                     cache_data.cache.append(cache_data.cache.pop(i))
@@ -154,6 +177,133 @@ def _generate_cache_info():
     return _decorator
 
 
+def _model_dict(model):
+    return None if model is None else model.to_dict()
+
+
+def _hash_models(**models):
+    """A hash of the serialised form of dxtbx models, which is equal for models
+    with identical content."""
+    serialised = json.dumps(
+        {name: _model_dict(model) for name, model in models.items()}, sort_keys=True
+    )
+    return hashlib.sha256(serialised.encode()).hexdigest()
+
+
+def _mask_key(detector, beam, params):
+    """A hash of everything that determines the result of generate_mask."""
+    return hashlib.sha256(
+        (
+            _hash_models(detector=detector, beam=beam)
+            + phil_scope.format(python_object=params).as_str()
+        ).encode()
+    ).hexdigest()
+
+
+class MaskCache:
+    """A directory of generated masks, named by the hash of the models and
+    parameters they were generated from. The least recently used masks are
+    removed to keep the total size of the directory within a limit.
+
+    The cache is used by generate_mask if the environment variable
+    DIALS_MASK_CACHE is set to a directory. DIALS_MASK_CACHE_SIZE sets the
+    maximum size in MB (default 1024). The masks are stored as numpy .npz
+    files, which are read without unpickling, as the directory may be shared.
+    """
+
+    def __init__(self, directory, max_size=1024 * 1024**2):
+        self.directory = directory
+        self.max_size = max_size
+
+    @classmethod
+    def from_environment(cls):
+        """The cache configured by environment variables, or None."""
+        directory = os.getenv("DIALS_MASK_CACHE")
+        if not directory:
+            return None
+        size = os.getenv("DIALS_MASK_CACHE_SIZE")
+        try:
+            max_size = float(size or 1024) * 1024**2
+        except ValueError:
+            raise Sorry(f"DIALS_MASK_CACHE_SIZE must be a size in MB, not {size!r}")
+        return cls(directory, max_size=max_size)
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.npz")
+
+    def get(self, key):
+        """Return the masks stored with a key, or None if there are none."""
+        path = self._path(key)
+        try:
+            with np.load(path, allow_pickle=False) as data:
+                masks = tuple(
+                    flumpy.from_numpy(data[f"arr_{i}"]) for i in range(len(data.files))
+                )
+            # record the use for least-recently-used eviction
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.debug(f"Ignoring unreadable cached mask {path}: {e}")
+            return None
+        logger.debug(f"Read cached mask {path}")
+        return masks
+
+    def put(self, key, masks):
+        """Store masks with a key, then evict old masks if over the size limit.
+
+        Failure to write to the cache is logged, rather than raised, as the
+        masks can always be generated again."""
+        tmp_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                dir=self.directory, suffix=".tmp", delete=False
+            ) as fh:
+                tmp_path = fh.name
+                np.savez(fh, *(flumpy.to_numpy(mask) for mask in masks))
+            os.replace(tmp_path, self._path(key))
+            tmp_path = None
+            self._evict()
+        except OSError as e:
+            logger.warning(f"Unable to cache mask in {self.directory}: {e}")
+        finally:
+            if tmp_path is not None:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+
+    # Temporary files older than this (in seconds) are left over from writes
+    # which were interrupted, rather than still being written
+    _orphan_age = 3600
+
+    def _evict(self):
+        entries = []
+        now = time.time()
+        for entry in os.scandir(self.directory):
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(".npz"):
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+            elif entry.name.endswith(".tmp") and now - stat.st_mtime > self._orphan_age:
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    pass
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
 def generate_ice_ring_resolution_ranges(beam, panel, params):
     """
     Generate a set of resolution ranges from the ice ring parameters
@@ -187,7 +337,9 @@ def generate_ice_ring_resolution_ranges(beam, panel, params):
             yield (d_min, d_max)
 
 
-@lru_equality_cache(maxsize=3)
+@lru_equality_cache(
+    maxsize=3, key=lambda beam, panel: _hash_models(beam=beam, panel=panel)
+)
 def _get_resolution_masker(beam, panel):
     t0 = time.perf_counter()
     masker = ResolutionMaskGenerator(beam, panel)
@@ -221,6 +373,27 @@ def generate_mask(
                 f"d_min = {params.d_min} > d_max = {params.d_max}: no spots will be found"
             )
 
+    # Untrusted regions without a panel number are on the first panel
+    for region in params.untrusted:
+        if region.panel is None:
+            region.panel = 0
+
+    cache = MaskCache.from_environment()
+    if cache is not None:
+        key = _mask_key(detector, beam, params)
+        masks = cache.get(key)
+        if masks is not None:
+            return masks
+
+    masks = _generate_mask(detector, beam, params)
+
+    if cache is not None:
+        cache.put(key, masks)
+    return masks
+
+
+def _generate_mask(detector, beam, params):
+    """Generate the mask for each panel of a detector."""
     # Create the mask for each panel
     masks = []
     for index, panel in enumerate(detector):
@@ -240,8 +413,6 @@ def generate_mask(
 
         # Apply the untrusted regions
         for region in params.untrusted:
-            if region.panel is None:
-                region.panel = 0
             if region.panel == index:
                 if not any(
                     [region.circle, region.rectangle, region.polygon, region.pixel]
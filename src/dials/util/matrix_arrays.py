@@ -0,0 +1,181 @@
+"""
+Arithmetic on arrays of 3-vectors and 3x3 matrices.
+
+Vectors are numpy arrays of shape (n, 3) and matrices arrays of shape (n, 9),
+with elements in row-major order as scitbx.matrix.sqr.elems. Constant vectors
+and matrices may be given as scitbx.matrix objects or sequences instead.
+
+The functions follow the order of the floating point operations in
+scitbx.matrix, and use the math module for trigonometric functions, so that
+the results are bit-identical to performing the same calculations element by
+element with scitbx.matrix. This allows loops over reflections to be replaced
+without changing their output.
+"""
+
+from __future__ import annotations
+
+import math
+
+import numpy as np
+
+
+def _elems(a):
+    """The elements of a vector or matrix, as an array whose last axis
+    indexes the elements."""
+    return np.asarray(getattr(a, "elems", a), dtype=np.float64)
+
+
+def _apply(func, values):
+    """Apply a function from the math module to each of an array of values."""
+    values = np.asarray(values, dtype=np.float64)
+    return np.fromiter(map(func, values.ravel().tolist()), np.float64).reshape(
+        values.shape
+    )
+
+
+def dot(a, b):
+    """The scalar products of vectors, as scitbx.matrix.rec.dot."""
+    a, b = _elems(a), _elems(b)
+    return 0.0 + a[..., 0] * b[..., 0] + a[..., 1] * b[..., 1] + a[..., 2] * b[..., 2]
+
+
+def cross(a, b):
+    """The vector products of vectors, as scitbx.matrix.rec.cross."""
+    a, b = _elems(a), _elems(b)
+    a, b = np.broadcast_arrays(a, b)
+    return np.stack(
+        (
+            a[..., 1] * b[..., 2] - b[..., 1] * a[..., 2],
+            a[..., 2] * b[..., 0] - b[..., 2] * a[..., 0],
+            a[..., 0] * b[..., 1] - b[..., 0] * a[..., 1],
+        ),
+        axis=-1,
+    )
+
+
+def normalize(a):
+    """The unit vectors in the directions of vectors, as
+    scitbx.matrix.rec.normalize."""
+    a = _elems(a)
+    return a / np.sqrt(dot(a, a))[..., None]
+
+
+def multiply(a, b):
+    """The products of matrices, as scitbx.matrix.sqr * scitbx.matrix.sqr."""
+    a, b = _elems(a), _elems(b)
+    return np.stack(
+        [
+            0.0
+            + a[..., 3 * i] * b[..., k]
+            + a[..., 3 * i + 1] * b[..., 3 + k]
+            + a[..., 3 * i + 2] * b[..., 6 + k]
+            for i in range(3)
+            for k in range(3)
+        ],
+        axis=-1,
+    )
+
+
+def multiply_column(m, v):
+    """The products of matrices with column vectors, as scitbx.matrix.sqr * col."""
+    m, v = _elems(m), _elems(v)
+    return np.stack(
+        [
+            0.0
+            + m[..., 3 * i] * v[..., 0]
+            + m[..., 3 * i + 1] * v[..., 1]
+            + m[..., 3 * i + 2] * v[..., 2]
+            for i in range(3)
+        ],
+        axis=-1,
+    )
+
+
+def multiply_row(v, m):
+    """The products of row vectors with matrices, as scitbx.matrix.row * sqr."""
+    v, m = _elems(v), _elems(m)
+    return np.stack(
+        [
+            0.0
+            + v[..., 0] * m[..., k]
+            + v[..., 1] * m[..., 3 + k]
+            + v[..., 2] * m[..., 6 + k]
+            for k in range(3)
+        ],
+        axis=-1,
+    )
+
+
+def rotate_around_origin(x, axis, angle, deg=False):
+    """Rotate vectors around an axis by angles, as
+    scitbx.matrix.rec.rotate_around_origin."""
+    x = _elems(x)
+    angle = np.asarray(angle, dtype=np.float64)
+    if deg:
+        angle = angle * (math.pi / 180)
+    n = normalize(axis)
+    c, s = _apply(math.cos, angle), _apply(math.sin, angle)
+    return (
+        x * c[..., None]
+        + n * dot(n, x)[..., None] * (1.0 - c)[..., None]
+        + cross(n, x) * s[..., None]
+    )
+
+
+def axis_and_angle_as_r3_rotation_matrix(axis, angle, deg=False):
+    """The matrices of rotations around an axis by angles, as
+    scitbx.matrix.col.axis_and_angle_as_r3_rotation_matrix."""
+    angle = np.asarray(angle, dtype=np.float64)
+    if deg:
+        angle = angle * (math.pi / 180)
+    h = angle * 0.5
+    c, s = _apply(math.cos, h), _apply(math.sin, h)
+    u, v, w = normalize(axis).T
+    q0, q1, q2, q3 = c, u * s, v * s, w * s
+    q0q0, q0q1, q0q2, q0q3 = q0 * q0, q0 * q1, q0 * q2, q0 * q3
+    q1q1, q1q2, q1q3 = q1 * q1, q1 * q2, q1 * q3
+    q2q2, q2q3 = q2 * q2, q2 * q3
+    q3q3 = q3 * q3
+    return np.stack(
+        (
+            2 * (q0q0 + q1q1) - 1,
+            2 * (q1q2 - q0q3),
+            2 * (q1q3 + q0q2),
+            2 * (q1q2 + q0q3),
+            2 * (q0q0 + q2q2) - 1,
+            2 * (q2q3 - q0q1),
+            2 * (q1q3 - q0q2),
+            2 * (q2q3 + q0q1),
+            2 * (q0q0 + q3q3) - 1,
+        ),
+        axis=-1,
+    )
+
+
+def angle(a, b, deg=False):
+    """The angles between vectors, as scitbx.matrix.rec.angle. The angle is
+    NaN where it is undefined."""
+    a, b = _elems(a), _elems(b)
+    d = dot(a, a) * dot(b, b)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        c = np.clip(dot(a, b) / np.sqrt(d), -1, 1)
+    c[~(d > 0)] = np.nan
+    result = _apply(math.acos, c) if c.size else c
+    if deg:
+        result = result * (180 / math.pi)
+    return result
+
+
+def write_records(fout, fmt, columns, chunk_size=100000):
+    """Write rows formatted with the % operator, in chunks.
+
+    Args:
+        fout: The text file to write to
+        fmt: The format string for a row
+        columns: Arrays of the values of each item in the rows
+        chunk_size: The number of rows to format at once
+    """
+    nrows = len(columns[0]) if columns else 0
+    for start in range(0, nrows, chunk_size):
+        chunk = [np.asarray(c)[start : start + chunk_size].tolist() for c in columns]
+        fout.write("".join([fmt % row for row in zip(*chunk)]))
@@ -1,12 +1,59 @@
 from __future__ import annotations
 
+import contextlib
 import itertools
 import logging
+import os
+import tempfile
 
 import libtbx.easy_mp
 
 logger = logging.getLogger(__name__)
 
+# The data shared by all tasks run in a worker process, set by initialise_worker
+worker_data = {}
+
+
+class _ReflectionsFile:
+    """A reflection table written to a file, to be read by a worker process."""
+
+    def __init__(self, filename):
+        self.filename = filename
+
+    def load(self):
+        from dials.array_family import flex
+
+        return flex.reflection_table.from_file(self.filename)
+
+
+@contextlib.contextmanager
+def shared_reflections(reflections):
+    """
+    Write a reflection table to a temporary file for the lifetime of the context.
+
+    Passing the result to initialise_worker, rather than the table itself, has
+    each worker process read the reflections from the file once, instead of
+    the table being pickled and sent to every worker.
+    """
+    with tempfile.TemporaryDirectory() as tmpdir:
+        filename = os.path.join(tmpdir, "reflections.refl")
+        reflections.as_file(filename)
+        yield _ReflectionsFile(filename)
+
+
+def initialise_worker(data):
+    """
+    A process pool initializer storing data for all the tasks run in a worker.
+
+    The values of data are stored in worker_data under the same keys, with any
+    reflections from shared_reflections read from their file.
+    """
+    worker_data.clear()
+    for key, value in data.items():
+        if isinstance(value, _ReflectionsFile):
+            value = value.load()
+        worker_data[key] = value
+
 
 class __cluster_function_wrapper:
     """
@@ -156,6 +156,72 @@ class InvalidPhilError(ValueError):
 )
 
 
+reflections_load_phil_scope = libtbx.phil.parse(
+    """
+  reflections_load
+    .help = "Restrict the reflection data loaded from the input files. Rows and"
+            "columns that are not needed are never decoded where the file format"
+            "allows it."
+    .expert_level = 2
+  {
+    columns = None
+      .type = strings
+      .help = "Only load these reflection table columns (default: all columns)"
+    flags = None
+      .type = strings
+      .help = "Only load reflections with all of these flags set, e.g. indexed"
+    experiment_ids = None
+      .type = ints
+      .help = "Only load reflections with these experiment ids"
+    d_min = None
+      .type = float(value_min=0)
+      .help = "Only load reflections with d >= d_min"
+    d_max = None
+      .type = float(value_min=0)
+      .help = "Only load reflections with d <= d_max"
+  }
+"""
+)
+
+
+def reflection_load_options(params):
+    """
+    Convert the reflections_load phil parameters to loading options.
+
+    :param params: The extracted reflections_load scope
+    :returns: A tuple of the columns to load and the row filter (either may be None)
+    """
+    flags = 0
+    for name in params.flags or []:
+        if name not in flex.reflection_table.flags.names:
+            raise Sorry(f"Unknown reflection table flag in reflections_load: {name}")
+        flags |= flex.reflection_table.flags.names[name]
+    row_filter = None
+    if (
+        flags
+        or params.experiment_ids is not None
+        or params.d_min is not None
+        or params.d_max is not None
+    ):
+        row_filter = flex.reflection_table_row_filter(
+            flags=flags,
+            ids=params.experiment_ids,
+            d_min=params.d_min,
+            d_max=params.d_max,
+        )
+    return params.columns, row_filter
+
+
+def _check_reflection_columns(filename, reflections, columns, row_filter):
+    """Raise a Sorry if reflections lack a column needed by the loading options."""
+    needed = list(row_filter.columns) if row_filter is not None else []
+    for column in needed + list(columns or []):
+        if column not in reflections:
+            raise Sorry(
+                f"Column {column} needed by reflections_load is missing from {filename}"
+            )
+
+
 class Importer:
     """A class to import the command line arguments."""
 
@@ -173,6 +239,8 @@ def __init__(
         scan_tolerance=None,
         format_kwargs=None,
         load_models=True,
+        reflection_columns=None,
+        reflection_filter=None,
     ):
         """
         Parse the arguments. Populates its instance attributes in an intelligent way
@@ -193,6 +261,9 @@ def __init__(
         :param check_format: Check the format when reading images
         :param verbose: True/False print out some stuff
         :param load_models: Whether to load all models for ExperimentLists
+        :param reflection_columns: If set, only load these reflection table columns
+        :param reflection_filter: If set, a flex.reflection_table_row_filter
+                                  selecting the reflection table rows to load
         """
 
         # Initialise output
@@ -223,7 +294,9 @@ def __init__(
 
         # Third try to read reflection files
         if read_reflections:
-            self.unhandled = self.try_read_reflections(self.unhandled, verbose)
+            self.unhandled = self.try_read_reflections(
+                self.unhandled, verbose, reflection_columns, reflection_filter
+            )
 
     def _handle_converter_error(self, argument, exception, type, validation=False):
         "Record information about errors that occurred processing an argument"
@@ -334,11 +407,13 @@ def try_read_experiments(self, args, check_format, verbose):
                 unhandled.append(argument)
         return unhandled
 
-    def try_read_reflections(self, args, verbose):
+    def try_read_reflections(self, args, verbose, columns=None, row_filter=None):
         """Try to import reflections.
 
         :param args: The input arguments
         :param verbose: Print verbose output
+        :param columns: If set, only load these columns
+        :param row_filter: If set, only load the rows selected by this filter
         :returns: Unhandled arguments
         """
         unhandled = []
@@ -349,7 +424,9 @@ def try_read_reflections(self, args, verbose):
                 self.reflections.append(
                     FilenameDataWrapper(
                         filename=argument,
-                        data=flex.reflection_table.from_file(argument),
+                        data=flex.reflection_table.from_file(
+                            argument, columns=columns, row_filter=row_filter
+                        ),
                     )
                 )
             except pickle.UnpicklingError:
@@ -360,6 +437,12 @@ def try_read_reflections(self, args, verbose):
                     validation=True,
                 )
                 unhandled.append(argument)
+            except KeyError as e:
+                if columns is not None or row_filter is not None:
+                    # A column needed by the reflections_load options is missing
+                    e = Sorry(f"Unable to apply reflections_load: {e.args[0]}")
+                self._handle_converter_error(argument, e, type="Reflections")
+                unhandled.append(argument)
             except Exception as e:
                 self._handle_converter_error(argument, e, type="Reflections")
                 unhandled.append(argument)
@@ -554,6 +637,29 @@ def _is_a_phil_file(filename):
         except AttributeError:
             load_models = True
 
+        if self._read_reflections:
+            reflection_columns, reflection_filter = reflection_load_options(
+                params.input.reflections_load
+            )
+            # Reflections given explicitly as input.reflections= have already been
+            # read in full by the phil converter, so restrict them here instead
+            if reflection_columns is not None or reflection_filter is not None:
+                for obj in params.input.reflections:
+                    _check_reflection_columns(
+                        obj.filename, obj.data, reflection_columns, reflection_filter
+                    )
+                params.input.reflections = [
+                    FilenameDataWrapper(
+                        filename=obj.filename,
+                        data=obj.data.restrict(
+                            columns=reflection_columns, row_filter=reflection_filter
+                        ),
+                    )
+                    for obj in params.input.reflections
+                ]
+        else:
+            reflection_columns, reflection_filter = None, None
+
         # Try to import everything
         importer = Importer(
             unhandled,
@@ -568,6 +674,8 @@ def _is_a_phil_file(filename):
             scan_tolerance=scan_tolerance,
             format_kwargs=format_kwargs,
             load_models=load_models,
+            reflection_columns=reflection_columns,
+            reflection_filter=reflection_filter,
         )
 
         # Grab a copy of the errors that occurred in case the caller wants them
@@ -632,6 +740,7 @@ def _generate_input_scope(self):
       """
             )
             main_scope.adopt_scope(phil_scope)
+            main_scope.adopt_scope(reflections_load_phil_scope)
 
         # Return the input scope
         return input_phil_scope
@@ -0,0 +1,33 @@
+/*
+ * scoped_gil_release.h
+ *
+ *  This code is distributed under the BSD license, a copy of which is
+ *  included in the root directory of this package.
+ */
+#ifndef DIALS_UTIL_SCOPED_GIL_RELEASE_H
+#define DIALS_UTIL_SCOPED_GIL_RELEASE_H
+
+#include <Python.h>
+
+namespace dials { namespace util {
+
+  /**
+   * Release the GIL for the lifetime of the object. Only use this around code
+   * which works on C++ memory and does not touch any Python objects, so that it
+   * can run concurrently in multiple Python threads.
+   */
+  class ScopedGILRelease {
+  public:
+    ScopedGILRelease() : state_(PyEval_SaveThread()) {}
+
+    ~ScopedGILRelease() {
+      PyEval_RestoreThread(state_);
+    }
+
+  private:
+    PyThreadState *state_;
+  };
+
+}}  // namespace dials::util
+
+#endif  // DIALS_UTIL_SCOPED_GIL_RELEASE_H
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 
 import h5py
 import hdf5plugin
@@ -157,17 +157,21 @@ def encode_columns(
                 group.create_dataset(
                     key, data=this_data, shape=this_data.shape, dtype=this_data.dtype
                 )
-            # Create references to the data in the NXReflections group
-            ref_dtype = h5py.special_dtype(ref=h5py.RegionReference)
-            if key in dials_to_nx_names:
-                nx_group[dials_to_nx_names[key]] = group[key]  # a reference
-            elif key in dials_to_nx_names_split:
-                for i, name in enumerate(dials_to_nx_names_split[key]):
-                    nx_group.create_dataset(name, (1,), dtype=ref_dtype)
-                    nx_group[name][0] = group[key].regionref[:, i]  # a region reference
-                    # note, use region references to get the slice back as follows:
-                    # e.g. h_ref = nx_group["h"][0] # contains a reference to the data array and region
-                    # h = file_handle[h_ref][h_ref] # first index gets the array, second index the slice
+            ReflectionListEncoder.link_nx_column(group, nx_group, key)
+
+    @staticmethod
+    def link_nx_column(group: h5py.Group, nx_group: h5py.Group, key: str) -> None:
+        """Create references to the data in the NXReflections group."""
+        ref_dtype = h5py.special_dtype(ref=h5py.RegionReference)
+        if key in dials_to_nx_names:
+            nx_group[dials_to_nx_names[key]] = group[key]  # a reference
+        elif key in dials_to_nx_names_split:
+            for i, name in enumerate(dials_to_nx_names_split[key]):
+                nx_group.create_dataset(name, (1,), dtype=ref_dtype)
+                nx_group[name][0] = group[key].regionref[:, i]  # a region reference
+                # note, use region references to get the slice back as follows:
+                # e.g. h_ref = nx_group["h"][0] # contains a reference to the data array and region
+                # h = file_handle[h_ref][h_ref] # first index gets the array, second index the slice
 
     @staticmethod
     def encode_shoebox(group: h5py.Group, data: flex.shoebox, key: str):
@@ -233,54 +237,117 @@ def decode(handle: h5py.File) -> List[flex.reflection_table]:
         # Create the list of reflection tables
         tables = []
         for dataset in g.values():
-            table = flex.reflection_table([])
+            table = ReflectionListDecoder.decode_rows(dataset)
             identifiers = dataset.attrs["identifiers"]
             experiment_ids = dataset.attrs["experiment_ids"]
             for n, v in zip(experiment_ids, identifiers):
                 table.experiment_identifiers()[n] = v
-
-            for key in dataset:
-                if isinstance(dataset[key], h5py.Group):
-                    # Decode all the shoebox data
-                    shoebox_arrays: Dict[str, flumpy.FlexArray] = {}
-                    names = [
-                        "shoebox_data",
-                        "shoebox_background",
-                        "shoebox_mask",
-                        "panel",
-                        "bbox",
-                    ]
-                    for k in dataset[key].keys():
-                        if k in names[:-1]:
-                            shoebox_arrays[k] = flumpy.from_numpy(dataset[key][k][()])
-                        elif k == "bbox":
-                            shoebox_arrays[k] = flex.int6(
-                                flumpy.from_numpy(dataset[key][k][()].flatten())
-                            )
-                        else:
-                            raise RuntimeError(
-                                f"Unrecognised elements {k} in {dataset[key]}"
-                            )
-                    if all(n in shoebox_arrays.keys() for n in names):
-                        table[key] = flex.shoebox(
-                            shoebox_arrays["panel"],
-                            shoebox_arrays["bbox"],
-                            allocate=True,
-                        )
-                        dials_array_family_flex_ext.ShoeboxExtractFromData(
-                            table[key],
-                            shoebox_arrays["shoebox_data"],
-                            shoebox_arrays["shoebox_background"],
-                            shoebox_arrays["shoebox_mask"],
-                        )
-                else:
-                    table[key] = ReflectionListDecoder.convert_array(dataset[key])
-
             tables.append(table)
 
         # Return the list of reflection tables (as stored on disk)
         return tables
 
+    @staticmethod
+    def decode_batches(handle: h5py.File) -> Iterator[flex.reflection_table]:
+        """
+        Decode the data to reflection tables, one batch at a time.
+
+        Tables written with HDF5TableStreamWriter are yielded in the batches in
+        which they were appended, other tables are yielded whole. Only the
+        experiment identifiers for the ids present in each batch are set.
+        """
+
+        validate_format(handle)  # raises ValueError if not conforming to expected spec.
+
+        g = handle["dials"]
+        g = g[list(g.keys())[-1]]
+
+        for dataset in g.values():
+            identifiers = dict(
+                zip(dataset.attrs["experiment_ids"], dataset.attrs["identifiers"])
+            )
+            if "batch_offsets" in dataset.attrs:
+                offsets = [int(i) for i in dataset.attrs["batch_offsets"]]
+            else:
+                offsets = [None, None]
+            shoebox_starts: Dict[str, int] = {}
+            for start, end in zip(offsets[:-1], offsets[1:]):
+                table = ReflectionListDecoder.decode_rows(
+                    dataset, slice(start, end), shoebox_starts
+                )
+                if "id" in table:
+                    ids = set(flumpy.to_numpy(table["id"]).tolist())
+                else:
+                    ids = identifiers.keys()
+                for n in ids:
+                    if n in identifiers:
+                        table.experiment_identifiers()[n] = identifiers[n]
+                yield table
+
+    @staticmethod
+    def decode_rows(
+        dataset: h5py.Group,
+        rows: slice = slice(None),
+        shoebox_starts: Optional[Dict[str, int]] = None,
+    ) -> flex.reflection_table:
+        """
+        Decode the columns of a group to a reflection table, for a slice of rows.
+
+        Shoebox pixel data are stored contiguously, so to decode consecutive
+        slices the position reached in each shoebox column is tracked in
+        shoebox_starts.
+        """
+        if shoebox_starts is None:
+            shoebox_starts = {}
+        table = flex.reflection_table([])
+        for key in dataset:
+            if isinstance(dataset[key], h5py.Group):
+                # Decode all the shoebox data
+                shoebox_arrays: Dict[str, flumpy.FlexArray] = {}
+                names = [
+                    "shoebox_data",
+                    "shoebox_background",
+                    "shoebox_mask",
+                    "panel",
+                    "bbox",
+                ]
+                for k in dataset[key].keys():
+                    if k not in names:
+                        raise RuntimeError(
+                            f"Unrecognised elements {k} in {dataset[key]}"
+                        )
+                if not all(n in dataset[key] for n in names):
+                    continue
+                bbox = dataset[key]["bbox"][rows]
+                start = shoebox_starts.get(key, 0)
+                end = start + int(
+                    np.sum(
+                        (bbox[:, 1] - bbox[:, 0])
+                        * (bbox[:, 3] - bbox[:, 2])
+                        * (bbox[:, 5] - bbox[:, 4])
+                    )
+                )
+                shoebox_starts[key] = end
+                pixels = slice(start, end) if rows != slice(None) else slice(None)
+                for k in names[:3]:
+                    shoebox_arrays[k] = flumpy.from_numpy(dataset[key][k][pixels])
+                shoebox_arrays["panel"] = flumpy.from_numpy(dataset[key]["panel"][rows])
+                shoebox_arrays["bbox"] = flex.int6(flumpy.from_numpy(bbox.flatten()))
+                table[key] = flex.shoebox(
+                    shoebox_arrays["panel"],
+                    shoebox_arrays["bbox"],
+                    allocate=True,
+                )
+                dials_array_family_flex_ext.ShoeboxExtractFromData(
+                    table[key],
+                    shoebox_arrays["shoebox_data"],
+                    shoebox_arrays["shoebox_background"],
+                    shoebox_arrays["shoebox_mask"],
+                )
+            else:
+                table[key] = ReflectionListDecoder.convert_array(dataset[key][rows])
+        return table
+
     @staticmethod
     def convert_array(data: np.array) -> flumpy.FlexArray:
         # Must allow that the data were written by a program outside of DIALS, so no special
@@ -320,6 +387,132 @@ def convert_array(data: np.array) -> flumpy.FlexArray:
         return new
 
 
+class HDF5TableStreamWriter:
+    """
+    Write reflection tables to a single chunked, compressed table on disk, one
+    batch at a time.
+
+    Each column is stored in a resizable dataset that grows as batches are
+    appended, so that arbitrarily many batches can be written at constant
+    memory. The batch boundaries and experiment identifiers are written when the
+    writer is closed, after which the file can be read like any other DIALS
+    HDF5 reflection file, or batch by batch with HDF5TableFile.iter_batches.
+
+    All appended tables must have the same columns, with experiment ids that
+    are unique across the whole file.
+    """
+
+    def __init__(
+        self,
+        filename: str,
+        chunk_size: int = 65536,
+        second_level_name: str = "processing",
+    ) -> None:
+        """
+        Create the file.
+
+        Args:
+            filename: The output filename
+            chunk_size: The number of rows in each HDF5 chunk
+            second_level_name: The name of the processing group
+        """
+        # Use the latest file format, as the identifiers attribute can exceed
+        # the 64kB limit on attribute size of the original format
+        self._handle = h5py.File(filename, "w", libver="latest")
+        self._chunk_size = chunk_size
+        self._compression = hdf5plugin.LZ4()
+        top_group = self._handle.create_group("dials", track_order=True)
+        self._group = top_group.create_group(
+            second_level_name, track_order=True
+        ).create_group("group_0")
+        nx_reflections = self._handle.create_group("nx_reflections", track_order=True)
+        self._nx_group = nx_reflections.create_group("group_0")
+        self._nx_group.attrs["NX_class"] = "NXreflections"
+        self._columns: Optional[Dict[str, str]] = None
+        self._identifiers: Dict[int, str] = {}
+        self._batch_offsets = [0]
+
+    def close(self) -> None:
+        """Write the table metadata and close the file."""
+        if self._columns is None:
+            self._columns = {}
+        self._group.attrs["identifiers"] = list(self._identifiers.values())
+        self._group.attrs["experiment_ids"] = np.array(
+            list(self._identifiers.keys()), dtype=np.uint64
+        )
+        self._group.attrs["batch_offsets"] = np.array(
+            self._batch_offsets, dtype=np.uint64
+        )
+        for key in self._columns:
+            ReflectionListEncoder.link_nx_column(self._group, self._nx_group, key)
+        self._handle.close()
+        del self._handle
+
+    def __enter__(self) -> HDF5TableStreamWriter:
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+    def append(self, table: flex.reflection_table) -> None:
+        """Append a batch of reflections to the table on disk."""
+        for n, identifier in table.experiment_identifiers():
+            if self._identifiers.setdefault(n, identifier) != identifier:
+                raise ValueError(
+                    f"Experiment id {n} is already used for identifier {self._identifiers[n]}"
+                )
+        columns = {key: type(data).__name__ for key, data in table.cols()}
+        if self._columns is None:
+            self._columns = columns
+        elif columns != self._columns:
+            raise ValueError(
+                "Unable to append a table with different columns: "
+                f"{sorted(columns)} != {sorted(self._columns)}"
+            )
+        for key, data in table.cols():
+            if isinstance(data, flex.shoebox):
+                sbdata, bg, mask = data.get_shoebox_data_arrays()
+                bbox = data.bounding_boxes()
+                arrays = {
+                    f"{key}/shoebox_data": flumpy.to_numpy(sbdata),
+                    f"{key}/shoebox_background": flumpy.to_numpy(bg),
+                    f"{key}/shoebox_mask": flumpy.to_numpy(mask),
+                    f"{key}/bbox": flumpy.to_numpy(bbox.as_int()).reshape(
+                        bbox.size(), 6
+                    ),
+                    f"{key}/panel": flumpy.to_numpy(data.panels()),
+                }
+            elif isinstance(data, flex.int6):
+                arrays = {key: flumpy.to_numpy(data.as_int()).reshape(data.size(), 6)}
+            elif isinstance(data, flex.std_string):
+                arrays = {
+                    key: np.array(
+                        [s.encode("utf-8") for s in data],
+                        dtype=h5py.string_dtype(encoding="utf-8"),
+                    )
+                }
+            else:
+                arrays = {key: flumpy.to_numpy(data)}
+            for name, array in arrays.items():
+                self._append_array(name, array)
+        self._batch_offsets.append(self._batch_offsets[-1] + table.size())
+
+    def _append_array(self, name: str, array: np.ndarray) -> None:
+        if name not in self._group:
+            self._group.create_dataset(
+                name,
+                shape=(0,) + array.shape[1:],
+                maxshape=(None,) + array.shape[1:],
+                chunks=(self._chunk_size,) + array.shape[1:],
+                dtype=array.dtype,
+                compression=self._compression,
+            )
+        dataset = self._group[name]
+        n = dataset.shape[0]
+        dataset.resize(n + array.shape[0], axis=0)
+        dataset[n:] = array
+
+
 class HDF5TableFile:
     """
     Interface to on-disk representation of reflection data in hdf5 format.
@@ -359,6 +552,15 @@ def add_tables(self, reflections: List[flex.reflection_table]) -> None:
         """
         self.set_data(reflections, ReflectionListEncoder())
 
+    def iter_batches(self) -> Iterator[flex.reflection_table]:
+        """
+        Iterate over the reflection data, one batch at a time.
+
+        For tables written with HDF5TableStreamWriter, this yields the batches
+        as they were appended, without reading the whole table into memory.
+        """
+        return ReflectionListDecoder.decode_batches(self._handle)
+
     def get_tables(self) -> List[flex.reflection_table]:
         """
         Get the reflection data.
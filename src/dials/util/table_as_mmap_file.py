@@ -0,0 +1,423 @@
+"""
+A column-oriented, memory-mappable on-disk representation of reflection tables.
+
+The file consists of a short fixed preamble, a JSON column directory and a data
+section in which every column (or column component) is stored as a raw,
+64-byte aligned buffer. Opening a file only reads the preamble and directory;
+the file is memory mapped and individual columns are only decoded when they are
+first accessed, so programs that touch a handful of columns of a large table do
+not pay the cost of reading and decoding the rest.
+
+Layout::
+
+    MAGIC (8 bytes) | version (<u4) | directory size (<u8) | directory (JSON)
+    | padding | column buffers (each aligned to ALIGNMENT bytes)
+
+Buffer offsets in the directory are relative to the start of the data section.
+
+Buffers may optionally be compressed, in which case each is split into blocks
+of BLOCK_SIZE bytes that are compressed independently. Compressed columns can no
+longer be read in place, but are still only decoded on first access, and the
+blocks are compressed and decompressed in parallel with a thread pool (zlib
+releases the GIL while it works).
+"""
+
+from __future__ import annotations
+
+import json
+import mmap
+import struct
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from dxtbx import flumpy
+
+import dials_array_family_flex_ext
+from dials.array_family import flex
+
+MAGIC = b"DIALSMAP"
+VERSION = 1
+ALIGNMENT = 64
+BLOCK_SIZE = 1 << 22
+
+# Supported compression codecs, as (compress, decompress) functions
+_codecs = {
+    "zlib": (lambda data: zlib.compress(data, 1), zlib.decompress),
+}
+
+_preamble = struct.Struct("<8sIQ")
+
+# Column types which round-trip directly through flumpy.to_numpy/from_numpy
+_simple_types = {
+    "bool",
+    "double",
+    "float",
+    "int",
+    "int8",
+    "int16",
+    "int32",
+    "int64",
+    "size_t",
+    "uint8",
+    "uint16",
+    "uint32",
+    "uint64",
+}
+
+
+# Column types whose buffers are not stored one element per row
+_unsliceable_types = {"std_string", "shoebox"}
+
+
+def _aligned(offset: int) -> int:
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def is_mmap_table_file(filename) -> bool:
+    """Check whether a file starts with the memory-mapped table magic bytes."""
+    try:
+        with open(filename, "rb") as fh:
+            return fh.read(len(MAGIC)) == MAGIC
+    except (OSError, TypeError):
+        return False
+
+
+class _ColumnEncoder:
+    """Convert flex columns to lists of named numpy buffers."""
+
+    @staticmethod
+    def encode(data) -> Dict[str, np.ndarray]:
+        type_name = type(data).__name__
+        if type_name in _simple_types or type_name in (
+            "vec2_double",
+            "vec3_double",
+            "miller_index",
+            "mat3_double",
+        ):
+            return {"data": flumpy.to_numpy(data)}
+        elif isinstance(data, flex.int6):
+            return {"data": flumpy.to_numpy(data.as_int()).reshape(data.size(), 6)}
+        elif isinstance(data, flex.std_string):
+            encoded = [s.encode("utf-8") for s in data]
+            offsets = np.zeros(len(encoded) + 1, dtype=np.uint64)
+            offsets[1:] = np.cumsum([len(s) for s in encoded], dtype=np.uint64)
+            return {
+                "offsets": offsets,
+                "data": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+            }
+        elif isinstance(data, flex.shoebox):
+            sbdata, bg, mask = data.get_shoebox_data_arrays()
+            bbox = data.bounding_boxes()
+            return {
+                "shoebox_data": flumpy.to_numpy(sbdata),
+                "shoebox_background": flumpy.to_numpy(bg),
+                "shoebox_mask": flumpy.to_numpy(mask),
+                "panel": flumpy.to_numpy(data.panels()),
+                "bbox": flumpy.to_numpy(bbox.as_int()).reshape(bbox.size(), 6),
+            }
+        raise TypeError(f"Unable to encode column of type {type_name}")
+
+
+class _ColumnDecoder:
+    """Convert named numpy buffers back to flex columns."""
+
+    @staticmethod
+    def decode(type_name: str, buffers: Dict[str, np.ndarray]):
+        if type_name in _simple_types:
+            return flumpy.from_numpy(buffers["data"])
+        elif type_name in ("vec2_double", "vec3_double"):
+            return flumpy.vec_from_numpy(buffers["data"])
+        elif type_name == "miller_index":
+            return flumpy.miller_index_from_numpy(buffers["data"])
+        elif type_name == "mat3_double":
+            return flumpy.mat3_from_numpy(buffers["data"])
+        elif type_name == "int6":
+            return flex.int6(flumpy.from_numpy(buffers["data"].flatten()))
+        elif type_name == "std_string":
+            offsets = buffers["offsets"]
+            blob = buffers["data"].tobytes()
+            return flex.std_string(
+                [
+                    blob[int(start) : int(end)].decode("utf-8")
+                    for start, end in zip(offsets[:-1], offsets[1:])
+                ]
+            )
+        elif type_name == "shoebox":
+            column = flex.shoebox(
+                flumpy.from_numpy(buffers["panel"]),
+                flex.int6(flumpy.from_numpy(buffers["bbox"].flatten())),
+                allocate=True,
+            )
+            dials_array_family_flex_ext.ShoeboxExtractFromData(
+                column,
+                flumpy.from_numpy(buffers["shoebox_data"]),
+                flumpy.from_numpy(buffers["shoebox_background"]),
+                flumpy.from_numpy(buffers["shoebox_mask"]),
+            )
+            return column
+        raise TypeError(f"Unable to decode column of type {type_name}")
+
+
+def _compress_buffer(
+    pool: ThreadPoolExecutor, array: np.ndarray, compression: str
+) -> List[bytes]:
+    compress = _codecs[compression][0]
+    raw = array.reshape(-1).view(np.uint8)
+    return list(
+        pool.map(
+            compress,
+            (raw[i : i + BLOCK_SIZE] for i in range(0, raw.size, BLOCK_SIZE)),
+        )
+    )
+
+
+def write_mmap_table(
+    table: flex.reflection_table,
+    filename,
+    compression: Optional[str] = None,
+    nproc: int = 1,
+) -> None:
+    """
+    Write a reflection table to disk in the memory-mappable column format.
+
+    Args:
+        table: The reflection table
+        filename: The output filename
+        compression: Optionally, the codec used to compress the column buffers
+        nproc: The number of threads used for compression
+    """
+
+    if compression is not None and compression not in _codecs:
+        raise ValueError(f"Unknown compression {compression}")
+
+    columns = []
+    payload: List[Tuple[int, List]] = []
+    offset = 0
+    with ThreadPoolExecutor(max_workers=nproc) as pool:
+        for key, data in table.cols():
+            buffers = []
+            for name, array in _ColumnEncoder.encode(data).items():
+                array = np.ascontiguousarray(array)
+                offset = _aligned(offset)
+                info = {
+                    "name": name,
+                    "dtype": array.dtype.str,
+                    "shape": list(array.shape),
+                    "offset": offset,
+                    "nbytes": array.nbytes,
+                }
+                if compression:
+                    chunks = _compress_buffer(pool, array, compression)
+                    info["compression"] = compression
+                    info["blocks"] = [len(c) for c in chunks]
+                    offset += sum(info["blocks"])
+                else:
+                    chunks = [array]
+                    offset += array.nbytes
+                buffers.append(info)
+                payload.append((info["offset"], chunks))
+            columns.append(
+                {"name": key, "type": type(data).__name__, "buffers": buffers}
+            )
+
+    directory = json.dumps(
+        {
+            "nrows": table.size(),
+            "identifiers": [[k, v] for k, v in table.experiment_identifiers()],
+            "block_size": BLOCK_SIZE,
+            "columns": columns,
+        }
+    ).encode("utf-8")
+    data_start = _aligned(_preamble.size + len(directory))
+
+    with open(filename, "wb") as outfile:
+        outfile.write(_preamble.pack(MAGIC, VERSION, len(directory)))
+        outfile.write(directory)
+        for buffer_offset, chunks in payload:
+            outfile.seek(data_start + buffer_offset)
+            for chunk in chunks:
+                if isinstance(chunk, np.ndarray):
+                    chunk.tofile(outfile)
+                else:
+                    outfile.write(chunk)
+        # Make sure the file extends to cover any trailing alignment padding
+        outfile.truncate(data_start + _aligned(offset))
+
+
+class MappedReflectionTable:
+    """
+    A read-only, lazily decoded view of a reflection table on disk.
+
+    Columns are materialised as flex arrays on first access and cached; the
+    full table (or a subset of its columns) can be obtained with
+    as_reflection_table().
+    """
+
+    def __init__(self, filename, nproc: int = 1) -> None:
+        """
+        Open and memory map the file, reading only the column directory.
+
+        Args:
+            filename: The input filename
+            nproc: The number of threads used to decompress compressed columns
+        """
+        with open(filename, "rb") as fh:
+            magic, version, directory_size = _preamble.unpack(fh.read(_preamble.size))
+            if magic != MAGIC:
+                raise ValueError(f"{filename} is not a memory-mapped reflection file")
+            if version > VERSION:
+                raise ValueError(
+                    f"Unsupported memory-mapped reflection file version {version}"
+                )
+            directory = json.loads(fh.read(directory_size).decode("utf-8"))
+            self._data_start = _aligned(_preamble.size + directory_size)
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self._nproc = nproc
+        self._block_size = directory.get("block_size", BLOCK_SIZE)
+        self._nrows = directory["nrows"]
+        self._identifiers = {int(k): v for k, v in directory["identifiers"]}
+        self._columns = {c["name"]: c for c in directory["columns"]}
+        self._cache = {}
+
+    def close(self) -> None:
+        """Release the memory map."""
+        self._cache = {}
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> MappedReflectionTable:
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_traceback) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self._nrows
+
+    def size(self) -> int:
+        return self._nrows
+
+    def nrows(self) -> int:
+        return self._nrows
+
+    def ncols(self) -> int:
+        return len(self._columns)
+
+    def keys(self) -> List[str]:
+        return list(self._columns)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._columns
+
+    def __getitem__(self, key: str):
+        if key not in self._cache:
+            if key not in self._columns:
+                raise KeyError(f"Unknown column {key}")
+            self._cache[key] = self._decode_column(self._columns[key])
+        return self._cache[key]
+
+    def experiment_identifiers(self) -> Dict[int, str]:
+        return dict(self._identifiers)
+
+    def column_type(self, key: str) -> str:
+        """Return the flex type name of a column without decoding it."""
+        return self._columns[key]["type"]
+
+    def buffer(self, key: str, name: str = "data") -> np.ndarray:
+        """
+        Return a read-only numpy view of a raw column buffer.
+
+        For uncompressed buffers the view references the memory map directly,
+        so must not outlive the MappedReflectionTable it came from. Compressed
+        buffers are decompressed into a new array.
+        """
+        for info in self._columns[key]["buffers"]:
+            if info["name"] == name:
+                return self._view(info)
+        raise KeyError(f"Column {key} has no buffer {name}")
+
+    def _view(self, info) -> np.ndarray:
+        dtype = np.dtype(info["dtype"])
+        count = info["nbytes"] // dtype.itemsize
+        if not count:
+            return np.zeros(info["shape"], dtype=dtype)
+        if info.get("compression"):
+            return self._decompress(info, dtype)
+        return np.frombuffer(
+            self._mmap,
+            dtype=dtype,
+            count=count,
+            offset=self._data_start + info["offset"],
+        ).reshape(info["shape"])
+
+    def _decompress(self, info, dtype: np.dtype) -> np.ndarray:
+        decompress = _codecs[info["compression"]][1]
+        result = np.empty(info["shape"], dtype=dtype)
+        raw = result.reshape(-1).view(np.uint8)
+        starts = np.cumsum([0] + info["blocks"]) + self._data_start + info["offset"]
+
+        def decompress_block(i):
+            block = decompress(self._mmap[starts[i] : starts[i + 1]])
+            raw[i * self._block_size : i * self._block_size + len(block)] = (
+                np.frombuffer(block, dtype=np.uint8)
+            )
+
+        with ThreadPoolExecutor(max_workers=self._nproc) as pool:
+            list(pool.map(decompress_block, range(len(info["blocks"]))))
+        return result
+
+    def _decode_column(self, column, rows: Optional[np.ndarray] = None):
+        # Copy out of the map: flex arrays built by flumpy share memory with the
+        # numpy source and the map is read-only. Indexing with the selected rows
+        # copies only those rows.
+        if rows is not None and column["type"] not in _unsliceable_types:
+            buffers = {
+                info["name"]: self._view(info)[rows] for info in column["buffers"]
+            }
+            return _ColumnDecoder.decode(column["type"], buffers)
+        buffers = {
+            info["name"]: (
+                self._view(info) if info.get("compression") else self._view(info).copy()
+            )
+            for info in column["buffers"]
+        }
+        data = _ColumnDecoder.decode(column["type"], buffers)
+        if rows is not None:
+            data = data.select(flumpy.from_numpy(rows.astype(np.uint64)))
+        return data
+
+    def as_reflection_table(
+        self,
+        columns: Optional[Iterable[str]] = None,
+        row_filter: Optional[flex.reflection_table_row_filter] = None,
+    ) -> flex.reflection_table:
+        """
+        Materialise a reflection table, optionally with only some columns.
+
+        If a row filter is given, only the columns it needs are read to
+        evaluate it, and only the selected rows of the requested columns are
+        ever decoded.
+        """
+        if columns is None:
+            columns = self.keys()
+        if row_filter is None:
+            table = flex.reflection_table(self._nrows)
+            for key in columns:
+                table[key] = self[key]
+        else:
+            for key in row_filter.columns:
+                if key not in self:
+                    raise KeyError(f"Row filter requires missing column {key}")
+            rows = np.flatnonzero(row_filter.mask(self.buffer, self._nrows))
+            table = flex.reflection_table(len(rows))
+            for key in columns:
+                if key not in self._columns:
+                    raise KeyError(f"Unknown column {key}")
+                table[key] = self._decode_column(self._columns[key], rows)
+        for k, v in self._identifiers.items():
+            table.experiment_identifiers()[k] = v
+        return table
@@ -235,3 +235,64 @@ def test_filter_doubled_cell():
         filtered = model_evaluation.filter_doubled_cell(solutions)
         assert len(filtered) == 1
         assert filtered[0].crystal == solutions[0].crystal
+
+
+class _LikelihoodFromMillerIndex(model_evaluation.Strategy):
+    """Score candidates by the first Miller index of the indexed reflections."""
+
+    def evaluate(self, experiments, reflections):
+        h = reflections["miller_index"][0][0]
+        if h < 0:
+            return None
+        return model_evaluation.Result(
+            model_likelihood=h / 10,
+            crystal=experiments,
+            rmsds=None,
+            n_indexed=len(reflections),
+            fraction_indexed=1.0,
+            hkl_offset=(0, 0, 0),
+        )
+
+
+@pytest.mark.parametrize("nproc", [1, 2])
+def test_evaluate_candidates(nproc):
+    reflections = flex.reflection_table()
+    reflections["miller_index"] = flex.miller_index(5, (0, 0, 0))
+    reflections["id"] = flex.int(5, -1)
+    reflections.set_flags(flex.bool(5, False), reflections.flags.indexed)
+
+    generated = []
+
+    def candidates(likelihoods):
+        for i, h in enumerate(likelihoods):
+            generated.append(i)
+            refl = reflections.copy()
+            refl["miller_index"] = flex.miller_index(5, (h, 0, 0))
+            refl["id"] = flex.int(5, 0)
+            yield f"candidate {i}", refl
+
+    likelihoods = [3, -1, 5, 9, 2, 8, 9, 1] + [0] * 20
+    results = model_evaluation.evaluate_candidates(
+        _LikelihoodFromMillerIndex(),
+        candidates(likelihoods),
+        reflections,
+        nproc=nproc,
+        stop=lambda result: result.model_likelihood > 0.75,
+    )
+    # Candidates after the first satisfying the stop condition are ignored,
+    # and those which failed evaluation are excluded
+    assert [r.crystal for r in results] == [
+        "candidate 0",
+        "candidate 2",
+        "candidate 3",
+    ]
+    assert [r.model_likelihood for r in results] == pytest.approx([0.3, 0.5, 0.9])
+    # Not all of the candidates were generated
+    assert len(generated) < len(likelihoods)
+
+    generated.clear()
+    results = model_evaluation.evaluate_candidates(
+        _LikelihoodFromMillerIndex(), candidates(likelihoods), reflections, nproc=nproc
+    )
+    assert len(results) == len(likelihoods) - 1
+    assert len(generated) == len(likelihoods)
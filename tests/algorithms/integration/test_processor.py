@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import itertools
+import logging
 import math
+import time
 from unittest import mock
 
 import pytest
@@ -64,3 +67,98 @@ def test_runtime_error_raised_when_not_enough_memory(mock_flex_max):
     mock_flex_max.return_value = 750000
     manager.compute_processors()
     mock_flex_max.assert_called_with(manager.jobs.shoebox_memory.return_value)
+
+
+def test_adaptive_block_frames():
+    from scitbx.array_family import shared
+
+    # Small reflections on every frame with a dense, highly mosaic region in the
+    # middle of the scan
+    bbox = flex.int6([(0, 10, 0, 10, z, z + 4) for z in range(96)])
+    bbox.extend(flex.int6(50, (0, 100, 0, 100, 45, 55)))
+    adaptive_block_frames = (
+        dials.algorithms.integration.processor._adaptive_block_frames
+    )
+
+    # Everything fits, so the regular blocks are kept
+    assert adaptive_block_frames(bbox, (0, 100), 50, 2, 1e9) is None
+
+    # Blocks are halved approaching the dense region, keeping the overlap
+    blocks = adaptive_block_frames(bbox, (0, 100), 50, 2, 4e7)
+    assert blocks == [
+        (0, 25),
+        (23, 35),
+        (33, 45),
+        (43, 49),
+        (47, 53),
+        (51, 57),
+        (55, 100),
+    ]
+
+    jobs = JobList()
+    jobs.add_blocks((0, 1), shared.tiny_int_2(blocks))
+    assert len(jobs) == len(blocks)
+    assert [tuple(jobs[i].frames()) for i in range(len(jobs))] == blocks
+
+
+def _timed_task(task):
+    start = time.monotonic()
+    time.sleep(0.1)
+    return task, start, time.monotonic()
+
+
+def test_memory_limited_map():
+    memory_limited_map = dials.algorithms.integration.processor._memory_limited_map
+
+    # With one process, tasks are run largest first, in order for equal memory
+    results = []
+    memory_limited_map(
+        _timed_task, "abcd", [1, 3, 2, 3], 10, 1, callback=results.append
+    )
+    assert [task for task, _, _ in results] == ["b", "d", "c", "a"]
+
+    # Tasks only run at the same time as others if their memory fits the limit,
+    # except for a task over the limit, which runs on its own
+    memory = {"a": 3, "b": 5, "c": 1, "d": 3, "e": 2}
+    results = []
+    memory_limited_map(
+        _timed_task, "abcde", list(memory.values()), 4, 4, callback=results.append
+    )
+    assert sorted(task for task, _, _ in results) == list("abcde")
+    for (t1, start1, end1), (t2, start2, end2) in itertools.combinations(results, 2):
+        if start1 < end2 and start2 < end1:
+            assert memory[t1] + memory[t2] <= 4
+
+
+def test_memory_report(caplog):
+    job = mock.Mock()
+    job.frames.return_value = (0, 10)
+    processor = mock.Mock(
+        block_memory=[1e9, 2e9],
+        memory={0: 1.5e9, 1: None},
+        manager=mock.Mock(job=mock.Mock(return_value=job)),
+    )
+    memory_report = dials.algorithms.integration.processor._Manager.memory_report
+
+    with caplog.at_level(logging.DEBUG):
+        memory_report(processor)
+    table = caplog.records[0].getMessage().splitlines()
+    # The header row is separated from the data rows
+    assert "Predicted (GB)" in table[2]
+    assert set(table[3]) == set("|-+")
+    assert [float(cell) for cell in table[4].strip("|").split("|")] == [
+        0,
+        0,
+        10,
+        1.0,
+        1.5,
+    ]
+
+    # The peak memory is only reported by default if the prediction was poor
+    assert "Peak block memory" in caplog.records[1].getMessage()
+    assert caplog.records[1].levelno == logging.DEBUG
+    processor.memory[0] = 3e9
+    caplog.clear()
+    with caplog.at_level(logging.DEBUG):
+        memory_report(processor)
+    assert caplog.records[1].levelno == logging.INFO
@@ -26,6 +26,7 @@
     Simple6MosaicityParameterisation,
 )
 from dials.algorithms.profile_model.ellipsoid.refiner import (
+    MaximumLikelihoodTarget,
     Refiner,
     RefinerData,
     ReflectionLikelihood,
@@ -463,6 +464,73 @@ def f(x):
     )
 
 
+def test_MaximumLikelihoodTarget(testdata, refinerdata_testdata):
+    experiment = testdata.experiment
+    data = refinerdata_testdata
+
+    def check(parameterisation, **fixed):
+        state = ModelState(experiment, parameterisation, **fixed)
+        target = MaximumLikelihoodTarget(
+            state,
+            data.s0,
+            data.sp_list,
+            data.h_list,
+            data.ctot_list,
+            data.mobs_list,
+            data.sobs_list,
+            data.panel_ids,
+        )
+
+        def reflection_likelihoods():
+            return [
+                ReflectionLikelihood(
+                    state,
+                    data.s0,
+                    data.sp_list[:, i],
+                    matrix.col(h),
+                    data.ctot_list[i],
+                    data.mobs_list[:, i],
+                    data.sobs_list[:, :, i],
+                )
+                for i, h in enumerate(data.h_list)
+            ]
+
+        # Check the batched target against the sum over reflections, before and
+        # after updating the parameters
+        for shift in (0, 1e-4):
+            if shift:
+                parameters = state.active_parameters
+                state.active_parameters = parameters + shift * np.abs(parameters)
+                target.update()
+            reflections = reflection_likelihoods()
+            assert target.log_likelihood() == pytest.approx(
+                sum(r.log_likelihood() for r in reflections)
+            )
+            assert target.first_derivatives() == pytest.approx(
+                sum(r.first_derivatives() for r in reflections)
+            )
+            assert list(target.fisher_information()) == pytest.approx(
+                list(sum(r.fisher_information() for r in reflections))
+            )
+            assert target.jacobian().all() == (
+                len(reflections),
+                len(state.active_parameters),
+            )
+
+    sigma_d = 0.02**2
+    check(Simple1ProfileModel.from_sigma_d(sigma_d).parameterisation())
+    check(
+        Simple6ProfileModel.from_sigma_d(sigma_d).parameterisation(),
+        fix_unit_cell=True,
+    )
+    check(
+        Simple6Angular1MosaicityParameterisation(
+            np.array([0.01, 0.005, 0.02, 0.015, 0.03, 0.025, 0.002])
+        ),
+        fix_orientation=True,
+    )
+
+
 def test_Refiner(testdata, refinerdata_testdata):
     experiment = testdata.experiment
     data = refinerdata_testdata
@@ -228,6 +228,23 @@ def test(args=[]):
     xl1uc_param.set_param_vals(xluc_p_vals[0])
     xl2uc_param.set_param_vals(xluc_p_vals[1])
 
+    # check the Jacobian is the same whether built with sparse storage or not
+    for scan_varying in (False, True):
+        jacobians = []
+        for sparse in (False, True):
+            params = phil_scope.fetch(source=parse("")).extract()
+            params.refinement.parameterisation.scan_varying = scan_varying
+            params.refinement.parameterisation.sparse = sparse
+            refiner = RefinerFactory.from_parameters_data_experiments(
+                params, obs_refs, experiments
+            )
+            _, jacobian, _ = refiner._target.compute_residuals_and_gradients()
+            if sparse:
+                jacobian = jacobian.as_dense_matrix()
+            jacobians.append(jacobian)
+        assert jacobians[0].all() == jacobians[1].all()
+        assert approx_equal(jacobians[0], jacobians[1])
+
     # scan static first
     params = phil_scope.fetch(source=parse("")).extract()
     refiner = RefinerFactory.from_parameters_data_experiments(
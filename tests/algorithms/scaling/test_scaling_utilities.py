@@ -4,6 +4,7 @@
 
 from __future__ import annotations
 
+import concurrent.futures
 from math import pi, sqrt
 
 import numpy as np
@@ -21,6 +22,9 @@
 from libtbx import phil
 from scitbx.sparse import matrix  # noqa: F401 - Needed to call calc_theta_phi
 
+from dials.algorithms.scaling.model.components.smooth_scale_components import (
+    GaussianSmoother1D,
+)
 from dials.algorithms.scaling.scaling_library import create_scaling_model
 from dials.algorithms.scaling.scaling_utilities import (
     Reasons,
@@ -38,6 +42,8 @@
     calculate_harmonic_tables_from_selections,
     create_sph_harm_lookup_table,
     create_sph_harm_table,
+    row_multiply,
+    stack_derivatives,
 )
 
 
@@ -560,3 +566,50 @@ def test_calc_lookup_index():
     assert list(indices) == [0, 64799, 359, 64440]
     indices = calc_lookup_index(theta_phi, 2)
     assert list(indices) == [0, 259199, 719, 258480]
+
+
+def test_stack_derivatives():
+    a = matrix(2, 2)
+    a[0, 0] = 1.0
+    a[1, 1] = 2.0
+    b = matrix(3, 1)
+    b[0, 0] = 3.0
+    b[2, 0] = 4.0
+    stacked = stack_derivatives([a, b], flex.size_t([0, 2]), 5, 3)
+    assert stacked.n_rows == 5
+    assert stacked.n_cols == 3
+    assert list(stacked.as_dense_matrix()) == [
+        1.0, 0.0, 0.0,
+        0.0, 2.0, 0.0,
+        0.0, 0.0, 3.0,
+        0.0, 0.0, 0.0,
+        0.0, 0.0, 4.0,
+    ]  # fmt: skip
+
+    # Blocks must fit in the matrix
+    with pytest.raises(RuntimeError):
+        stack_derivatives([a, b], flex.size_t([0, 3]), 5, 3)
+
+
+def test_release_gil_threaded_equals_serial():
+    """The functions releasing the GIL give the same results in threads."""
+
+    def calculate(seed):
+        rng = np.random.default_rng(seed)
+        n = 1000
+        x = flex.double(rng.uniform(0.0, 10.0, n))
+        smoother = GaussianSmoother1D([0, 10], 4)
+        nv = smoother.num_values()
+        values = flex.double(rng.uniform(0.5, 1.5, nv))
+        value, weight, _ = smoother.multi_value_weight(x, values)
+        _, weight_ff, _ = smoother.multi_value_weight_first_fixed(x, values)
+        derivs = row_multiply(weight.transpose(), value)
+        stacked = stack_derivatives(
+            [derivs, weight_ff.transpose()], flex.size_t([0, nv]), 2 * n, 2 * nv
+        )
+        return list(value), list(stacked.as_dense_matrix())
+
+    seeds = list(range(16))
+    serial = [calculate(seed) for seed in seeds]
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        assert list(pool.map(calculate, seeds)) == serial
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from dxtbx import flumpy
+
+from dials.algorithms.spot_finding import finder
+from dials.algorithms.spot_finding.factory import SpotFinderFactory, phil_scope
+from dials.array_family import flex
+from dials.util import Sorry
+
+
+class _FakeTime:
+    """A clock which only advances when sleeping."""
+
+    def __init__(self, on_sleep=None):
+        self.now = 0.0
+        self.on_sleep = on_sleep
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+        if self.on_sleep:
+            self.on_sleep(self.now)
+
+
+class _FakeImageSet:
+    def __init__(self, path, failures=0):
+        self.path = path
+        self.failures = failures
+
+    def get_path(self, index):
+        return str(self.path)
+
+    def get_corrected_data(self, index):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Image is incomplete")
+        return f"image {index}"
+
+    def get_mask(self, index):
+        return f"mask {index}"
+
+
+def test_wait_for_images(tmp_path, monkeypatch):
+    path = tmp_path / "image_00001.cbf"
+
+    def write_image(now):
+        if now >= 1.0:
+            path.touch()
+
+    clock = _FakeTime(on_sleep=write_image)
+    monkeypatch.setattr(finder, "time", clock)
+    wait = finder.WaitForImages(timeout=10, poll_interval=0.5)
+
+    # The image is read once it appears on disk
+    assert wait.read(_FakeImageSet(path), 0) == ("image 0", "mask 0")
+    assert clock.now == 1.0
+
+    # Reads of an image that is still being written are retried
+    assert wait.read(_FakeImageSet(path, failures=2), 1) == ("image 1", "mask 1")
+    assert clock.now == 2.0
+
+    # Reads of an image that never completes fail with the last error
+    with pytest.raises(RuntimeError, match="incomplete"):
+        wait.read(_FakeImageSet(path, failures=100), 2)
+    assert clock.now > 12.0
+
+
+def test_wait_for_images_timeout(tmp_path, monkeypatch):
+    clock = _FakeTime()
+    monkeypatch.setattr(finder, "time", clock)
+    wait = finder.WaitForImages(timeout=2, poll_interval=0.5)
+    with pytest.raises(Sorry, match="Timed out after 2s waiting for image 1"):
+        wait.read(_FakeImageSet(tmp_path / "missing.cbf"), 0)
+    assert clock.now == 2.5
+
+
+class _ThresholdImages:
+    """Read synthetic images and threshold them, as ExtractPixelsFromImage."""
+
+    def __init__(self, threshold_function, n_images, shape=(300, 400)):
+        self.threshold_function = threshold_function
+        self.n_images = n_images
+        self.shape = shape
+
+    def read(self, index):
+        rng = np.random.default_rng(index)
+        data = rng.poisson(5, self.shape).astype(np.float64)
+        y = rng.integers(0, self.shape[0], 100)
+        x = rng.integers(0, self.shape[1], 100)
+        data[y, x] += rng.poisson(200, 100)
+        return flumpy.from_numpy(data), flex.bool(flex.grid(self.shape), True)
+
+    def extract(self, index, image, mask):
+        return self.threshold_function.compute_threshold(image, mask)
+
+
+@pytest.mark.parametrize("algorithm", ["dispersion", "dispersion_extended"])
+def test_pipelined_map_threads_match_serial(algorithm):
+    params = phil_scope.extract()
+    params.spotfinder.threshold.algorithm = algorithm
+    n_images = 48
+
+    function = _ThresholdImages(SpotFinderFactory.configure_threshold(params), n_images)
+    serial = [function.extract(i, *function.read(i)) for i in range(n_images)]
+
+    # The full threshold mask of every image matches the serial result
+    function = _ThresholdImages(SpotFinderFactory.configure_threshold(params), n_images)
+    results = []
+    finder.pipelined_map(
+        function,
+        range(n_images),
+        nthreads=4,
+        callback=lambda index, result: results.append((index, result)),
+    )
+    assert [index for index, _ in results] == list(range(n_images))
+    for (_, result), expected in zip(results, serial):
+        assert result.all_eq(expected)
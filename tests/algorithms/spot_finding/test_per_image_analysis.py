@@ -129,6 +129,33 @@ def test_stats_per_image(centroid_test_data):
     assert [tt[0] for tt in t[1:]] == [str(i + 1) for i in perm]
 
 
+def test_stats_accumulator(centroid_test_data):
+    experiments, reflections = centroid_test_data
+    start, end = experiments[0].scan.get_array_range()
+    image_number = flex.floor(reflections["xyzobs.px.value"].parts()[2])
+    expected = [
+        per_image_analysis.stats_for_reflection_table(
+            reflections.select(image_number == i)
+        )
+        for i in range(start, end)
+    ]
+
+    # add the spots in batches, in the order they were found
+    accumulator = per_image_analysis.StatsAccumulator((start, end))
+    perm = flex.sort_permutation(image_number)
+    batches = [perm[i : i + 100] for i in range(0, len(perm), 100)]
+    for batch in batches:
+        accumulator.add(reflections.select(flex.sorted(batch)))
+        # statistics are available for each image as its spots are added
+        assert accumulator.stats_for_image(start).n_spots_total > 0
+    assert accumulator.stats() == per_image_analysis.StatsMultiImage(
+        **{
+            name: [getattr(row, name) for row in expected]
+            for name in expected[0]._fields
+        }
+    )
+
+
 def test_stats_table_no_resolution_analysis(centroid_test_data):
     experiments, reflections = centroid_test_data
     stats = per_image_analysis.stats_per_image(
@@ -0,0 +1,50 @@
+from __future__ import annotations
+
+import concurrent.futures
+import pickle
+
+import numpy as np
+import pytest
+
+from dxtbx import flumpy
+
+from dials.algorithms.spot_finding.factory import SpotFinderFactory, phil_scope
+from dials.array_family import flex
+
+
+def _images(n, shape=(400, 500)):
+    """Poisson background with a scattering of bright spots."""
+    rng = np.random.default_rng(0)
+    images = []
+    for _ in range(n):
+        data = rng.poisson(5, shape).astype(np.float64)
+        y = rng.integers(0, shape[0], 200)
+        x = rng.integers(0, shape[1], 200)
+        data[y, x] += rng.poisson(200, 200)
+        images.append(flumpy.from_numpy(data))
+    return images
+
+
+@pytest.mark.parametrize("algorithm", ["dispersion", "dispersion_extended"])
+def test_threshold_extension_in_threads(algorithm):
+    params = phil_scope.extract()
+    params.spotfinder.threshold.algorithm = algorithm
+    images = _images(32)
+    mask = flex.bool(flex.grid(images[0].all()), True)
+
+    threshold = SpotFinderFactory.configure_threshold(params)
+    serial = [threshold.compute_threshold(image, mask) for image in images]
+
+    # The cached buffers are not shared between threads
+    threshold = SpotFinderFactory.configure_threshold(params)
+    with concurrent.futures.ThreadPoolExecutor(max_workers=4) as pool:
+        threaded = list(
+            pool.map(lambda image: threshold.compute_threshold(image, mask), images)
+        )
+    assert len(threaded) == len(serial)
+    for a, b in zip(threaded, serial):
+        assert a.all_eq(b)
+
+    # Nor between processes
+    threshold = pickle.loads(pickle.dumps(threshold))
+    assert threshold.compute_threshold(images[0], mask).all_eq(serial[0])
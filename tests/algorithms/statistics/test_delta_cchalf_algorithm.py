@@ -2,11 +2,21 @@
 
 from __future__ import annotations
 
+import random
+from collections import defaultdict
 from unittest import mock
 
+import pytest
+
+from cctbx import sgtbx, uctbx
 from dxtbx.model import Crystal, Experiment, ExperimentList, Scan
 
 from dials.algorithms.statistics.cc_half_algorithm import CCHalfFromDials
+from dials.algorithms.statistics.delta_cchalf import (
+    PerGroupCChalfStatistics,
+    ReflectionSum,
+    compute_cchalf_from_reflection_sums,
+)
 from dials.array_family import flex
 from dials.command_line.compute_delta_cchalf import phil_scope
 
@@ -118,3 +128,70 @@ def mock_algorithm(*_):
         assert script.results_summary["dataset_removal"][
             "experiments_fully_removed"
         ] == ["0"]
+
+
+def _reflection_sums(reflection_table, selection):
+    sums = defaultdict(ReflectionSum)
+    for h, x in zip(
+        reflection_table["miller_index"].select(selection),
+        reflection_table["intensity"].select(selection),
+    ):
+        sums[h].sum_x += x
+        sums[h].sum_x2 += x**2
+        sums[h].n += 1
+    return sums
+
+
+def test_per_group_cchalf_statistics():
+    random.seed(0)
+    unit_cell = uctbx.unit_cell((20, 30, 40, 90, 90, 90))
+    space_group = sgtbx.space_group_info("P 2 2 2").group()
+    hkl = [(h, k, l) for h in range(4) for k in range(4) for l in range(1, 6)]
+    true_intensities = {h: random.uniform(10, 1e5) for h in hkl}
+
+    n_groups = 7
+    miller_indices = []
+    intensities = []
+    groups = []
+    for group in range(n_groups):
+        # Make the last group much worse than the others
+        noise = 0.3 if group == n_groups - 1 else 0.05
+        for h in random.sample(hkl, 60):
+            miller_indices.append(h)
+            intensities.append(true_intensities[h] * random.gauss(1, noise))
+            groups.append(group * 10)
+
+    table = flex.reflection_table()
+    table["miller_index"] = flex.miller_index(miller_indices)
+    table["intensity"] = flex.double(intensities)
+    table["variance"] = flex.double(len(intensities), 1.0)
+    table["dataset"] = flex.int(len(intensities), 0)
+    table["group"] = flex.int(groups)
+
+    statistics = PerGroupCChalfStatistics(table, unit_cell, space_group, n_bins=4)
+    statistics.run()
+    assert statistics.num_unique() == len(
+        set(statistics.reflection_table["miller_index"])
+    )
+
+    # Compare with calculating the sums for each group separately
+    table = statistics.reflection_table
+    reflection_sums = _reflection_sums(table, flex.bool(table.size(), True))
+    assert statistics.reflection_sums.keys() == reflection_sums.keys()
+    for h, sums in statistics.reflection_sums.items():
+        assert sums.n == reflection_sums[h].n
+        assert sums.sum_x == pytest.approx(reflection_sums[h].sum_x)
+        assert sums.sum_x2 == pytest.approx(reflection_sums[h].sum_x2)
+    assert statistics.mean_cchalf() == pytest.approx(
+        compute_cchalf_from_reflection_sums(reflection_sums, statistics.binner)
+    )
+    cchalf_i = statistics.cchalf_i()
+    assert list(cchalf_i) == [group * 10 for group in range(n_groups)]
+    for group, cchalf in cchalf_i.items():
+        sums = _reflection_sums(table, table["group"] != group)
+        assert cchalf == pytest.approx(
+            compute_cchalf_from_reflection_sums(sums, statistics.binner)
+        )
+
+    delta_cchalf_i = statistics.delta_cchalf_i()
+    assert min(delta_cchalf_i, key=delta_cchalf_i.get) == (n_groups - 1) * 10
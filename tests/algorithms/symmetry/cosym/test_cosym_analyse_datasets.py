@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import numpy as np
 import pytest
 
 import libtbx
@@ -7,6 +8,7 @@
 
 from dials.algorithms.symmetry.cosym import CosymAnalysis, phil_scope
 from dials.algorithms.symmetry.cosym._generate_test_data import generate_test_data
+from dials.algorithms.symmetry.cosym.state import CosymState
 
 
 @pytest.mark.parametrize(
@@ -139,3 +141,68 @@ def test_cosym(
             )
         else:
             reference = reindexed
+
+
+@pytest.mark.parametrize("fix_existing", [True, False])
+def test_cosym_incremental(fix_existing, tmp_path):
+    datasets, _ = generate_test_data(
+        space_group=sgtbx.space_group_info(symbol="P4").group(),
+        unit_cell_volume=10000,
+        d_min=1.5,
+        map_to_p1=True,
+        sample_size=12,
+        seed=1,
+    )
+    identifiers = [f"dataset{i}" for i in range(len(datasets))]
+
+    params = phil_scope.extract()
+    params.normalisation = None
+    cosym = CosymAnalysis(datasets[:8], params, identifiers=identifiers[:8])
+    cosym.run()
+    state_file = tmp_path / "dials.cosym.state"
+    cosym.as_state().as_file(state_file)
+    state = CosymState.from_file(state_file)
+    assert state.identifiers == identifiers[:8]
+    assert state.sym_ops == list(cosym.target.sym_ops)
+    np.testing.assert_array_equal(state.coords, cosym.coords)
+
+    # Add the remaining datasets, omitting one of the previous datasets
+    params = phil_scope.extract()
+    params.normalisation = None
+    params.incremental.state = str(state_file)
+    params.incremental.fix_existing = fix_existing
+    datasets = datasets[1:]
+    identifiers = identifiers[1:]
+    cosym = CosymAnalysis(datasets, params, identifiers=identifiers)
+    cosym.run()
+    state = state.select(range(1, 8))
+    known_rows = cosym.target.known_rows
+    assert known_rows.size == 7 * len(state.sym_ops)
+    assert cosym.target.dim == state.dim
+    np.testing.assert_array_equal(
+        cosym.target.rij_matrix[np.ix_(known_rows, known_rows)], state.rij_matrix
+    )
+    if fix_existing:
+        np.testing.assert_array_equal(cosym.coords[known_rows], state.coords)
+
+    space_group_info = cosym.best_subgroup["subsym"].space_group_info()
+    reference = None
+    for d_id, cb_op in enumerate(cosym.reindexing_ops):
+        reindexed = (
+            datasets[d_id]
+            .change_basis(sgtbx.change_of_basis_op(cb_op))
+            .customized_copy(
+                space_group_info=space_group_info.change_basis(
+                    cosym.cb_op_inp_min.inverse()
+                )
+            )
+        )
+        if reference:
+            assert (
+                reindexed.correlation(
+                    reference, assert_is_similar_symmetry=False
+                ).coefficient()
+                > 0.99
+            )
+        else:
+            reference = reindexed
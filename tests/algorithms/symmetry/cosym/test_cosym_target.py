@@ -52,3 +52,159 @@ def test_cosym_target(space_group):
         assert f < f0
         assert pytest.approx(list(g), abs=3e-3) == [0] * len(g)
         assert pytest.approx(g_fd, abs=3e-3) == [0] * len(g)
+
+
+@pytest.mark.parametrize("nproc", [1, 3])
+def test_compute_pairwise_correlations(nproc):
+    pd = pytest.importorskip("pandas")
+    rng = np.random.default_rng(42)
+    n_rows, n_cols = 12, 40
+    dense = rng.normal(1e4, 1e3, size=(n_rows, n_cols))
+    dense[rng.random(size=dense.shape) < 0.6] = np.nan
+    dense[3] = np.nan
+    dense[4, :5] = 1.0
+    dense[4, 5:] = np.nan
+    rows, cols = np.nonzero(np.isfinite(dense))
+
+    # The last of any duplicate observations is used, and non-finite values are
+    # unobserved
+    values = dense[rows, cols]
+    rows = np.concatenate([[rows[0]], rows, [1]])
+    cols = np.concatenate([[cols[0]], cols, [1]])
+    values = np.concatenate([[-5.0], values, [np.nan]])
+    dense[1, 1] = np.nan
+
+    cc, n_pairs = target._compute_pairwise_correlations(
+        rows, cols, values, n_rows, min_pairs=3, nproc=nproc
+    )
+    expected = pd.DataFrame(dense).T.corr(min_periods=3).values
+    np.nan_to_num(expected, copy=False)
+    np.fill_diagonal(expected, 0)
+    np.testing.assert_allclose(cc, expected, atol=1e-12)
+
+    finite = np.isfinite(dense).astype(int)
+    expected_n = finite @ finite.T
+    np.fill_diagonal(expected_n, 0)
+    np.testing.assert_array_equal(n_pairs, expected_n)
+
+
+def test_compute_pairwise_correlations_new_rows():
+    rng = np.random.default_rng(42)
+    n_rows, n_cols = 12, 40
+    dense = rng.normal(1e4, 1e3, size=(n_rows, n_cols))
+    dense[rng.random(size=dense.shape) < 0.6] = np.nan
+    rows, cols = np.nonzero(np.isfinite(dense))
+    values = dense[rows, cols]
+
+    cc, n_pairs = target._compute_pairwise_correlations(
+        rows, cols, values, n_rows, min_pairs=3
+    )
+    new_rows = np.array([2, 7, 8, 11])
+    cc_new, n_pairs_new = target._compute_pairwise_correlations(
+        rows, cols, values, n_rows, min_pairs=3, nproc=2, new_rows=new_rows
+    )
+    computed = np.zeros((n_rows, n_rows), dtype=bool)
+    computed[new_rows, :] = True
+    computed[:, new_rows] = True
+    np.testing.assert_allclose(cc_new[computed], cc[computed], atol=1e-12)
+    np.testing.assert_array_equal(n_pairs_new[computed], n_pairs[computed])
+    assert not cc_new[~computed].any()
+    assert not n_pairs_new[~computed].any()
+
+
+def _generate_intensities(space_group, sample_size):
+    datasets, _ = generate_test_data(
+        space_group=sgtbx.space_group_info(symbol=space_group).group(),
+        sample_size=sample_size,
+    )
+    intensities = datasets[0]
+    dataset_ids = np.zeros(intensities.size() * len(datasets))
+    for i, d in enumerate(datasets[1:]):
+        i += 1
+        intensities = intensities.concatenate(d, assert_is_similar_symmetry=False)
+        dataset_ids[i * d.size() : (i + 1) * d.size()] = np.full(d.size(), i, dtype=int)
+    return intensities, dataset_ids
+
+
+def test_cosym_target_known():
+    intensities, dataset_ids = _generate_intensities("P3", sample_size=10)
+    t = target.Target(intensities, dataset_ids, weights="count")
+    n = 10
+    m = len(t.sym_ops)
+
+    # Reuse the correlation coefficients of the first six datasets, given in a
+    # different order
+    known_lattices = [3, 0, 5, 1, 4, 2]
+    known_rows = (np.arange(m)[:, None] * n + known_lattices).ravel()
+    known = np.ix_(known_rows, known_rows)
+    t_known = target.Target(
+        intensities,
+        dataset_ids,
+        weights="count",
+        known=(t.sym_ops, known_lattices, t.rij_matrix[known], t.n_pairs_matrix[known]),
+    )
+    np.testing.assert_array_equal(t_known.known_rows, known_rows)
+    np.testing.assert_allclose(t_known.rij_matrix, t.rij_matrix, atol=1e-12)
+    np.testing.assert_allclose(t_known.wij_matrix, t.wij_matrix)
+    np.testing.assert_array_equal(t_known.n_pairs_matrix, t.n_pairs_matrix)
+
+    # The known correlation coefficients are not recalculated
+    t_known = target.Target(
+        intensities,
+        dataset_ids,
+        weights="count",
+        known=(
+            t.sym_ops,
+            known_lattices,
+            np.zeros_like(t.rij_matrix[known]),
+            t.n_pairs_matrix[known],
+        ),
+    )
+    assert not t_known.rij_matrix[known].any()
+
+    # Unless the symmetry operations differ
+    t_known = target.Target(
+        intensities,
+        dataset_ids,
+        weights="count",
+        known=(["x,y,z"], known_lattices, t.rij_matrix[known], t.n_pairs_matrix[known]),
+    )
+    assert t_known.known_rows is None
+    np.testing.assert_allclose(t_known.rij_matrix, t.rij_matrix, atol=1e-12)
+
+
+@pytest.mark.parametrize("weights", [None, "count"])
+def test_fixed_coordinates_target(weights):
+    intensities, dataset_ids = _generate_intensities("P2", sample_size=8)
+    t = target.Target(intensities, dataset_ids, weights=weights)
+    n_rows = t.rij_matrix.shape[0]
+    x = flex.random_double(n_rows * t.dim).as_numpy_array()
+    free_rows = np.array([1, 4, 6, n_rows - 1])
+
+    ft = target.FixedCoordinatesTarget(t, x, free_rows)
+    x_free = ft.free_coordinates(x)
+    assert x_free.size == free_rows.size * t.dim
+    np.testing.assert_array_equal(ft.full_coordinates(x_free), x)
+
+    # The functional differs from the full functional by a constant, and the
+    # derivatives are those of the full target for the free coordinates
+    y_free = flex.random_double(x_free.size).as_numpy_array()
+    for xf in (x_free, y_free):
+        full = ft.full_coordinates(xf)
+        assert ft.compute_functional(xf) - t.compute_functional(full) == pytest.approx(
+            ft.compute_functional(x_free) - t.compute_functional(x)
+        )
+        np.testing.assert_allclose(
+            ft.compute_gradients(xf), ft.free_coordinates(t.compute_gradients(full))
+        )
+        np.testing.assert_allclose(
+            ft.curvatures(xf), ft.free_coordinates(t.curvatures(full))
+        )
+
+    minimizer = engine.lbfgs_with_curvs(target=ft, coords=x_free)
+    coords = ft.full_coordinates(minimizer.coords)
+    assert t.compute_functional(coords) < t.compute_functional(x)
+    fixed = np.setdiff1d(np.arange(n_rows), free_rows)
+    np.testing.assert_array_equal(
+        coords.reshape(t.dim, -1)[:, fixed], x.reshape(t.dim, -1)[:, fixed]
+    )
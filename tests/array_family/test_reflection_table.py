@@ -4,6 +4,7 @@
 import logging
 import pickle
 import random
+import time
 
 import pytest
 
@@ -1653,3 +1654,149 @@ def test_concat():
     table1 = flex.reflection_table()
     table2 = flex.reflection_table()
     table1 = flex.reflection_table.concat([table1, table2])
+
+
+def _reference_match_indices(predicted, observed):
+    """The original pure Python matching used by match_with_reference."""
+    lookup = {}
+    for i in range(len(predicted)):
+        item = predicted["miller_index"][i] + (
+            int(predicted["entering"][i]),
+            predicted["id"][i],
+            predicted["panel"][i],
+        )
+        lookup.setdefault(item, ([], []))[0].append(i)
+    for j in range(len(observed)):
+        item = observed["miller_index"][j] + (
+            int(observed["entering"][j]),
+            observed["id"][j],
+            observed["panel"][j],
+        )
+        if item in lookup:
+            lookup[item][1].append(j)
+
+    x1, y1, z1 = predicted["xyzcal.px"].parts()
+    x2, y2, z2 = observed["xyzcal.px"].parts()
+    matches = []
+    for a, b in lookup.values():
+        matched = {}
+        for i in a:
+            d = [
+                (
+                    i,
+                    j,
+                    (x1[i] - x2[j]) ** 2 + (y1[i] - y2[j]) ** 2 + (z1[i] - z2[j]) ** 2,
+                )
+                for j in b
+            ]
+            if not d:
+                continue
+            i, j, d = min(d, key=lambda x: x[2])
+            if j not in matched or d < matched[j][1]:
+                matched[j] = (i, d)
+        matches.extend((i, j) for j, (i, _) in matched.items())
+    return sorted(matches)
+
+
+def _random_match_tables(n):
+    """Predicted and strong observed tables of n and n // 2 random rows."""
+    random.seed(0)
+
+    def table(n_rows):
+        t = flex.reflection_table()
+        # Small ranges of values, so that there are many ambiguous matches
+        t["miller_index"] = flex.miller_index(
+            [tuple(random.randint(-3, 3) for _ in range(3)) for _ in range(n_rows)]
+        )
+        t["entering"] = flex.bool([random.random() < 0.5 for _ in range(n_rows)])
+        t["id"] = flex.int([random.randint(0, 1) for _ in range(n_rows)])
+        t["panel"] = flex.size_t([random.randint(0, 1) for _ in range(n_rows)])
+        t["xyzcal.px"] = flex.vec3_double(
+            [
+                tuple(float(random.randint(0, 3)) for _ in range(3))
+                for _ in range(n_rows)
+            ]
+        )
+        t["flags"] = flex.size_t(n_rows, 0)
+        return t
+
+    predicted = table(n)
+    observed = table(n // 2)
+    observed.set_flags(flex.bool(len(observed), True), observed.flags.strong)
+    return predicted, observed
+
+
+@pytest.mark.parametrize("n", [0, 1000])
+def test_match_with_reference(n):
+    predicted, observed = _random_match_tables(n)
+    expected = _reference_match_indices(predicted, observed)
+    mask, matched, unmatched = predicted.match_with_reference(observed)
+
+    # Matches within 2 pixels are accepted
+    accepted = [
+        (i, j)
+        for i, j in expected
+        if sum(
+            (a - b) ** 2
+            for a, b in zip(predicted["xyzcal.px"][i], observed["xyzcal.px"][j])
+        )
+        < 4
+    ]
+    assert list(mask.iselection()) == [i for i, _ in accepted]
+    assert len(matched) == len(accepted)
+    assert len(unmatched) == len(observed) - len(accepted)
+    assert list(matched["xyzcal.px"]) == [
+        predicted["xyzcal.px"][i] for i, _ in accepted
+    ]
+    assert predicted.get_flags(predicted.flags.reference_spot).count(True) == len(
+        accepted
+    )
+    assert predicted.get_flags(predicted.flags.strong).count(True) == len(expected)
+
+
+@pytest.mark.benchmark
+def test_match_with_reference_benchmark():
+    n = 20000
+    predicted, observed = _random_match_tables(n)
+    start = time.perf_counter()
+    expected = _reference_match_indices(predicted, observed)
+    t_reference = time.perf_counter() - start
+    start = time.perf_counter()
+    mask, _, _ = predicted.match_with_reference(observed)
+    t_vectorised = time.perf_counter() - start
+    print(
+        f"match_with_reference on {n} predictions: {t_vectorised:.3f}s "
+        f"(pure Python reference {t_reference:.3f}s)"
+    )
+    assert mask.count(True) <= len(expected)
+    assert t_vectorised < t_reference
+
+
+def test_group_by():
+    table = flex.reflection_table()
+    table["id"] = flex.int([1, 0, 1, 0, 1, 0, 1])
+    table["partial_id"] = flex.int([3, 2, 3, 2, 5, 3, 3])
+    table["value"] = flex.double([0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7])
+
+    groups = table.group_by("partial_id")
+    assert len(groups) == 3
+    assert list(groups.sizes) == [2, 4, 1]
+    assert list(groups.first) == [1, 0, 4]
+    assert sorted(groups.others) == [2, 3, 5, 6]
+    # Summed in table order within each group
+    values = table["value"].as_numpy_array()
+    assert list(groups.sum(values)) == [0.2 + 0.4, 0.1 + 0.3 + 0.6 + 0.7, 0.5]
+    mean, total_weight = groups.weighted_mean(values, values)
+    assert list(total_weight) == list(groups.sum(values))
+    assert mean[2] == pytest.approx(0.5)
+
+    groups = table.group_by(
+        ["id", "partial_id"], selection=flex.size_t([0, 1, 2, 3, 5])
+    )
+    assert list(groups.sizes) == [2, 1, 2]
+    assert list(groups.first) == [1, 5, 0]
+
+    groups = groups.select(groups.sizes > 1)
+    assert list(groups.first) == [1, 0]
+    assert list(groups.others) == [3, 2]
+    assert list(groups.sum(values)) == [0.2 + 0.4, 0.1 + 0.3]
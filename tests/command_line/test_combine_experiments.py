@@ -463,3 +463,80 @@ def test_combine_imagesets(dials_data, tmp_path):
     expts2 = combine_experiments_no_reflections(params, list_of_elists)
     assert len(expts2) == 4
     assert expts2.identifiers() == expts.identifiers()
+
+
+def _reference_combined_rows(experiment_lists, reflection_tables):
+    """The (row, id, imageset_id) of each combined reflection, in the order of
+    the original implementation of combine_experiments, which selected the
+    reflections of each experiment in turn."""
+    imagesets = []
+    combined = []
+    global_id = 0
+    for refs, exps in zip(reflection_tables, experiment_lists):
+        ids = list(refs["id"])
+        imageset_ids = list(refs["imageset_id"])
+        rows = list(refs["row"])
+        imageset_map = {}
+        for i, expt in enumerate(exps):
+            if expt.imageset not in imagesets:
+                imagesets.append(expt.imageset)
+            new_imageset_id = imagesets.index(expt.imageset)
+            imageset_map[exps.imagesets().index(expt.imageset)] = new_imageset_id
+            combined.extend(
+                (row, global_id, new_imageset_id)
+                for row, id_ in zip(rows, ids)
+                if id_ == i
+            )
+            global_id += 1
+        unindexed = [j for j, id_ in enumerate(ids) if id_ == -1]
+        for old_id in sorted({imageset_ids[j] for j in unindexed}):
+            combined.extend(
+                (rows[j], -1, imageset_map[old_id])
+                for j in unindexed
+                if imageset_ids[j] == old_id
+            )
+    return combined
+
+
+def test_combine_imagesets_reflection_order(dials_data):
+    data = dials_data("l_cysteine_dials_output", pathlib=True)
+
+    def load_inputs():
+        return (
+            [
+                load.experiment_list(f, check_format=False)
+                for f in sorted(data.glob("*_integrated_experiments.json"))
+            ],
+            [
+                flex.reflection_table.from_file(f)
+                for f in sorted(data.glob("*_integrated.pickle"))
+            ],
+        )
+
+    params = phil_scope.extract()
+    # Make the first input one with two experiments and imagesets
+    list_of_elists, list_of_tables = load_inputs()
+    first = combine_experiments(params, list_of_elists[:2], list_of_tables[:2])
+    list_of_elists, list_of_tables = load_inputs()
+    list_of_elists = [first[0], *list_of_elists[2:]]
+    list_of_tables = [first[1], *list_of_tables[2:]]
+    assert len(list_of_elists[0].imagesets()) == 2
+    assert set(list_of_tables[0]["imageset_id"]) == {0, 1}
+
+    # Shuffle the reflections, so that the experiments are interleaved, and
+    # label each row to follow it through combining
+    flex.set_random_seed(0)
+    offset = 0
+    for i, table in enumerate(list_of_tables):
+        table = table.select(flex.random_permutation(len(table)))
+        table["row"] = flex.int(range(offset, offset + len(table)))
+        offset += len(table)
+        list_of_tables[i] = table
+    expected = _reference_combined_rows(list_of_elists, list_of_tables)
+
+    expts, refls = combine_experiments(params, list_of_elists, list_of_tables)
+    assert list(zip(refls["row"], refls["id"], refls["imageset_id"])) == expected
+    # The unindexed reflections of every imageset are kept and remapped
+    unindexed = refls.select(refls["id"] == -1)
+    assert set(unindexed["imageset_id"]) == {0, 1, 2, 3}
+    assert list(expts.identifiers()) == list(refls.experiment_identifiers().values())
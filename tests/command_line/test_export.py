@@ -1,6 +1,9 @@
 from __future__ import annotations
 
+import bz2
+import gzip
 import json
+import lzma
 import os
 import shutil
 import subprocess
@@ -406,6 +409,30 @@ def test_xds_ascii(dials_data, tmp_path):
             assert psi == pytest.approx(psi_values[hkl], abs=0.1)
 
 
+@pytest.mark.parametrize("compress", ["gz", "bz2", "xz"])
+@pytest.mark.parametrize("fmt", ["xds_ascii", "sadabs"])
+def test_export_compressed(dials_data, tmp_path, fmt, compress):
+    hklout = {"xds_ascii": "DIALS.HKL", "sadabs": "integrated.sad"}[fmt]
+    for args in ([], [f"{fmt}.compress={compress}"]):
+        result = subprocess.run(
+            [
+                shutil.which("dials.export"),
+                "intensity=sum",
+                f"format={fmt}",
+                dials_data("centroid_test_data", pathlib=True) / "experiments.json",
+                dials_data("centroid_test_data", pathlib=True) / "integrated.pickle",
+            ]
+            + args,
+            cwd=tmp_path,
+            capture_output=True,
+        )
+        assert not result.returncode and not result.stderr
+
+    open_fn = {"gz": gzip.open, "bz2": bz2.open, "xz": lzma.open}[compress]
+    with open_fn(tmp_path / f"{hklout}.{compress}", "rt") as fh:
+        assert fh.read() == (tmp_path / hklout).read_text()
+
+
 def test_sadabs(dials_data, tmp_path):
     # Call dials.export
     result = subprocess.run(
@@ -4,6 +4,7 @@
 import pickle
 import shutil
 import subprocess
+import time
 from pathlib import Path
 
 import pytest
@@ -50,6 +51,116 @@ def test_find_spots_from_images(dials_data, tmp_path):
     )
 
 
+def _assert_same_spots(reflections, expected):
+    """Check that two spot finding runs found identical spots."""
+    assert reflections.size() == expected.size()
+    assert list(reflections["bbox"]) == list(expected["bbox"])
+    assert list(reflections["xyzobs.px.value"]) == list(expected["xyzobs.px.value"])
+    for shoebox, expected_shoebox in zip(reflections["shoebox"], expected["shoebox"]):
+        assert shoebox.mask.all_eq(expected_shoebox.mask)
+        assert shoebox.data.all_eq(expected_shoebox.data)
+
+
+def test_find_spots_pipeline(dials_data, tmp_path):
+    images = list(dials_data("centroid_test_data", pathlib=True).glob("centroid*.cbf"))
+    for nproc, pipeline in ((3, True), (1, False)):
+        result = subprocess.run(
+            [
+                shutil.which("dials.find_spots"),
+                f"nproc={nproc}",
+                f"spotfinder.mp.pipeline={pipeline}",
+                f"output.reflections=spotfinder_{nproc}.refl",
+                "output.shoeboxes=True",
+                "algorithm=dispersion",
+            ]
+            + images,
+            cwd=tmp_path,
+            capture_output=True,
+        )
+        assert not result.returncode and not result.stderr
+    reflections = flex.reflection_table.from_file(tmp_path / "spotfinder_3.refl")
+    _check_expected_results(reflections)
+
+    # The threaded pipeline finds exactly the same spots as a serial run
+    _assert_same_spots(
+        reflections, flex.reflection_table.from_file(tmp_path / "spotfinder_1.refl")
+    )
+
+
+def test_find_spots_watch(dials_data, tmp_path):
+    images = sorted(
+        dials_data("centroid_test_data", pathlib=True).glob("centroid*.cbf")
+    )
+    for image in images:
+        shutil.copy(image, tmp_path)
+    subprocess.run(
+        [shutil.which("dials.import"), "centroid_*.cbf"],
+        cwd=tmp_path,
+        capture_output=True,
+    )
+    # Simulate a data collection in progress, with the last images yet to appear
+    for image in images[-3:]:
+        (tmp_path / image.name).unlink()
+
+    process = subprocess.Popen(
+        [
+            shutil.which("dials.find_spots"),
+            "nproc=4",
+            "imported.expt",
+            "spotfinder.watch.enable=True",
+            "spotfinder.watch.poll_interval=0.1",
+            "output.partial_reflections=partial.refl",
+            "output.partial_interval=2",
+            "output.shoeboxes=True",
+            "algorithm=dispersion",
+        ],
+        cwd=tmp_path,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    # Wait until the available images have been processed, so that the process
+    # is waiting for the rest
+    deadline = time.monotonic() + 120
+    partial_file = tmp_path / "partial.refl"
+    while True:
+        assert process.poll() is None
+        if partial_file.is_file():
+            partial = flex.reflection_table.from_file(partial_file)
+            if flex.max(partial["xyzobs.px.value"].parts()[2]) > len(images) - 4:
+                break
+        assert time.monotonic() < deadline, "Timed out waiting for partial results"
+        time.sleep(0.1)
+    for image in images[-3:]:
+        shutil.copy(image, tmp_path)
+    stdout, stderr = process.communicate(timeout=120)
+    assert not process.returncode and not stderr
+    assert b"Image 9:" in stdout
+
+    # The final result is the same as serial spot finding on the complete data,
+    # although the watched images were thresholded in concurrent threads
+    reflections = flex.reflection_table.from_file(tmp_path / "strong.refl")
+    _check_expected_results(reflections)
+    result = subprocess.run(
+        [
+            shutil.which("dials.find_spots"),
+            "nproc=1",
+            "imported.expt",
+            "output.reflections=serial.refl",
+            "output.shoeboxes=True",
+            "algorithm=dispersion",
+        ],
+        cwd=tmp_path,
+        capture_output=True,
+    )
+    assert not result.returncode and not result.stderr
+    _assert_same_spots(
+        reflections, flex.reflection_table.from_file(tmp_path / "serial.refl")
+    )
+    partial = flex.reflection_table.from_file(tmp_path / "partial.refl")
+    assert partial.size()
+    assert flex.max(partial["xyzobs.px.value"].parts()[2]) > 8
+
+
 def test_find_spots_from_images_override_maximum(dials_data, tmp_path):
     result = subprocess.run(
         [
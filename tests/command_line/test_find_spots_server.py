@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import http.client
+import http.server
+import json
+import threading
+
+import pytest
+
+from dials.command_line import find_spots_client, find_spots_server
+
+
+@pytest.fixture
+def server():
+    httpd = http.server.HTTPServer(("localhost", 0), find_spots_server.handler)
+    thread = threading.Thread(target=httpd.serve_forever)
+    thread.start()
+    yield httpd.server_address
+    httpd.shutdown()
+    thread.join()
+    httpd.server_close()
+
+
+@pytest.fixture
+def images(dials_data):
+    return [
+        str(p)
+        for p in sorted(dials_data("centroid_test_data", pathlib=True).glob("*.cbf"))
+    ][:3]
+
+
+def test_batch_request(server, images):
+    host, port = server
+    params = []
+    responses = find_spots_client.work_batch(host, port, images, params)
+    assert len(responses) == len(images)
+    for filename, response in zip(images, responses):
+        d = json.loads(response)
+        assert d == json.loads(find_spots_client.work(host, port, filename, params))
+        assert d["image"] == filename
+        assert d["n_spots_total"] > 0
+
+
+def test_batch_request_error(server, images):
+    host, port = server
+    # A missing image is reported in its own result, without failing the batch
+    responses = find_spots_client.work_batch(
+        host, port, [images[0], "/no/such/image.cbf"], []
+    )
+    assert "n_spots_total" in json.loads(responses[0])
+    assert "error" in json.loads(responses[1])
+
+    # A malformed request is rejected
+    conn = http.client.HTTPConnection(host, port)
+    conn.request("POST", "/", json.dumps({"params": []}))
+    response = conn.getresponse()
+    assert response.status == 400
+    assert "error" in json.loads(response.read())
+
+
+def test_client_batch_size(server, images, capsys):
+    host, port = server
+    find_spots_client.work_all(host, port, images, [], nproc=2, batch_size=1)
+    expected = capsys.readouterr().out
+    find_spots_client.work_all(host, port, images, [], nproc=2, batch_size=2)
+    assert capsys.readouterr().out == expected
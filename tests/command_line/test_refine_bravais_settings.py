@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import copy
 import json
+import logging
 import os
 import shutil
 import subprocess
@@ -11,7 +13,12 @@
 from cctbx import sgtbx, uctbx
 from dxtbx.serialize import load
 
+from dials.algorithms.indexing.bravais_settings import (
+    refined_settings_from_refined_triclinic,
+)
+from dials.array_family import flex
 from dials.command_line import refine_bravais_settings
+from dials.util.options import ArgumentParser
 
 
 def test_refine_bravais_settings_i04_weak_data(dials_data, tmp_path):
@@ -298,3 +305,37 @@ def test_refine_bravais_settings_non_primitive_input(dials_data, tmp_path):
         )
         uc_ref = uctbx.unit_cell(bravais_summary[f"{i+1}"]["unit_cell"])
         assert uc_input_to_ref.is_similar_to(uc_ref)
+
+
+def test_refined_settings_nproc(dials_data, caplog):
+    # Refining the settings in worker processes gives the same results as nproc=1
+    data_dir = dials_data("i04_weak_data", pathlib=True)
+    experiments = load.experiment_list(
+        data_dir / "experiments.json", check_format=False
+    )
+    reflections = flex.reflection_table.from_file(data_dir / "indexed.pickle")
+    reflections = refine_bravais_settings.eliminate_sys_absent(experiments, reflections)
+    parser = ArgumentParser(phil=refine_bravais_settings.phil_scope)
+    params, _ = parser.parse_args(
+        args=[
+            "reflections_per_degree=5",
+            "minimum_sample_size=500",
+            "beam.fix=all",
+            "detector.fix=all",
+        ]
+    )
+
+    results = {}
+    for nproc in (1, 2):
+        params.nproc = nproc
+        caplog.clear()
+        with caplog.at_level(logging.INFO):
+            results[nproc] = refined_settings_from_refined_triclinic(
+                experiments, reflections, copy.deepcopy(params)
+            ).as_dict()
+        # The refinement time of each setting is reported
+        assert "Refined 9 settings in" in caplog.text
+        assert f"with nproc={nproc}" in caplog.text
+        assert "Time (s)" in caplog.text
+    assert len(results[1]) == 9
+    assert results[2] == results[1]
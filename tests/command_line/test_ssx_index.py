@@ -13,7 +13,8 @@
 from dials.command_line.ssx_index import run
 
 
-def test_ssx_index_reference_geometry(dials_data, tmp_path):
+@pytest.mark.parametrize("nproc", [1, 2])
+def test_ssx_index_reference_geometry(dials_data, tmp_path, nproc):
     ssx = dials_data("cunir_serial_processed", pathlib=True)
     expts = ssx / "imported_with_ref_5.expt"
     refls = ssx / "strong_5.refl"
@@ -25,6 +26,7 @@ def test_ssx_index_reference_geometry(dials_data, tmp_path):
             refls,
             "output.nuggets=nuggets",
             "min_spots=72",
+            f"nproc={nproc}",
         ],
         cwd=tmp_path,
         capture_output=True,
@@ -12,6 +12,7 @@
 from dials.array_family import flex
 from dials.command_line.ssx_integrate import run_integration, working_phil
 from dials.util.options import ArgumentParser
+from dials.util.table_as_hdf5_file import HDF5TableFile
 
 # Note that tests are grouped and run serially, to stop many processes trying to
 # extract data from images at same time, which appears to lead to race
@@ -49,6 +50,40 @@ def test_ssx_integrate_fullprocess(dials_data, tmp_path):
         assert tmp_path.joinpath(f"nuggets/nugget_integrated_{i}.json").is_file()
 
 
+@pytest.mark.xdist_group(name="group1")
+def test_ssx_integrate_stream(dials_data, tmp_path):
+    ssx = dials_data("cunir_serial_processed", pathlib=True)
+    dials_data("cunir_serial", pathlib=True)
+    result = subprocess.run(
+        [
+            shutil.which("dials.ssx_integrate"),
+            ssx / "indexed.refl",
+            ssx / "indexed.expt",
+            "nproc=1",
+            "batch_size=3",
+            "output.stream=True",
+            "algorithm=stills",
+        ],
+        cwd=tmp_path,
+        capture_output=True,
+    )
+    assert not result.returncode and not result.stderr
+    assert not tmp_path.joinpath("integrated_1.refl").is_file()
+
+    # All batches are written to a single table
+    experiments = load.experiment_list(tmp_path / "integrated.expt", check_format=False)
+    reflections = flex.reflection_table.from_file(tmp_path / "integrated.refl")
+    assert reflections.size()
+    assert set(reflections["id"]) == set(range(len(experiments)))
+    assert dict(reflections.experiment_identifiers()) == {
+        i: expt.identifier for i, expt in enumerate(experiments)
+    }
+    with HDF5TableFile(tmp_path / "integrated.refl", "r") as handle:
+        batches = list(handle.iter_batches())
+    assert len(batches) == 2
+    assert sum(batch.size() for batch in batches) == reflections.size()
+
+
 expected_simple1 = {
     "likelihood": 171374.174649,
     "mosaicity": [0.0003630],
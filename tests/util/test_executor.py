@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+import functools
+import os
+import queue
+import sys
+import threading
+import types
+
+import pytest
+
+from libtbx.utils import Abort
+
+from dials.util.executor import futures_initializer, process_items
+
+
+class _Worker:
+    """Record the items processed by each worker, failing on some items."""
+
+    def __init__(self, directory, rank):
+        self.directory = directory
+        self.rank = rank
+
+    def process(self, item):
+        if item < 0:
+            raise ValueError(f"Bad item {item}")
+        if item == 100:
+            raise Abort("Bad input")
+        if item == 7:
+            # Fail the first time only
+            marker = self.directory / "seen_7"
+            if not marker.exists():
+                marker.touch()
+                raise RuntimeError("Transient failure")
+        if item == 9 and not (self.directory / "crashed_9").exists():
+            # Exit the worker process the first time only
+            (self.directory / "crashed_9").touch()
+            os._exit(1)
+        # Record each item with a separate file, so that the items processed
+        # are known even if the worker exits
+        (self.directory / f"processed_{item}_{os.getpid()}").touch()
+
+    def finalize(self):
+        (self.directory / f"finalized_{os.getpid()}_{self.rank}").touch()
+
+
+def _processed(directory):
+    processed = sorted(
+        int(path.name.split("_")[1]) for path in directory.glob("processed_*")
+    )
+    return processed, len(list(directory.glob("finalized_*")))
+
+
+@pytest.mark.parametrize("batch_size", [1, 3])
+def test_process_items_multiprocessing(batch_size, tmp_path):
+    items = [-1, *range(20)]
+    failed = process_items(
+        functools.partial(_Worker, tmp_path),
+        items,
+        method="multiprocessing",
+        nproc=3,
+        batch_size=batch_size,
+        max_retries=1,
+    )
+    assert failed == [(-1, "ValueError: Bad item -1")]
+    processed, n_finalized = _processed(tmp_path)
+    # Items in the batch of the worker which exited may be processed again
+    assert sorted(set(processed)) == list(range(20))
+    # The worker which exited was not finalized
+    assert n_finalized == 2
+
+
+def test_process_items_serial(tmp_path):
+    (tmp_path / "crashed_9").touch()
+    failed = process_items(
+        functools.partial(_Worker, tmp_path), [-1, *range(10)], max_retries=2
+    )
+    assert failed == [(-1, "ValueError: Bad item -1")]
+    assert _processed(tmp_path) == (list(range(10)), 1)
+
+    # Without retries, the transient failure is not retried
+    for path in tmp_path.iterdir():
+        path.unlink()
+    (tmp_path / "crashed_9").touch()
+    failed = process_items(functools.partial(_Worker, tmp_path), range(10))
+    assert failed == [(7, "RuntimeError: Transient failure")]
+    assert _processed(tmp_path)[0] == [0, 1, 2, 3, 4, 5, 6, 8, 9]
+
+
+def test_process_items_futures(tmp_path):
+    (tmp_path / "crashed_9").touch()
+    with concurrent.futures.ProcessPoolExecutor(max_workers=2) as executor:
+        failed = process_items(
+            functools.partial(_Worker, tmp_path),
+            [-1, *range(10)],
+            method="futures",
+            batch_size=4,
+            max_retries=1,
+            executor=executor,
+        )
+    assert failed == [(-1, "ValueError: Bad item -1")]
+    processed, n_finalized = _processed(tmp_path)
+    assert processed == list(range(10))
+    # One worker for each batch, including those retrying the two failures
+    assert 4 <= n_finalized <= 5
+
+
+def test_process_items_futures_initializer(tmp_path):
+    (tmp_path / "crashed_9").touch()
+    with concurrent.futures.ProcessPoolExecutor(
+        max_workers=2,
+        initializer=futures_initializer,
+        initargs=(functools.partial(_Worker, tmp_path),),
+    ) as executor:
+        failed = process_items(
+            None, [-1, *range(10)], method="futures", batch_size=4, executor=executor
+        )
+    assert failed == [
+        (-1, "ValueError: Bad item -1"),
+        (7, "RuntimeError: Transient failure"),
+    ]
+    assert _processed(tmp_path)[0] == [0, 1, 2, 3, 4, 5, 6, 8, 9]
+
+
+@pytest.mark.parametrize("method", ["serial", "multiprocessing", "futures"])
+def test_process_items_user_error(method, tmp_path):
+    # A user error stops processing, and is not retried or counted as a failed item
+    (tmp_path / "crashed_9").touch()
+    kwargs = {"method": method, "max_retries": 2}
+    with contextlib.ExitStack() as stack:
+        if method == "multiprocessing":
+            kwargs["nproc"] = 2
+        elif method == "futures":
+            kwargs["executor"] = stack.enter_context(
+                concurrent.futures.ProcessPoolExecutor(max_workers=2)
+            )
+        with pytest.raises(Abort, match="Bad input"):
+            process_items(
+                functools.partial(_Worker, tmp_path), [0, 1, 100, 2], **kwargs
+            )
+
+
+class _FakeStatus:
+    def Set_source(self, source):
+        self.source = source
+
+    def Get_source(self):
+        return self.source
+
+
+class _FakeComm:
+    """An MPI communicator for ranks which are threads of this process."""
+
+    def __init__(self, rank, queues):
+        self.rank = rank
+        self.queues = queues
+
+    def Get_rank(self):
+        return self.rank
+
+    def Get_size(self):
+        return len(self.queues)
+
+    def send(self, message, dest, tag):
+        self.queues[dest].put((self.rank, tag, message))
+
+    def recv(self, source, tag, status=None):
+        # Fail rather than hang if a message never arrives
+        source, message_tag, message = self.queues[self.rank].get(timeout=60)
+        assert message_tag == tag
+        if status is not None:
+            status.Set_source(source)
+        return message
+
+    def Abort(self, errorcode):
+        raise RuntimeError(f"Aborted with {errorcode}")
+
+
+def test_process_items_mpi_worker_error(monkeypatch, tmp_path):
+    # A worker rank which fails outside process(item) has its batch retried by
+    # the other workers, rather than leaving rank 0 waiting for it forever
+    monkeypatch.setitem(
+        sys.modules,
+        "mpi4py",
+        types.SimpleNamespace(
+            MPI=types.SimpleNamespace(ANY_SOURCE=-1, Status=_FakeStatus)
+        ),
+    )
+    (tmp_path / "crashed_9").touch()
+    rank_2_failed = threading.Event()
+
+    def factory(rank):
+        if rank == 2:
+            rank_2_failed.set()
+            raise RuntimeError("Bad worker")
+        # Keep the items pending until rank 2 has been given a batch
+        assert rank_2_failed.wait(timeout=60)
+        return _Worker(tmp_path, rank)
+
+    queues = [queue.Queue() for _ in range(3)]
+
+    def run(rank):
+        return process_items(
+            factory,
+            [-1, *range(10)],
+            method="mpi",
+            max_retries=1,
+            comm=_FakeComm(rank, queues),
+        )
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+        workers = [pool.submit(run, rank) for rank in (1, 2)]
+        failed = run(0)
+        assert [worker.result() for worker in workers] == [[], []]
+    assert failed == [(-1, "ValueError: Bad item -1")]
+    processed, n_finalized = _processed(tmp_path)
+    assert processed == list(range(10))
+    # The worker on rank 2 was not finalized
+    assert n_finalized == 2
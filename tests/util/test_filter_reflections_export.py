@@ -704,6 +704,22 @@ def test_sum_partial_reflections():
     assert list(r["identifier"]) == [1, 3, 5]
     assert list(r["partiality"]) == [0.9, 0.8, 0.9]
 
+    # partials are only summed within a dataset if requested
+    r = flex.reflection_table()
+    r["intensity.sum.value"] = flex.double([1.0, 2.0, 3.0, 4.0, 5.0])
+    r["intensity.sum.variance"] = flex.double([1.0, 1.0, 1.0, 1.0, 1.0])
+    r["partial_id"] = flex.int([0, 0, 0, 1, 1])
+    r["id"] = flex.int([0, 1, 0, 1, 1])
+    r["partiality"] = flex.double([0.5, 0.4, 0.3, 0.2, 0.1])
+    r["identifier"] = flex.int([1, 2, 3, 4, 5])
+    r2 = sum_partial_reflections(r.copy(), by_dataset=True)
+    assert list(r2["identifier"]) == [1, 2, 4]
+    assert list(r2["intensity.sum.value"]) == [4.0, 2.0, 9.0]
+    assert list(r2["partiality"]) == pytest.approx([0.8, 0.4, 0.3])
+    r2 = sum_partial_reflections(r)
+    assert list(r2["identifier"]) == [1, 4]
+    assert list(r2["intensity.sum.value"]) == [6.0, 9.0]
+
     # if all partiality of one - should just return same
     r = flex.reflection_table()
     r["intensity.scale.value"] = flex.double([1.0, 2.0, 3.0])
@@ -6,6 +6,7 @@
 import subprocess
 from pathlib import Path
 
+import numpy as np
 import pytest
 
 import libtbx
@@ -15,6 +16,7 @@
 import dials.util.masking
 from dials.algorithms.shadowing.filter import filter_shadowed_reflections
 from dials.array_family import flex
+from dials.util import Sorry
 
 
 @pytest.mark.parametrize(
@@ -108,7 +110,7 @@ def test_filter_shadowed_reflections(dials_regression: Path):
         dials_regression, "shadow_test_data", "DLS_I04_SmarGon", "experiments.json"
     )
     predicted_pickle = os.path.join(
-        dials_regression, "shadow_test_data", "DLS_I04_SmarGon", "predicted.pickle"
+        dials_regression, "shadow_test_data", "DLS_I04_SmarGon", "predicted.npz"
     )
 
     experiments = load.experiment_list(experiments_json, check_format=True)
@@ -187,6 +189,120 @@ def __hash__(self):
     assert fun.cache_info() == (1, 1, 1, 1)
 
 
+def test_lru_equality_cache_key():
+    callargs = []
+
+    def _callappend(*arg):
+        callargs.append(arg)
+        return len(callargs)
+
+    fun = dials.util.masking.lru_equality_cache(maxsize=2, key=lambda a: a % 10)(
+        _callappend
+    )
+    assert fun(1) == 1
+    assert fun(11) == 1
+    assert fun(2) == 2
+    assert fun(3) == 3
+    # the least recently used result was evicted
+    assert fun(1) == 4
+    assert fun(13) == 3
+    assert fun.cache_info() == (2, 4, 2, 2)
+
+
+def test_mask_cache(tmp_path):
+    masks = (flex.bool(flex.grid(10, 20), True), flex.bool(flex.grid(10, 20), False))
+    cache = dials.util.masking.MaskCache(tmp_path / "cache")
+    assert cache.get("a") is None
+    cache.put("a", masks)
+    cached = cache.get("a")
+    assert len(cached) == 2
+    for m, c in zip(masks, cached):
+        assert c.all() == m.all()
+        assert c.count(True) == m.count(True)
+
+    # evict the least recently used masks to stay within the size limit
+    size = (tmp_path / "cache" / "a.npz").stat().st_size
+    cache = dials.util.masking.MaskCache(tmp_path / "cache", max_size=2.5 * size)
+    cache.put("b", masks)
+    os.utime(tmp_path / "cache" / "a.npz", (0, 0))
+    os.utime(tmp_path / "cache" / "b.npz", (1, 1))
+    assert cache.get("a") is not None
+    cache.put("c", masks)
+    assert sorted(p.name for p in (tmp_path / "cache").iterdir()) == [
+        "a.npz",
+        "c.npz",
+    ]
+
+
+def test_mask_cache_failure(tmp_path, monkeypatch, caplog):
+    masks = (flex.bool(flex.grid(10, 20), True),)
+
+    # a cache which can't be written to is ignored with a warning
+    (tmp_path / "file").touch()
+    cache = dials.util.masking.MaskCache(tmp_path / "file")
+    cache.put("a", masks)
+    assert "Unable to cache mask" in caplog.text
+    assert cache.get("a") is None
+
+    # a partly written mask is removed
+    cache = dials.util.masking.MaskCache(tmp_path / "cache")
+
+    def dump(*args, **kwargs):
+        raise OSError("No space left on device")
+
+    monkeypatch.setattr(dials.util.masking.np, "savez", dump)
+    cache.put("a", masks)
+    assert list((tmp_path / "cache").iterdir()) == []
+    monkeypatch.undo()
+
+    # temporary files left over from interrupted writes are removed on eviction
+    (tmp_path / "cache" / "old.tmp").touch()
+    os.utime(tmp_path / "cache" / "old.tmp", (0, 0))
+    (tmp_path / "cache" / "new.tmp").touch()
+    cache.put("a", masks)
+    assert sorted(p.name for p in (tmp_path / "cache").iterdir()) == [
+        "a.npz",
+        "new.tmp",
+    ]
+
+    # masks which can only be read by unpickling are ignored
+    np.savez(tmp_path / "cache" / "b.npz", np.array([{"a": 1}], dtype=object))
+    assert cache.get("b") is None
+
+
+def test_mask_cache_from_environment(tmp_path, monkeypatch):
+    monkeypatch.delenv("DIALS_MASK_CACHE", raising=False)
+    assert dials.util.masking.MaskCache.from_environment() is None
+    monkeypatch.setenv("DIALS_MASK_CACHE", str(tmp_path))
+    monkeypatch.setenv("DIALS_MASK_CACHE_SIZE", "10")
+    cache = dials.util.masking.MaskCache.from_environment()
+    assert cache.directory == str(tmp_path)
+    assert cache.max_size == 10 * 1024**2
+    monkeypatch.setenv("DIALS_MASK_CACHE_SIZE", "10GB")
+    with pytest.raises(Sorry, match="DIALS_MASK_CACHE_SIZE"):
+        dials.util.masking.MaskCache.from_environment()
+
+
+def test_generate_mask_cache(dials_data, tmp_path, monkeypatch):
+    monkeypatch.setenv("DIALS_MASK_CACHE", str(tmp_path))
+    imageset = load.imageset(
+        dials_data("centroid_test_data", pathlib=True) / "sweep.json"
+    )
+    params = dials.util.masking.phil_scope.extract()
+    params.d_min = 1.5
+    params.ice_rings.filter = True
+    mask = dials.util.masking.generate_mask(imageset, params)
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+    cached = dials.util.masking.generate_mask(imageset, params)
+    assert len(list(tmp_path.glob("*.npz"))) == 1
+    assert cached[0].count(False) == mask[0].count(False)
+    assert cached[0].all_eq(mask[0])
+
+    params.d_min = 2.0
+    dials.util.masking.generate_mask(imageset, params)
+    assert len(list(tmp_path.glob("*.npz"))) == 2
+
+
 def test_generate_mask(dials_data):
     imageset = load.imageset(
         dials_data("centroid_test_data", pathlib=True) / "sweep.json"
@@ -0,0 +1,41 @@
+from __future__ import annotations
+
+import random
+
+import numpy as np
+
+from scitbx import matrix
+
+from dials.util import matrix_arrays
+
+
+def test_matrix_arrays_match_scitbx_matrix():
+    random.seed(0)
+    n = 100
+    axis = matrix.col((0.1, 0.9, -0.2))
+    UB = matrix.sqr([random.uniform(-0.1, 0.1) for _ in range(9)])
+    hkl = np.array([[random.randint(-30, 30) for _ in range(3)] for _ in range(n)])
+    phi = np.array([random.uniform(-400, 400) for _ in range(n)])
+
+    x = matrix_arrays.rotate_around_origin(
+        matrix_arrays.multiply_column(UB, hkl), axis, phi, deg=True
+    )
+    q = matrix_arrays.normalize(matrix_arrays.multiply_row(hkl, UB.inverse()))
+    psi = matrix_arrays.angle(q, x, deg=True)
+    R = matrix_arrays.axis_and_angle_as_r3_rotation_matrix(axis, phi, deg=True)
+    RUB = matrix_arrays.multiply(R, UB)
+    s = matrix_arrays.cross(x, q)
+
+    # the results must be exactly equal, not just close
+    for j in range(n):
+        h = tuple(hkl[j].tolist())
+        x_j = (UB * h).rotate(axis, phi[j].item(), deg=True)
+        q_j = (matrix.col(h).transpose() * UB.inverse()).normalize()
+        R_j = axis.axis_and_angle_as_r3_rotation_matrix(phi[j].item(), deg=True)
+        assert tuple(x[j].tolist()) == x_j.elems
+        assert tuple(q[j].tolist()) == q_j.elems
+        assert psi[j].item() == q_j.transpose().angle(x_j, deg=True)
+        assert tuple(R[j].tolist()) == R_j.elems
+        assert tuple(RUB[j].tolist()) == (R_j * UB).elems
+        assert tuple(s[j].tolist()) == x_j.cross(q_j.transpose()).elems
+        assert matrix_arrays.dot(x, q)[j].item() == x_j.dot(q_j.transpose())
@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import concurrent.futures
+
+from dials.array_family import flex
+from dials.util.mp import initialise_worker, shared_reflections, worker_data
 from dials.util.system import CPU_COUNT
 
 
@@ -8,3 +12,24 @@ def test_available_cpus():
     # but we know there will be at least one available core, and
     # the function must return a positive integer in any case.
     assert CPU_COUNT >= 1
+
+
+def _shared_data_in_worker(key):
+    if key == "reflections":
+        return list(worker_data[key]["x"])
+    return worker_data[key]
+
+
+def test_initialise_worker_shared_reflections():
+    reflections = flex.reflection_table()
+    reflections["x"] = flex.double([1, 2, 3])
+    with shared_reflections(reflections) as shared:
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=2,
+            initializer=initialise_worker,
+            initargs=({"reflections": shared, "value": 42},),
+        ) as pool:
+            assert list(pool.map(_shared_data_in_worker, ["reflections", "value"])) == [
+                [1, 2, 3],
+                42,
+            ]
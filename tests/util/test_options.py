@@ -11,6 +11,7 @@
 import libtbx.phil
 from dxtbx.model import Experiment, ExperimentList
 
+from dials.array_family import flex
 from dials.util import Sorry
 from dials.util.options import (
     ArgumentParser,
@@ -129,3 +130,78 @@ def test_invalid_phil_raises_system_exit(capsys):
         'error: Invalid phil parameter: One True or False value expected, foo="bar" found'
         in captured.err
     )
+
+
+@pytest.mark.parametrize("use_mmap", [False, True])
+def test_reflections_load_options(tmp_path, use_mmap):
+    table = flex.reflection_table()
+    table["id"] = flex.int([0, 0, 1, 1, 2])
+    table["d"] = flex.double([1.0, 2.0, 3.0, 4.0, 5.0])
+    table["intensity.sum.value"] = flex.double([10.0, 20.0, 30.0, 40.0, 50.0])
+    table["flags"] = flex.size_t(5, 0)
+    table.set_flags(
+        flex.bool([True, False, True, True, False]),
+        flex.reflection_table.flags.indexed,
+    )
+    for i in range(3):
+        table.experiment_identifiers()[i] = str(i)
+    if use_mmap:
+        table.as_mmap_file(tmp_path / "test.refl")
+    else:
+        table.as_file(tmp_path / "test.refl")
+
+    parser = ArgumentParser(read_reflections=True)
+    params, _ = parser.parse_args(
+        args=[
+            str(tmp_path / "test.refl"),
+            "reflections_load.columns=id,intensity.sum.value",
+            "reflections_load.flags=indexed",
+            "reflections_load.experiment_ids=0,1",
+            "reflections_load.d_max=3.5",
+        ]
+    )
+    refls = params.input.reflections[0].data
+    assert list(refls.keys()) == ["id", "intensity.sum.value"]
+    assert list(refls["intensity.sum.value"]) == [10.0, 30.0]
+    assert dict(refls.experiment_identifiers()) == {0: "0", 1: "1", 2: "2"}
+
+    # Reflections given explicitly by the phil parameter are restricted too
+    params, _ = parser.parse_args(
+        args=[
+            f"input.reflections={tmp_path / 'test.refl'}",
+            "reflections_load.d_min=2.5",
+        ]
+    )
+    assert list(params.input.reflections[0].data["d"]) == [3.0, 4.0, 5.0]
+
+    # A limit of zero is applied, rather than treated as unset
+    for args in (
+        [str(tmp_path / "test.refl")],
+        [f"input.reflections={tmp_path / 'test.refl'}"],
+    ):
+        params, _ = parser.parse_args(args=args + ["reflections_load.d_max=0"])
+        assert params.input.reflections[0].data.size() == 0
+
+    # Unknown flags, including attributes of the flags which are not flags, and
+    # columns missing from the file are reported by name
+    for flag in ("foo", "names"):
+        with pytest.raises(Sorry, match=f"Unknown reflection table flag.*: {flag}"):
+            parser.parse_args(
+                args=[str(tmp_path / "test.refl"), f"reflections_load.flags={flag}"]
+            )
+    del table["d"]
+    if use_mmap:
+        table.as_mmap_file(tmp_path / "no_d.refl")
+    else:
+        table.as_file(tmp_path / "no_d.refl")
+    with pytest.raises(Sorry, match="Column d needed by reflections_load"):
+        parser.parse_args(
+            args=[
+                f"input.reflections={tmp_path / 'no_d.refl'}",
+                "reflections_load.d_min=2",
+            ]
+        )
+    with pytest.raises(Sorry, match="missing column d"):
+        parser.parse_args(
+            args=[str(tmp_path / "no_d.refl"), "reflections_load.d_min=2"]
+        )
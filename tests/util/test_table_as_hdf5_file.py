@@ -3,9 +3,10 @@
 import os
 
 import h5py
+import pytest
 
 from dials.array_family import flex
-from dials.util.table_as_hdf5_file import HDF5TableFile
+from dials.util.table_as_hdf5_file import HDF5TableFile, HDF5TableStreamWriter
 
 
 def test_table_as_hdf5_file_no_sbox(dials_data, tmp_path):
@@ -56,3 +57,57 @@ def simple_test_equal(t1, t2):
 
     simple_test_equal(tables[0], split[0])
     simple_test_equal(tables[1], split[1])
+
+
+def test_table_as_hdf5_stream_writer(dials_data, tmp_path):
+    data = dials_data("l_cysteine_4_sweeps_scaled", pathlib=True) / "scaled_20_25.refl"
+    table = flex.reflection_table.from_file(data)
+    split = table.split_by_experiment_id()
+
+    # Write the data in several batches, including an empty one
+    batches = [split[0][:1000], split[0][1000:], split[1][:0], split[1]]
+    with HDF5TableStreamWriter(tmp_path / "streamed.refl", chunk_size=512) as writer:
+        for batch in batches:
+            writer.append(batch)
+
+    data = h5py.File(tmp_path / "streamed.refl", "r")
+    dset = data["dials"]["processing"]["group_0"]
+    assert dset["intensity.sum.value"].shape == (table.size(),)
+    assert dset["intensity.sum.value"].chunks == (512,)
+    assert list(dset.attrs["batch_offsets"]) == [0, 1000, 4417, 4417, 9972]
+
+    # The whole file can be read as a single table
+    expected = flex.reflection_table()
+    for batch in batches:
+        expected.extend(batch)
+    streamed = flex.reflection_table.from_file(tmp_path / "streamed.refl")
+    assert streamed.size() == expected.size()
+    assert list(streamed.keys()) == list(expected.keys())
+    assert list(streamed["intensity.sum.value"]) == list(
+        expected["intensity.sum.value"]
+    )
+    assert list(streamed["miller_index"]) == list(expected["miller_index"])
+    assert dict(streamed.experiment_identifiers()) == dict(
+        table.experiment_identifiers()
+    )
+
+    # Or batch by batch
+    with HDF5TableFile(tmp_path / "streamed.refl", "r") as handle:
+        read_batches = list(handle.iter_batches())
+    assert len(read_batches) == len(batches)
+    for batch, read_batch in zip(batches, read_batches):
+        assert read_batch.size() == batch.size()
+        if batch.size():
+            assert list(read_batch["intensity.sum.value"]) == list(
+                batch["intensity.sum.value"]
+            )
+            assert dict(read_batch.experiment_identifiers()) == dict(
+                batch.experiment_identifiers()
+            )
+
+    # Tables with different columns cannot be appended
+    with HDF5TableStreamWriter(tmp_path / "bad.refl") as writer:
+        writer.append(split[0])
+        del split[1]["intensity.sum.value"]
+        with pytest.raises(ValueError):
+            writer.append(split[1])
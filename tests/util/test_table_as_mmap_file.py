@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from dials.array_family import flex
+from dials.util import table_as_mmap_file
+from dials.util.table_as_mmap_file import (
+    ALIGNMENT,
+    MappedReflectionTable,
+    is_mmap_table_file,
+)
+
+
+def test_table_as_mmap_file_round_trip(dials_data, tmp_path):
+    data = dials_data("l_cysteine_4_sweeps_scaled", pathlib=True) / "scaled_20_25.refl"
+    table = flex.reflection_table.from_file(data)
+
+    table.as_mmap_file(tmp_path / "scaled.refl")
+    assert is_mmap_table_file(tmp_path / "scaled.refl")
+    assert not is_mmap_table_file(data)
+
+    # Lossless round trip compared to the msgpack format
+    new_table = flex.reflection_table.from_file(tmp_path / "scaled.refl")
+    assert list(new_table.keys()) == list(table.keys())
+    assert dict(new_table.experiment_identifiers()) == dict(
+        table.experiment_identifiers()
+    )
+    for key in table.keys():
+        assert list(new_table[key]) == list(table[key]), key
+    assert new_table.as_msgpack() == table.as_msgpack()
+
+    os.environ["DIALS_USE_MMAP"] = "1"
+    try:
+        table.as_file(tmp_path / "scaled2.refl")
+    finally:
+        del os.environ["DIALS_USE_MMAP"]
+    assert is_mmap_table_file(tmp_path / "scaled2.refl")
+
+
+def test_mapped_reflection_table_lazy_columns(tmp_path):
+    table = flex.reflection_table()
+    table["id"] = flex.int([0, 0, 1, 1])
+    table["flags"] = flex.size_t([1, 2, 4, 8])
+    table["intensity.sum.value"] = flex.double([1.0, 2.0, 3.0, 4.0])
+    table["miller_index"] = flex.miller_index(
+        [(1, 0, 0), (0, 1, 0), (0, 0, 1), (1, 1, 1)]
+    )
+    table["bbox"] = flex.int6([(0, 1, 0, 1, 0, 1)] * 4)
+    table["label"] = flex.std_string(["a", "bc", "", "déf"])
+    table.experiment_identifiers()[0] = "abc"
+    table.experiment_identifiers()[1] = "def"
+    table.as_mmap_file(tmp_path / "test.refl")
+
+    with flex.reflection_table.open_mmap_file(tmp_path / "test.refl") as mapped:
+        assert isinstance(mapped, MappedReflectionTable)
+        assert len(mapped) == 4
+        assert mapped.keys() == list(table.keys())
+        assert "flags" in mapped
+        assert mapped.experiment_identifiers() == {0: "abc", 1: "def"}
+        assert mapped.column_type("miller_index") == "miller_index"
+        # Nothing is decoded until a column is accessed
+        assert not mapped._cache
+        assert list(mapped["flags"]) == [1, 2, 4, 8]
+        assert list(mapped._cache) == ["flags"]
+        assert mapped.buffer("intensity.sum.value").ctypes.data % ALIGNMENT == 0
+        assert list(mapped["label"]) == ["a", "bc", "", "déf"]
+        with pytest.raises(KeyError):
+            mapped["xyzobs.px.value"]
+
+        subset = mapped.as_reflection_table(["id", "intensity.sum.value"])
+        assert list(subset.keys()) == ["id", "intensity.sum.value"]
+        assert dict(subset.experiment_identifiers()) == {0: "abc", 1: "def"}
+
+    subset = flex.reflection_table.from_mmap_file(
+        tmp_path / "test.refl", columns=["bbox", "miller_index"]
+    )
+    assert subset.size() == 4
+    assert list(subset["bbox"]) == list(table["bbox"])
+    assert list(subset["miller_index"]) == list(table["miller_index"])
+
+    # Empty tables round trip
+    flex.reflection_table().as_mmap_file(tmp_path / "empty.refl")
+    empty = flex.reflection_table.from_file(tmp_path / "empty.refl")
+    assert empty.size() == 0
+    assert list(empty.keys()) == []
+
+
+def test_mapped_reflection_table_row_filter(tmp_path):
+    table = flex.reflection_table()
+    table["id"] = flex.int([0, 1, 1, 2])
+    table["d"] = flex.double([1.0, 2.0, 3.0, 4.0])
+    table["flags"] = flex.size_t([1, 3, 2, 3])
+    table["label"] = flex.std_string(["a", "b", "c", "d"])
+    table["xyzobs.px.value"] = flex.vec3_double([(i, i, i) for i in range(4)])
+    table.as_mmap_file(tmp_path / "test.refl")
+
+    row_filter = flex.reflection_table_row_filter(flags=1, ids=[1, 2], d_max=3.5)
+    assert row_filter.columns == ["flags", "id", "d"]
+    subset = flex.reflection_table.from_file(
+        tmp_path / "test.refl",
+        columns=["label", "xyzobs.px.value"],
+        row_filter=row_filter,
+    )
+    assert list(subset.keys()) == ["label", "xyzobs.px.value"]
+    assert list(subset["label"]) == ["b"]
+    assert list(subset["xyzobs.px.value"]) == [(1, 1, 1)]
+
+    # The same filter applied to a materialised table gives the same selection
+    assert list(row_filter(table)) == [False, True, False, False]
+
+    with pytest.raises(KeyError):
+        flex.reflection_table.from_file(
+            tmp_path / "test.refl",
+            row_filter=flex.reflection_table_row_filter(flags=1),
+            columns=["foo"],
+        )
+
+
+def test_mapped_reflection_table_compression(monkeypatch, tmp_path):
+    # Use a small block size so that columns are split across several blocks
+    monkeypatch.setattr(table_as_mmap_file, "BLOCK_SIZE", 1000)
+    n = 5000
+    table = flex.reflection_table()
+    table["id"] = flex.int(n, 0)
+    table["d"] = flex.double(range(n))
+    table["xyzobs.px.value"] = flex.vec3_double([(i, i + 1, i + 2) for i in range(n)])
+    table["label"] = flex.std_string([str(i) for i in range(n)])
+    table.experiment_identifiers()[0] = "abc"
+
+    table.as_mmap_file(tmp_path / "compressed.refl", compression="zlib", nproc=4)
+    table.as_mmap_file(tmp_path / "uncompressed.refl")
+    assert (tmp_path / "compressed.refl").stat().st_size < (
+        tmp_path / "uncompressed.refl"
+    ).stat().st_size
+
+    with MappedReflectionTable(tmp_path / "compressed.refl", nproc=4) as mapped:
+        assert list(mapped["d"]) == list(table["d"])
+        assert list(mapped["xyzobs.px.value"]) == list(table["xyzobs.px.value"])
+        assert list(mapped["label"]) == list(table["label"])
+
+    subset = flex.reflection_table.from_file(
+        tmp_path / "compressed.refl",
+        row_filter=flex.reflection_table_row_filter(d_min=4990),
+    )
+    assert list(subset["d"]) == list(range(4990, 5000))
+    assert dict(subset.experiment_identifiers()) == {0: "abc"}
+
+    # A resolution range decompresses the d column once
+    decompressed = []
+    decompress = MappedReflectionTable._decompress
+
+    def counting_decompress(self, info, dtype):
+        decompressed.append(info["offset"])
+        return decompress(self, info, dtype)
+
+    monkeypatch.setattr(MappedReflectionTable, "_decompress", counting_decompress)
+    subset = flex.reflection_table.from_file(
+        tmp_path / "compressed.refl",
+        columns=["id"],
+        row_filter=flex.reflection_table_row_filter(d_min=10, d_max=19),
+    )
+    assert subset.size() == 10
+    # once for d, to evaluate the filter, and once for id
+    assert len(decompressed) == 2
+
+    with pytest.raises(ValueError):
+        table.as_mmap_file(tmp_path / "bad.refl", compression="foo")